@@ -37,7 +37,13 @@ old_models_table_names = []
 
 django_prefixes = []
 
-new_models = ["users", "cmi_courses", "cmi5_course_users", "cmi_statements"]
+new_models = [
+    "users",
+    "cmi_courses",
+    "cmi5_course_users",
+    "cmi_statements",
+    "cmi_statement_events",
+]
 
 
 def table_name_suits(name):
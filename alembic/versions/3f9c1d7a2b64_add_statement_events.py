@@ -0,0 +1,86 @@
+"""add statement events
+
+Revision ID: 3f9c1d7a2b64
+Revises: e2520f55545c
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d7a2b64'
+down_revision = 'e2520f55545c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'cmi_statement_events',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('enrollment_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('statement', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column(
+            'created_at',
+            sa.DateTime(),
+            server_default=sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ['enrollment_id'],
+            ['cmi5_course_users.id'],
+            name=op.f('fk_cmi_statement_events_enrollment_id_cmi5_course_users'),
+        ),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_cmi_statement_events')),
+    )
+    op.create_index(
+        'ix_cmi_statement_events_enrollment_id_id',
+        'cmi_statement_events',
+        ['enrollment_id', 'id'],
+        unique=False,
+    )
+    op.add_column(
+        'cmi_statements', sa.Column('last_event_id', sa.BigInteger(), nullable=True)
+    )
+    op.add_column(
+        'cmi_statements',
+        sa.Column(
+            'updated_at',
+            sa.DateTime(),
+            server_default=sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)"),
+            nullable=True,
+        ),
+    )
+
+    # current statements become the first event of their enrollments
+    op.execute(
+        """
+        INSERT INTO cmi_statement_events (enrollment_id, statement)
+        SELECT e.id, s.statements
+        FROM cmi5_course_users e
+        JOIN cmi_statements s ON s.id = e.statement_id
+        WHERE s.statements IS NOT NULL
+        ORDER BY e.id
+        """
+    )
+    op.execute(
+        """
+        UPDATE cmi_statements s
+        SET last_event_id = ev.id
+        FROM cmi5_course_users e
+        JOIN cmi_statement_events ev ON ev.enrollment_id = e.id
+        WHERE s.id = e.statement_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('cmi_statements', 'updated_at')
+    op.drop_column('cmi_statements', 'last_event_id')
+    op.drop_index(
+        'ix_cmi_statement_events_enrollment_id_id', table_name='cmi_statement_events'
+    )
+    op.drop_table('cmi_statement_events')
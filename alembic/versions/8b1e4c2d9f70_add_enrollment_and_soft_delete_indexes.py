@@ -0,0 +1,78 @@
+"""add enrollment and soft delete indexes
+
+Revision ID: 8b1e4c2d9f70
+Revises: 3f9c1d7a2b64
+Create Date: 2026-10-18 14:03:27.512930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e4c2d9f70'
+down_revision = '3f9c1d7a2b64'
+branch_labels = None
+depends_on = None
+
+NOT_DELETED = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    # indexes are built concurrently, without blocking writes to the tables,
+    # CREATE INDEX CONCURRENTLY can't run in a transaction
+    with op.get_context().autocommit_block():
+        # the unique index fails if a user is enrolled to a course twice,
+        # such duplicates have to be resolved by hand before the upgrade,
+        # the failed build leaves an invalid index which has to be dropped
+        op.create_index(
+            'ix_cmi5_course_users_course_id_user_id',
+            'cmi5_course_users',
+            ['course_id', 'user_id'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_cmi5_course_users_user_id',
+            'cmi5_course_users',
+            ['user_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_cmi5_course_users_statement_id',
+            'cmi5_course_users',
+            ['statement_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_users_email_not_deleted',
+            'users',
+            ['email'],
+            unique=False,
+            postgresql_where=NOT_DELETED,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_cmi_statements_updated_at_not_deleted',
+            'cmi_statements',
+            ['updated_at'],
+            unique=False,
+            postgresql_where=NOT_DELETED,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table_name, index_name in (
+            ('cmi_statements', 'ix_cmi_statements_updated_at_not_deleted'),
+            ('users', 'ix_users_email_not_deleted'),
+            ('cmi5_course_users', 'ix_cmi5_course_users_statement_id'),
+            ('cmi5_course_users', 'ix_cmi5_course_users_user_id'),
+            ('cmi5_course_users', 'ix_cmi5_course_users_course_id_user_id'),
+        ):
+            op.drop_index(
+                index_name, table_name=table_name, postgresql_concurrently=True
+            )
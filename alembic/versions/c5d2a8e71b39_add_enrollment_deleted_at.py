@@ -0,0 +1,56 @@
+"""add enrollment deleted_at
+
+Revision ID: c5d2a8e71b39
+Revises: 8b1e4c2d9f70
+Create Date: 2026-10-18 16:21:05.284417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2a8e71b39'
+down_revision = '8b1e4c2d9f70'
+branch_labels = None
+depends_on = None
+
+NOT_DELETED = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    op.add_column(
+        'cmi5_course_users', sa.Column('deleted_at', sa.DateTime(), nullable=True)
+    )
+    # the column is committed before the indexes are built concurrently
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_cmi5_course_users_course_id_not_deleted',
+            'cmi5_course_users',
+            ['course_id'],
+            unique=False,
+            postgresql_where=NOT_DELETED,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_cmi5_course_users_user_id_not_deleted',
+            'cmi5_course_users',
+            ['user_id'],
+            unique=False,
+            postgresql_where=NOT_DELETED,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index_name in (
+            'ix_cmi5_course_users_user_id_not_deleted',
+            'ix_cmi5_course_users_course_id_not_deleted',
+        ):
+            op.drop_index(
+                index_name,
+                table_name='cmi5_course_users',
+                postgresql_concurrently=True,
+            )
+    op.drop_column('cmi5_course_users', 'deleted_at')
@@ -0,0 +1,41 @@
+"""add course jobs
+
+Revision ID: d1f4b7a9e2c3
+Revises: c5d2a8e71b39
+Create Date: 2026-10-18 19:12:44.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1f4b7a9e2c3'
+down_revision = 'c5d2a8e71b39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'course_jobs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=False),
+        sa.Column('course_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column(
+            'progress',
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default=sa.text("'{}'"),
+            nullable=False,
+        ),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_course_jobs')),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('course_jobs')
@@ -0,0 +1,59 @@
+"""Course assignment throughput: one enrollment per request vs bulk endpoint
+
+    python -m benchmarks.enrollments_bulk [users] [courses] [single requests]
+
+Every user is assigned to every course, so the bulk call creates
+users * courses enrollments minus the ones the dataset already has.
+"""
+import asyncio
+import sys
+
+from benchmarks.utils import Dataset, app_client
+
+
+async def main(users: int, courses: int, single_requests: int) -> None:
+    dataset = await Dataset(users=users, courses=courses).create()
+    single_dataset = await Dataset(users=single_requests, courses=1).create()
+
+    try:
+        async with app_client() as client:
+            loop = asyncio.get_running_loop()
+
+            # dataset users are already enrolled, assign the users to a new course
+            course_id = single_dataset.courses[0]
+            started_at = loop.time()
+            for user_id in dataset.users[:single_requests]:
+                response = await client.post(
+                    "/api/courses/enrollment",
+                    json={"course_id": str(course_id), "user_id": str(user_id)},
+                )
+                assert response.status_code == 200, response.text
+            single = single_requests / (loop.time() - started_at)
+
+            started_at = loop.time()
+            response = await client.post(
+                "/api/courses/enrollment/bulk",
+                json={
+                    "course_ids": [str(id) for id in dataset.courses],
+                    "user_ids": [str(id) for id in dataset.users],
+                },
+            )
+            elapsed = loop.time() - started_at
+            assert response.status_code == 200, response.text
+            bulk = users * courses / elapsed
+    finally:
+        await single_dataset.drop()
+        await dataset.drop()
+
+    print(f"single: {single:10.1f} enrollments/s")
+    print(
+        f"bulk:   {bulk:10.1f} enrollments/s ({bulk / single:.1f}x),"
+        f" {users * courses} pairs in {elapsed:.2f} s: {response.json()}"
+    )
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    courses = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    single_requests = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    asyncio.run(main(users, courses, single_requests))
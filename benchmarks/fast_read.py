@@ -0,0 +1,56 @@
+"""Hot read endpoints: ORM objects + pydantic vs Core columns + orjson
+
+    python -m benchmarks.fast_read [courses] [requests]
+"""
+import asyncio
+import sys
+
+from benchmarks.utils import Dataset, app_client, measure
+from config import settings
+from modules.courses.cache import course_cache
+
+
+async def main(courses: int, requests: int) -> None:
+    dataset = await Dataset(
+        users=courses, courses=courses, statement={"status": "completed"}
+    ).create()
+    course_id, user_id = dataset.enrollments[0]
+    endpoints = {
+        "courses": f"/api/courses/all?limit={settings.max_page_size}",
+        "user": f"/api/users/{user_id}",
+        "statement": f"/api/statement/{course_id}/{user_id}",
+    }
+
+    # raw statement reads are compared by benchmarks.statement_read
+    settings.statement_raw_read = False
+
+    try:
+        async with app_client() as client:
+            for name, url in endpoints.items():
+                results = {}
+                for fast_read_path in (False, True):
+                    settings.fast_read_path = fast_read_path
+
+                    async def request():
+                        # catalogue is cached, measure reading it from db
+                        await course_cache.clear()
+                        response = await client.get(url)
+                        assert response.status_code == 200, response.text
+
+                    await request()
+                    total, median, p99 = await measure(request, requests)
+                    results[fast_read_path] = requests / total
+                    print(
+                        f"{name:<10} {'core' if fast_read_path else 'orm':<5}"
+                        f" {requests / total:8.1f} rps"
+                        f"  median {median * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms"
+                    )
+                print(f"{name:<10} {results[True] / results[False]:.1f}x")
+    finally:
+        await dataset.drop()
+
+
+if __name__ == "__main__":
+    courses = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(courses, requests))
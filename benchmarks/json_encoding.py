@@ -0,0 +1,86 @@
+"""Encode time of statement payloads: default FastAPI rendering vs fast encoder
+
+    python -m benchmarks.json_encoding
+
+Doesn't need the database. Payloads are statement responses with
+`statements` JSONB of about 1 KB, 100 KB and 1 MB.
+"""
+import datetime
+import json
+import statistics
+import timeit
+from typing import Any, Callable
+from uuid import UUID, uuid4
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from database.db import json_serializer
+from modules.statements.schema import CMIStatementBase
+from shared.responses import FastJSONResponse, RecordsResponse
+
+SIZES = {"1 KB": 1024, "100 KB": 100 * 1024, "1 MB": 1024 * 1024}
+
+
+def statement(size: int) -> dict:
+    event = {
+        "id": str(uuid4()),
+        "verb": "progressed",
+        "progress": 42.5,
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "result": {"completion": False, "score": {"scaled": 0.5}},
+    }
+    events = max(size // len(json.dumps(event)), 1)
+    return {
+        "id": uuid4(),
+        "statements": {"status": "progressed", "events": [event] * events},
+    }
+
+
+def legacy_json_serializer(obj: Any) -> str:
+    """Engine serializer as it was, encoder class is defined on every call"""
+
+    class UUIDSerializer(json.JSONEncoder):
+        def default(self, o: Any) -> str:
+            if isinstance(o, UUID):
+                return str(o)
+            return super().default(o)
+
+    return json.dumps(obj, cls=UUIDSerializer)
+
+
+def measure(func: Callable[[], Any]) -> float:
+    """Median seconds of one call"""
+
+    number = 1
+    while timeit.timeit(func, number=number) < 0.05:
+        number *= 2
+    return statistics.median(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main() -> None:
+    for name, size in SIZES.items():
+        content = statement(size)
+        schema = CMIStatementBase(**content)
+        cases = {
+            "response: jsonable_encoder + json": lambda: JSONResponse(
+                jsonable_encoder(content)
+            ),
+            "response: jsonable_encoder + fast": lambda: FastJSONResponse(
+                jsonable_encoder(content)
+            ),
+            "response: schema, fast only": lambda: FastJSONResponse(schema),
+            "response: records, fast only": lambda: RecordsResponse(content),
+            "jsonb: legacy serializer": lambda: legacy_json_serializer(
+                content["statements"]
+            ),
+            "jsonb: json_serializer": lambda: json_serializer(content["statements"]),
+        }
+
+        print(f"{name} statement:")
+        for case, func in cases.items():
+            print(f"  {case:<36} {measure(func) * 1000:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Per-request overhead of the middleware stack on an endpoint without db
+
+    python -m benchmarks.middlewares [requests]
+"""
+import asyncio
+import sys
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from httpx import AsyncClient
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from benchmarks.utils import measure
+from database.context import ContextData, request_context
+from database.session import RequestSession
+from middlewares import register_middlewares
+
+
+class LegacySessionMiddleware(BaseHTTPMiddleware):
+    """SessionMiddleware as it was implemented on BaseHTTPMiddleware"""
+
+    async def dispatch(self, request, call_next):
+        request.state.db_session = RequestSession()
+        response = await call_next(request)
+        await request.state.db_session.close()
+        return response
+
+
+class LegacyContextMiddleware(BaseHTTPMiddleware):
+    """ContextMiddleware as it was implemented on BaseHTTPMiddleware"""
+
+    async def dispatch(self, request, call_next):
+        ctx_token = request_context.set(ContextData(session=request.state.db_session))
+        request.state.context = request_context
+        response = await call_next(request)
+        request_context.reset(ctx_token)
+        return response
+
+
+def create_app(middlewares: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    match middlewares:
+        case "asgi":
+            register_middlewares(app)
+        case "base_http":
+            app.add_middleware(LegacyContextMiddleware)
+            app.add_middleware(LegacySessionMiddleware)
+            app.add_middleware(CORSMiddleware, allow_origins=["*"])
+    return app
+
+
+async def main(requests: int) -> None:
+    medians = {}
+    for middlewares in ("none", "base_http", "asgi"):
+        async with AsyncClient(
+            app=create_app(middlewares), base_url="http://benchmark"
+        ) as client:
+
+            async def request():
+                response = await client.get("/ping")
+                assert response.status_code == 200
+
+            await measure(request, 100)
+            total, median, p99 = await measure(request, requests)
+        medians[middlewares] = median
+        print(
+            f"{middlewares:<10} {requests / total:8.1f} rps"
+            f"  median {median * 1e6:7.1f} us  p99 {p99 * 1e6:7.1f} us"
+        )
+
+    for middlewares in ("base_http", "asgi"):
+        overhead = medians[middlewares] - medians["none"]
+        print(f"{middlewares:<10} overhead {overhead * 1e6:7.1f} us per request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,71 @@
+"""Event loop lag under a signup storm: bcrypt on the loop vs PasswordHasher
+
+    python -m benchmarks.password_hashing [signups]
+
+A probe task sleeps 10 ms in a loop, its oversleep is the time other
+requests of the worker would wait for the loop.
+"""
+import asyncio
+import statistics
+import sys
+
+from modules.users.utils import PasswordHasher, get_password_hash
+from config import settings
+
+PROBE_INTERVAL = 0.01
+
+
+async def probe(lags: list[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started_at = loop.time()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(loop.time() - started_at - PROBE_INTERVAL)
+
+
+async def storm(name: str, signups: int, signup) -> None:
+    loop = asyncio.get_running_loop()
+    lags: list[float] = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    started_at = loop.time()
+    await asyncio.gather(*(signup() for _ in range(signups)))
+    elapsed = loop.time() - started_at
+
+    stop.set()
+    await probe_task
+
+    p99 = (
+        statistics.quantiles(lags, n=100, method="inclusive")[98]
+        if len(lags) > 1
+        else lags[0]
+    )
+    print(
+        f"  {name:<8} {signups / elapsed:7.1f} signups/s"
+        f"  loop lag median {statistics.median(lags) * 1000:8.1f} ms"
+        f"  p99 {p99 * 1000:8.1f} ms  max {max(lags) * 1000:8.1f} ms"
+    )
+
+
+async def main(signups: int) -> None:
+    print(f"{signups} signups, bcrypt rounds {settings.password_hash_rounds}")
+
+    async def inline():
+        get_password_hash("password")
+
+    await storm("inline", signups, inline)
+
+    hasher = PasswordHasher(
+        workers=settings.password_hash_workers,
+        max_pending=signups,
+    )
+    try:
+        await storm("pool", signups, lambda: hasher.hash("password"))
+    finally:
+        hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
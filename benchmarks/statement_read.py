@@ -0,0 +1,73 @@
+"""GET statement latency by document size: ORM, Core columns, raw JSONB text
+
+    python -m benchmarks.statement_read [requests]
+
+Statements of about 1 KB, 100 KB and 1 MB are read by every mode,
+`raw` splices the stored JSONB text into the response body.
+"""
+import asyncio
+import datetime
+import json
+import sys
+from uuid import uuid4
+
+from benchmarks.utils import Dataset, app_client, measure
+from config import settings
+
+SIZES = {"1 KB": 1024, "100 KB": 100 * 1024, "1 MB": 1024 * 1024}
+
+MODES = {
+    # mode: (statement_raw_read, fast_read_path)
+    "orm": (False, False),
+    "core": (False, True),
+    "raw": (True, True),
+}
+
+
+def statement(size: int) -> dict:
+    event = {
+        "id": str(uuid4()),
+        "verb": "progressed",
+        "progress": 42.5,
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "result": {"completion": False, "score": {"scaled": 0.5}},
+    }
+    events = max(size // len(json.dumps(event)), 1)
+    return {"status": "progressed", "events": [event] * events}
+
+
+async def main(requests: int) -> None:
+    datasets = {
+        name: await Dataset(users=1, courses=1, statement=statement(size)).create()
+        for name, size in SIZES.items()
+    }
+
+    try:
+        async with app_client() as client:
+            for name, dataset in datasets.items():
+                course_id, user_id = dataset.enrollments[0]
+                url = f"/api/statement/{course_id}/{user_id}"
+                medians = {}
+                for mode, (raw_read, fast_read_path) in MODES.items():
+                    settings.statement_raw_read = raw_read
+                    settings.fast_read_path = fast_read_path
+
+                    async def request():
+                        response = await client.get(url)
+                        assert response.status_code == 200, response.text
+
+                    await request()
+                    total, median, p99 = await measure(request, requests)
+                    medians[mode] = median
+                    print(
+                        f"{name:<7} {mode:<5} {requests / total:8.1f} rps"
+                        f"  median {median * 1000:8.2f} ms  p99 {p99 * 1000:8.2f} ms"
+                    )
+                print(f"{name:<7} raw {medians['orm'] / medians['raw']:.1f}x of orm")
+    finally:
+        for dataset in datasets.values():
+            await dataset.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,56 @@
+"""Statement writes throughput: one statement per request vs batch endpoint
+
+    python -m benchmarks.statements_batch [enrollments] [batch size]
+"""
+import asyncio
+import sys
+
+from benchmarks.utils import Dataset, app_client
+
+
+async def main(enrollments: int, batch_size: int) -> None:
+    dataset = await Dataset(users=enrollments, courses=10).create()
+
+    def item(course_id, user_id, index: int) -> dict:
+        return {
+            "course_id": str(course_id),
+            "user_id": str(user_id),
+            "statement": {"status": "progressed", "index": index},
+        }
+
+    try:
+        async with app_client() as client:
+            loop = asyncio.get_running_loop()
+
+            started_at = loop.time()
+            for index, (course_id, user_id) in enumerate(dataset.enrollments):
+                response = await client.post(
+                    "/api/statement", json=item(course_id, user_id, index)
+                )
+                assert response.status_code == 200, response.text
+            single = len(dataset.enrollments) / (loop.time() - started_at)
+
+            started_at = loop.time()
+            for offset in range(0, len(dataset.enrollments), batch_size):
+                response = await client.post(
+                    "/api/statement/batch",
+                    json=[
+                        item(course_id, user_id, index)
+                        for index, (course_id, user_id) in enumerate(
+                            dataset.enrollments[offset : offset + batch_size]
+                        )
+                    ],
+                )
+                assert response.status_code == 200, response.text
+            batch = len(dataset.enrollments) / (loop.time() - started_at)
+    finally:
+        await dataset.drop()
+
+    print(f"single: {single:10.1f} statements/s")
+    print(f"batch:  {batch:10.1f} statements/s ({batch / single:.1f}x)")
+
+
+if __name__ == "__main__":
+    enrollments = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    asyncio.run(main(enrollments, batch_size))
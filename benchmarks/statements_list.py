@@ -0,0 +1,109 @@
+"""Statements listing: get_all + IN (...) with selectinloads vs one joined query
+
+    python -m benchmarks.statements_list [enrollments ...]
+"""
+import asyncio
+import sys
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import selectinload
+
+from benchmarks.utils import Dataset, measure
+from database.db import engine
+from database.session import SessionManager
+from modules.courses.models import CMIEnrollment
+from modules.statements.models import CMIStatement
+from modules.statements.service import CMIStatementService, StatementFilter
+
+REPEAT = 5
+PAGE_SIZE = 100
+
+
+@contextmanager
+def count_queries() -> Iterator[list[str]]:
+    queries: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        queries.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def legacy() -> None:
+    """Listing as it was done before the joined read path"""
+
+    async with SessionManager() as session:
+        statements = (
+            (
+                await session.execute(
+                    select(CMIStatement).where(CMIStatement.deleted_at.is_(None))
+                )
+            )
+            .scalars()
+            .all()
+        )
+        (
+            await session.execute(
+                select(CMIEnrollment)
+                .where(CMIEnrollment.statement_id.in_([st.id for st in statements]))
+                .options(selectinload(CMIEnrollment.user))
+                .options(selectinload(CMIEnrollment.course))
+                .options(selectinload(CMIEnrollment.statement))
+            )
+        ).scalars().all()
+
+
+async def joined(filters: StatementFilter, limit: int | None = None) -> None:
+    async with SessionManager() as session:
+        await CMIStatementService(session).get_full_rows(filters, limit=limit)
+
+
+async def report(name: str, func) -> None:
+    with count_queries() as queries:
+        try:
+            await func()
+        except Exception as e:
+            print(f"  {name:<14} failed: {type(e).__name__}: {str(e)[:80]}")
+            return
+    total, median, p99 = await measure(func, REPEAT)
+    print(
+        f"  {name:<14} {len(queries):3} queries"
+        f"  median {median * 1000:10.1f} ms  p99 {p99 * 1000:10.1f} ms"
+    )
+
+
+async def main(sizes: list[int]) -> None:
+    for size in sizes:
+        dataset = await Dataset(
+            users=size, courses=100, statement={"status": "completed"}
+        ).create()
+        course_id, user_id = dataset.enrollments[0]
+        print(f"{size} enrollments")
+        try:
+            await report("legacy", legacy)
+            await report("joined", lambda: joined(StatementFilter()))
+            await report(
+                "joined page",
+                lambda: joined(StatementFilter(), PAGE_SIZE),
+            )
+            await report(
+                "course page",
+                lambda: joined(StatementFilter(course_id=course_id), PAGE_SIZE),
+            )
+            await report(
+                "user",
+                lambda: joined(StatementFilter(user_id=user_id)),
+            )
+        finally:
+            await dataset.drop()
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    asyncio.run(main(sizes))
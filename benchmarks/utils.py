@@ -0,0 +1,150 @@
+"""Benchmarks run against the database from settings, it must be migrated:
+
+    docker compose up -d db
+    alembic upgrade head
+    python -m benchmarks.<name>
+"""
+import statistics
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+from uuid import UUID, uuid4
+
+from asgi_lifespan import LifespanManager
+from httpx import AsyncClient
+from sqlalchemy import delete, insert, select
+
+from database.session import SessionManager
+from modules.courses.models import CMICourse, CMIEnrollment
+from modules.statements.models import CMIStatement, CMIStatementEvent
+from modules.users.models import User
+
+CHUNK_SIZE = 5000
+
+
+@asynccontextmanager
+async def app_client() -> AsyncIterator[AsyncClient]:
+    from main import create_app
+
+    app = create_app()
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://benchmark") as client:
+            yield client
+
+
+async def insert_chunked(model, rows: list[dict]) -> None:
+    for index in range(0, len(rows), CHUNK_SIZE):
+        async with SessionManager() as session:
+            await session.execute(insert(model), rows[index : index + CHUNK_SIZE])
+
+
+async def delete_chunked(session, column, ids: list) -> None:
+    """Delete rows by ids, asyncpg allows only 32767 query arguments"""
+
+    for index in range(0, len(ids), CHUNK_SIZE):
+        await session.execute(
+            delete(column.class_)
+            .where(column.in_(ids[index : index + CHUNK_SIZE]))
+            .execution_options(synchronize_session=False)
+        )
+
+
+class Dataset:
+    """Users enrolled on courses, every enrollment has a statement"""
+
+    def __init__(self, users: int, courses: int, statement: dict | None = None):
+        self.users = [uuid4() for _ in range(users)]
+        self.courses = [uuid4() for _ in range(courses)]
+        self.statement = statement
+        self.enrollments: list[tuple[UUID, UUID]] = []
+
+    async def create(self) -> "Dataset":
+        await insert_chunked(
+            User,
+            [dict(id=id, email=f"{id}@benchmark", password="") for id in self.users],
+        )
+        await insert_chunked(
+            CMICourse,
+            [
+                dict(
+                    id=id,
+                    title="benchmark",
+                    description="benchmark",
+                    organization_id=uuid4(),
+                    file_link=f"courses/{id}/res/index.html",
+                )
+                for id in self.courses
+            ],
+        )
+
+        self.enrollments = [
+            (self.courses[index % len(self.courses)], user_id)
+            for index, user_id in enumerate(self.users)
+        ]
+        statements = [uuid4() for _ in self.enrollments]
+        if self.statement is not None:
+            await insert_chunked(
+                CMIStatement,
+                [dict(id=id, statements=self.statement) for id in statements],
+            )
+        await insert_chunked(
+            CMIEnrollment,
+            [
+                dict(
+                    id=uuid4(),
+                    course_id=course_id,
+                    user_id=user_id,
+                    statement_id=statement_id if self.statement is not None else None,
+                )
+                for (course_id, user_id), statement_id in zip(
+                    self.enrollments, statements
+                )
+            ],
+        )
+        return self
+
+    async def drop(self) -> None:
+        async with SessionManager() as session:
+            await session.execute(
+                delete(CMIStatementEvent)
+                .where(
+                    CMIStatementEvent.enrollment_id.in_(
+                        select(CMIEnrollment.id).where(
+                            CMIEnrollment.course_id.in_(self.courses)
+                        )
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+            statements = (
+                await session.execute(
+                    delete(CMIEnrollment)
+                    .where(CMIEnrollment.course_id.in_(self.courses))
+                    .returning(CMIEnrollment.statement_id)
+                    .execution_options(synchronize_session=False)
+                )
+            ).scalars()
+            await delete_chunked(
+                session, CMIStatement.id, [id for id in statements if id]
+            )
+            await delete_chunked(session, CMICourse.id, self.courses)
+            await delete_chunked(session, User.id, self.users)
+
+
+async def measure(
+    func: Callable[[], Awaitable], repeat: int
+) -> tuple[float, float, float]:
+    """Run func `repeat` times
+
+    Returns:
+        tuple[float, float, float]: total, median and p99 seconds
+    """
+
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        await func()
+        timings.append(time.perf_counter() - started_at)
+
+    p99 = statistics.quantiles(timings, n=100)[98] if len(timings) > 1 else timings[0]
+    return sum(timings), statistics.median(timings), p99
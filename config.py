@@ -1,7 +1,7 @@
 import enum
 import os
 from pathlib import Path
-from pydantic import AnyUrl, BaseSettings
+from pydantic import AnyUrl, BaseSettings, conint
 
 
 class Environment(enum.StrEnum):
@@ -29,6 +29,24 @@ class BaseDsnSettings(BaseSettings):
 
 class PostgresSettings(BaseDsnSettings):
     scheme: str = "postgresql+asyncpg"
+    # connections kept open by every worker process, gunicorn workers
+    # together must stay below max_connections of the server
+    pool_size: int = 10
+    max_overflow: int = 10
+    # seconds to wait for a free connection before failing the request
+    pool_timeout: float = 30.0
+    # seconds, connections older than it are reopened on checkout
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    # asyncpg cache of prepared statements per connection
+    statement_cache_size: int = 100
+    # SQLAlchemy cache of prepared statements per connection
+    prepared_statement_cache_size: int = 100
+    # JIT compilation costs more than it saves on short OLTP queries
+    jit: bool = False
+    # optional read replica, read-only service methods are sent to it
+    replica_host: str | None = None
+    replica_port: int | None = None
 
     class Config:
         env_prefix = "postgres_"
@@ -40,6 +58,20 @@ class S3Settings(BaseSettings):
     bucket_name: str = "secure-t"
     endpoint_url: str = "minio:9000"
     region_name: str = "ru-central1"
+    upload_workers: int = 8
+    upload_retries: int = 3
+    upload_retry_delay: float = 0.5
+    # objects bigger than part size are uploaded by multipart upload
+    upload_part_size: int = 16 * 1024 * 1024
+    # store course files once under their sha256 with per-course manifest
+    content_addressed: bool = False
+    # connections kept to the endpoint by the shared client, should be
+    # at least upload_workers, callers over it wait for a free connection
+    max_connections: int = 16
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    # keep idle pooled connections open, with TCP keepalive on them
+    keepalive: bool = True
 
 
 class Settings(BaseSettings):
@@ -49,6 +81,49 @@ class Settings(BaseSettings):
     static_url: str = "http://127.0.0.1:5000"
     storage_url: str = "http://127.0.0.1"
     tag: str = "local"
+    # course files storage, see storage.storage.storage_backends
+    storage_backend: str = "minio"
+    publish_queue_backend: str = "in_process"
+    publish_workers: int = 2
+    publish_queue_size: int = 100
+    publish_keep_finished: int = 1000
+    # seconds between saves of running jobs progress
+    job_save_interval: float = 1.0
+    course_delete_workers: int = 1
+    course_delete_queue_size: int = 100
+    # enrollments soft deleted by one transaction of the course deletion
+    course_delete_chunk_size: int = 5000
+    # seconds to wait for enrollments locked by other transactions
+    course_delete_retry_delay: float = 1.0
+    statements_batch_size: int = 1000
+    # enrollments inserted by one statement of the bulk enrollment
+    enrollments_chunk_size: int = 10000
+    page_size: int = 100
+    max_page_size: int = 1000
+    # rows fetched by server-side cursor at once for streaming responses
+    stream_chunk_size: int = 1000
+    # hot read endpoints select columns by Core queries and serialize them
+    # by orjson, bypassing ORM objects and pydantic schemas
+    fast_read_path: bool = True
+    # statement reads take stored JSONB as text and splice it into the response
+    # body as is, the stored document is neither decoded nor validated
+    statement_raw_read: bool = True
+    # statement writes replace the stored statement, with it they are
+    # shallow merged into it (top level keys of the new statement win)
+    statement_merge: bool = False
+    # encoder of responses and JSONB columns, see shared.serializers
+    json_backend: str = "orjson"
+    # "local" is not invalidated across processes, use it with one worker
+    course_cache_backend: str = "pg_notify"
+    course_cache_size: int = 1024
+    # seconds, other processes see course changes after it at most
+    course_cache_ttl: float = 300.0
+    # bcrypt cost, every extra round doubles hashing time, lower it only
+    # for environments with throwaway users
+    password_hash_rounds: conint(ge=4, le=31) = 12
+    password_hash_workers: int = 4
+    # hashing calls waiting for a worker, signups over it are rejected
+    password_hash_max_pending: int = 64
     postgres_settings: PostgresSettings = PostgresSettings()
     s3_settings: S3Settings = S3Settings()
 
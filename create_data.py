@@ -14,11 +14,13 @@ import asyncio
 class DataCreator:
     @provide_session
     async def _create_users(self, session: DBSession) -> list[User]:
+        # all users have the same password, bcrypt is too slow to hash it per user
+        password = get_password_hash("password")
         users = [
             User(
                 id=uuid4(),
                 email=f"test_{str(index)}@gmail.com",
-                password=get_password_hash("password"),
+                password=password,
             )
             for index in range(5)
         ]
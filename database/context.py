@@ -1,14 +1,17 @@
 from contextvars import ContextVar
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, Optional
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from .identity import IdentityCache
 
 if TYPE_CHECKING:
-    from .db import DBSession
+    from .session import RequestSession
 
 
 @dataclass(frozen=True)
 class ContextData:
-    db_session: Optional["DBSession"]
+    session: "RequestSession"
+    identity_cache: IdentityCache = field(default_factory=IdentityCache)
 
 
 request_context: ContextVar[ContextData | None] = ContextVar("context", default=None)
@@ -20,3 +23,17 @@ def get_context() -> ContextData:
         raise ValueError
 
     return context_data
+
+
+def get_identity_cache() -> IdentityCache:
+    """Identity cache of the current request
+
+    Services created outside of a request (background jobs, streamed
+    responses) get own cache, so nothing is shared between them.
+    """
+
+    context_data = request_context.get()
+    if not context_data:
+        return IdentityCache()
+
+    return context_data.identity_cache
@@ -1,35 +1,54 @@
-import json
 from typing import Any, NewType
-from uuid import UUID
 
 from sqlalchemy import MetaData
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.pool.impl import AsyncAdaptedQueuePool
 from config import settings
+from database.pool import InstrumentedPool
+from shared.metrics import metrics
+from shared.serializers import dumps_str
 
 DBSession = NewType("DBSession", AsyncSession)
 database = settings.postgres_settings
 
 
 def json_serializer(obj: Any) -> str:
-    class UUIDSerializer(json.JSONEncoder):
-        def default(self, o: Any) -> str:
-            if isinstance(o, UUID):
-                return str(o)
-            return super().default(o)
-
-    return json.dumps(obj, cls=UUIDSerializer)
+    return dumps_str(obj)
 
 
 DATABASE_URL = f"postgresql+asyncpg://{database.username}:{database.password}@{database.host}:{database.port}/{database.name}"
 
-engine: AsyncEngine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    poolclass=AsyncAdaptedQueuePool,
-    json_serializer=json_serializer,
-)
+
+def create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        f"{url}?prepared_statement_cache_size="
+        f"{database.prepared_statement_cache_size}",
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=database.pool_size,
+        max_overflow=database.max_overflow,
+        pool_timeout=database.pool_timeout,
+        pool_recycle=database.pool_recycle,
+        pool_pre_ping=database.pool_pre_ping,
+        connect_args=dict(
+            statement_cache_size=database.statement_cache_size,
+            server_settings=dict(jit="on" if database.jit else "off"),
+        ),
+        json_serializer=json_serializer,
+    )
+
+
+engine: AsyncEngine = create_engine(DATABASE_URL)
+metrics.register("db_pool", lambda: engine.sync_engine.pool.stats())
+
+replica_engine: AsyncEngine | None = None
+if database.replica_host:
+    replica_engine = create_engine(
+        f"postgresql+asyncpg://{database.username}:{database.password}"
+        f"@{database.replica_host}:{database.replica_port or database.port}"
+        f"/{database.name}"
+    )
+    metrics.register("db_replica_pool", lambda: replica_engine.sync_engine.pool.stats())
 
 convention = {
     "ix": "ix_%(column_0_label)s",
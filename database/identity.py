@@ -0,0 +1,89 @@
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from shared.metrics import metrics
+
+T = TypeVar("T")
+
+
+class IdentityCache:
+    """Request-scoped read-through cache of rows by key
+
+    Keys are tuples starting with the model, like (CMICourse, course_id).
+    Only found rows are kept, writes invalidate all keys of the model.
+    """
+
+    def __init__(self):
+        self._objects: dict[tuple[Hashable, ...], Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self, key: tuple[Hashable, ...]) -> Any | None:
+        """Cached row or none, not counted in metrics"""
+
+        return self._objects.get(key)
+
+    def get(self, key: tuple[Hashable, ...]) -> Any | None:
+        """Cached row or none, found row is counted as a saved query"""
+
+        obj = self._objects.get(key)
+        if obj is not None:
+            self.record_hit()
+        return obj
+
+    def record_hit(self) -> None:
+        self.hits += 1
+
+    def put(self, key: tuple[Hashable, ...], obj: Any) -> None:
+        if obj is not None:
+            self._objects[key] = obj
+
+    async def get_or_load(
+        self, key: tuple[Hashable, ...], load: Callable[[], Awaitable[T | None]]
+    ) -> T | None:
+        obj = self.get(key)
+        if obj is not None:
+            return obj
+
+        self.misses += 1
+        obj = await load()
+        self.put(key, obj)
+        return obj
+
+    def invalidate(self, *models: type) -> None:
+        for key in [key for key in self._objects if key[0] in models]:
+            del self._objects[key]
+
+
+class IdentityCacheStats:
+    """Identity cache counters aggregated by endpoint"""
+
+    def __init__(self):
+        self._endpoints: defaultdict[str, dict[str, int]] = defaultdict(
+            lambda: dict(requests=0, hits=0, misses=0)
+        )
+
+    def record(self, endpoint: str, cache: IdentityCache) -> None:
+        counters = self._endpoints[endpoint]
+        counters["requests"] += 1
+        counters["hits"] += cache.hits
+        counters["misses"] += cache.misses
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        return {
+            endpoint: dict(
+                counters,
+                hit_rate=counters["hits"] / (counters["hits"] + counters["misses"])
+                if counters["hits"] + counters["misses"]
+                else 0.0,
+                queries_saved=counters["hits"],
+            )
+            for endpoint, counters in self._endpoints.items()
+        }
+
+    def reset(self) -> None:
+        self._endpoints.clear()
+
+
+identity_cache_stats = IdentityCacheStats()
+metrics.register("identity_cache", identity_cache_stats.snapshot)
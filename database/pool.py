@@ -0,0 +1,53 @@
+import time
+from typing import Any
+
+from sqlalchemy import exc
+from sqlalchemy.pool.impl import AsyncAdaptedQueuePool
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool counting how long checkouts wait for a connection"""
+
+    # seconds, checkouts of idle connections take microseconds,
+    # slower ones waited for a connection to be returned
+    wait_threshold = 0.001
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        opened_after = time.time()
+        started_at = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started_at
+
+        self.checkouts += 1
+        # time of opening a new connection is not a wait for the pool
+        if record.starttime < opened_after and waited >= self.wait_threshold:
+            self.waits += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return record
+
+    def stats(self) -> dict[str, Any]:
+        return dict(
+            size=self.size(),
+            max_overflow=self._max_overflow,
+            checked_in=self.checkedin(),
+            checked_out=self.checkedout(),
+            overflow=max(self.overflow(), 0),
+            checkouts=self.checkouts,
+            waits=self.waits,
+            timeouts=self.timeouts,
+            wait_seconds_total=self.wait_seconds_total,
+            wait_seconds_max=self.wait_seconds_max,
+        )
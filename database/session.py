@@ -1,22 +1,114 @@
 import functools
-from asyncio import current_task
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
+from types import TracebackType
+from typing import AsyncContextManager, AsyncIterator, Iterator
 
 from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event, func, literal_column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker
+from sqlalchemy.sql import ColumnElement, Select
 
 from database.context import ContextData, get_context
 
-from .db import DBSession, engine
+from .db import DBSession, engine, replica_engine
 
+# written in the current transaction
+HAS_WRITES = "has_writes"
+# written at any time, reads of the session don't go to the replica after it
+WROTE = "wrote"
+USE_REPLICA = "use_replica"
 
-async def _get_session():
-    Session = async_scoped_session(
-        sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False),
-        scopefunc=current_task,
+
+class RoutingSession(Session):
+    """Session sending reads of read-only service methods to the replica
+
+    Writes, flushes and all queries after the first write of the session
+    go to the primary, so the request reads its own writes.
+    """
+
+    def __init__(self, *args, replica: Engine | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = replica
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            self.replica is not None
+            and self.info.get(USE_REPLICA)
+            and not self.info.get(WROTE)
+            and not self._flushing
+            and isinstance(clause, Select)
+        ):
+            return self.replica
+        return super().get_bind(mapper, clause, **kwargs)
+
+
+async_session_factory = sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    replica=replica_engine.sync_engine if replica_engine else None,
+    expire_on_commit=False,
+)
+
+
+def read_only(method):
+    """Send queries of the service method to the replica, if it is configured"""
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        with use_replica(self.session):
+            return await method(self, *args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def use_replica(session: DBSession) -> Iterator[None]:
+    session.info[USE_REPLICA] = session.info.get(USE_REPLICA, 0) + 1
+    try:
+        yield
+    finally:
+        session.info[USE_REPLICA] -= 1
+
+
+def _mark_writes(session: Session) -> None:
+    session.info[HAS_WRITES] = True
+    session.info[WROTE] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_writes(orm_execute_state: ORMExecuteState) -> None:
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        _mark_writes(orm_execute_state.session)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session: Session, flush_context) -> None:
+    _mark_writes(session)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset_writes(session: Session) -> None:
+    session.info.pop(HAS_WRITES, None)
+
+
+def has_writes(session: AsyncSession) -> bool:
+    """Session has written something in the current transaction"""
+
+    return bool(
+        session.info.get(HAS_WRITES) or session.new or session.dirty or session.deleted
     )
-    session = Session()
+
+
+async def _get_session():
+    session = async_session_factory()
 
     try:
         yield session
@@ -24,7 +116,9 @@ async def _get_session():
         await session.rollback()
         raise e
     else:
-        await session.commit()
+        # read-only transaction is rolled back by close without COMMIT
+        if has_writes(session):
+            await session.commit()
     finally:
         await session.close()
 
@@ -32,10 +126,86 @@ async def _get_session():
 SessionManager = asynccontextmanager(_get_session)
 
 
+def _lock_id(key: str) -> ColumnElement:
+    return func.hashtextextended(key, 0)
+
+
+def advisory_lock_held(key: str) -> ColumnElement:
+    """Condition true while advisory lock of the key is held by any transaction
+
+    It is read from pg_locks, the lock is not taken for the check.
+    """
+
+    # bigint lock id is shown split into two 32 bit halves
+    return (
+        select(text("1"))
+        .select_from(text("pg_locks"))
+        .where(
+            text(
+                "locktype = 'advisory' AND granted AND objsubid = 1"
+                " AND database = (SELECT oid FROM pg_database"
+                " WHERE datname = current_database())"
+            ),
+            literal_column("(classid::bigint << 32) | objid::bigint") == _lock_id(key),
+        )
+        .exists()
+    )
+
+
+@asynccontextmanager
+async def advisory_lock(key: str) -> AsyncIterator[bool]:
+    """Try to take advisory lock of the key, it is not waited for
+
+    The lock is taken by the transaction of own session and held until
+    the context exits, it is released with the connection if the process
+    dies. The transaction writes nothing, so it doesn't hold back vacuum.
+
+    Args:
+        key (str): lock name, hashed to the lock id
+
+    Yields:
+        bool: the lock is taken, False when another transaction holds it
+    """
+    async with SessionManager() as session:
+        yield (
+            await session.execute(select(func.pg_try_advisory_xact_lock(_lock_id(key))))
+        ).scalar()
+
+
+class RequestSession:
+    """Session of the request, opened on the first use"""
+
+    def __init__(self):
+        self._manager: AsyncContextManager[DBSession] | None = None
+        self._session: DBSession | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._session is not None
+
+    async def get(self) -> DBSession:
+        if self._session is None:
+            self._manager = SessionManager()
+            self._session = await self._manager.__aenter__()
+        return self._session
+
+    async def close(
+        self,
+        exc_type: type[BaseException] | None = None,
+        exc: BaseException | None = None,
+        traceback: TracebackType | None = None,
+    ) -> None:
+        if self._manager is None:
+            return
+
+        manager, self._manager, self._session = self._manager, None, None
+        await manager.__aexit__(exc_type, exc, traceback)
+
+
 async def get_session(
     context: ContextData = Depends(get_context),
 ) -> DBSession:
-    return context.db_session
+    return await context.session.get()
 
 
 def provide_session(func):
@@ -2,6 +2,7 @@ from fastapi import FastAPI
 
 from middlewares import register_middlewares
 from modules.courses.router import courses_router
+from modules.metrics.router import metrics_router
 from modules.statements.router import statement_router
 from modules.users.router import users_router
 import logging
@@ -20,6 +21,7 @@ def create_app() -> FastAPI:
     app.include_router(users_router)
     app.include_router(courses_router)
     app.include_router(statement_router)
+    app.include_router(metrics_router)
     app = register_middlewares(app)
 
     return app
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from shared.pagination import NEXT_CURSOR_HEADER
 from .context import ContextMiddleware
 from .session import SessionMiddleware
 
@@ -13,6 +14,8 @@ def register_middlewares(app: FastAPI) -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # browser clients read the cursor of the next page from it
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
 
     return app
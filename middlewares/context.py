@@ -1,16 +1,27 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from database.context import ContextData, request_context
+from database.identity import identity_cache_stats
 
 
-class ContextMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next) -> Response:
-        context_data = ContextData(db_session=request.state.db_session)
+class ContextMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        context_data = ContextData(session=state["db_session"])
         ctx_token = request_context.set(context_data)
-        request.state.context = request_context
-        response = await call_next(request)
-        request_context.reset(ctx_token)
+        state["context"] = request_context
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_context.reset(ctx_token)
 
-        return response
+        endpoint = scope.get("endpoint")
+        if endpoint is not None:
+            identity_cache_stats.record(endpoint.__name__, context_data.identity_cache)
@@ -1,16 +1,34 @@
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
-from starlette.responses import Response
+import sys
 
-from database.session import SessionManager
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from database.session import RequestSession
 
-class SessionMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        async with SessionManager() as session:
-            request.state.db_session = session
-            response = await call_next(request)
 
-        return response
+class SessionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # session is opened by get_session on the first use, requests which
+        # don't touch the database don't check out a connection
+        session = RequestSession()
+        scope.setdefault("state", {})["db_session"] = session
+
+        async def send_wrapper(message: Message) -> None:
+            # transaction is finished before the client gets the status,
+            # so the next request of the client sees the writes
+            if message["type"] == "http.response.start":
+                await session.close()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            await session.close(*sys.exc_info())
+            raise
+        await session.close()
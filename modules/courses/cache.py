@@ -0,0 +1,17 @@
+from config import settings
+from shared.cache import ICache, cache_backends
+from shared.metrics import metrics
+
+COURSE = "course"
+CATALOGUE = "courses"
+COURSE_USERS = "course_users"
+
+course_cache: ICache = cache_backends[settings.course_cache_backend](
+    max_size=settings.course_cache_size,
+    ttl=settings.course_cache_ttl,
+)
+metrics.register("course_cache", course_cache.stats)
+
+
+def get_course_cache() -> ICache:
+    return course_cache
@@ -0,0 +1,472 @@
+import asyncio
+import datetime
+import logging
+import os.path
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from enum import StrEnum
+from threading import Lock
+from types import SimpleNamespace
+from typing import Any, Awaitable, BinaryIO, Callable, ClassVar, Protocol
+from uuid import UUID, uuid4
+from zipfile import ZipFile
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from config import settings
+from database.db import DBSession
+from database.session import advisory_lock, advisory_lock_held, provide_session
+from modules.courses.models import CourseJob
+from modules.courses.service import CMICourseService, CourseDTO
+from shared.utils import iter_zip_members, urljoin
+from storage.storage import get_storage
+from storage.uploader import UploadTask
+
+logger = logging.getLogger(__name__)
+
+COURSE_FILES_URL = "/api/courses/files"
+
+
+class JobState(StrEnum):
+    pending: str = "pending"
+    running: str = "running"
+    completed: str = "completed"
+    failed: str = "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass(kw_only=True)
+class Job:
+    kind: ClassVar[str]
+
+    id: UUID = field(default_factory=uuid4)
+    state: JobState = JobState.pending
+    error: str | None = None
+    created_at: datetime.datetime = field(default_factory=datetime.datetime.utcnow)
+    finished_at: datetime.datetime | None = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in (JobState.completed, JobState.failed)
+
+    @property
+    def course(self) -> UUID | None:
+        return getattr(self, "course_id", None)
+
+    def progress(self) -> dict[str, int]:
+        """Job specific counters, saved with the job state"""
+
+        return {}
+
+    def finish(self, state: JobState, error: str | None = None) -> None:
+        self.state = state
+        self.error = error
+        self.finished_at = datetime.datetime.utcnow()
+
+
+@dataclass
+class PublishJob(Job):
+    kind: ClassVar[str] = "publish"
+
+    title: str
+    description: str
+    archive: ZipFile
+    file: BinaryIO
+    objects_total: int = 0
+    objects_uploaded: int = 0
+    bytes_total: int = 0
+    bytes_processed: int = 0
+    course_id: UUID | None = None
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def __post_init__(self):
+        for _, info in iter_zip_members(self.archive):
+            self.objects_total += 1
+            self.bytes_total += info.file_size
+
+    def track(self, task: UploadTask) -> None:
+        """Upload progress callback, called from storage worker threads"""
+
+        with self._lock:
+            self.objects_uploaded += 1
+            self.bytes_processed += task.length
+
+    def progress(self) -> dict[str, int]:
+        with self._lock:
+            return dict(
+                objects_total=self.objects_total,
+                objects_uploaded=self.objects_uploaded,
+                bytes_total=self.bytes_total,
+                bytes_processed=self.bytes_processed,
+            )
+
+    def finish(self, state: JobState, error: str | None = None) -> None:
+        super().finish(state, error)
+        self.archive.close()
+        self.file.close()
+
+
+@dataclass
+class DeleteCourseJob(Job):
+    """Soft deletion of enrollments of the deleted course"""
+
+    kind: ClassVar[str] = "delete_course"
+
+    course_id: UUID
+    enrollments_total: int = 0
+    enrollments_deleted: int = 0
+    # set once the job has tried to take the lock of its course
+    lock_tried: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def progress(self) -> dict[str, int]:
+        return dict(
+            enrollments_total=self.enrollments_total,
+            enrollments_deleted=self.enrollments_deleted,
+        )
+
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class JobStore:
+    """Job states in the database
+
+    Jobs run in the process which accepted them, their states are saved
+    so progress is read by any worker process.
+    """
+
+    @provide_session
+    async def save(self, job: Job, session: DBSession) -> None:
+        values = dict(
+            state=job.state,
+            course_id=job.course,
+            progress=job.progress(),
+            error=job.error,
+            finished_at=job.finished_at,
+        )
+        await session.execute(
+            insert(CourseJob)
+            .values(id=job.id, kind=job.kind, created_at=job.created_at, **values)
+            .on_conflict_do_update(index_elements=[CourseJob.id], set_=values)
+        )
+
+    @provide_session
+    async def get(
+        self, job_id: UUID, kind: str, session: DBSession
+    ) -> SimpleNamespace | None:
+        """Saved job with its counters as attributes"""
+
+        row = (
+            await session.execute(
+                select(CourseJob).where(CourseJob.id == job_id, CourseJob.kind == kind)
+            )
+        ).scalar_one_or_none()
+        if row is None:
+            return None
+
+        return SimpleNamespace(
+            id=row.id,
+            state=row.state,
+            course_id=row.course_id,
+            error=row.error,
+            created_at=row.created_at,
+            finished_at=row.finished_at,
+            **row.progress,
+        )
+
+
+class IJobQueue(Protocol):
+    async def start(self) -> None:
+        ...
+
+    async def stop(self) -> None:
+        ...
+
+    async def submit(self, job: Job) -> None:
+        ...
+
+    async def save(self, job: Job) -> None:
+        ...
+
+    async def get(self, job_id: UUID) -> Any:
+        ...
+
+
+class InProcessJobQueue:
+    """Bounded asyncio queue processed by a fixed number of worker tasks
+
+    Jobs are run by the process which accepted them. Their states are saved
+    by `store` on every change and every `save_interval` seconds while
+    running, jobs of other processes are read from it.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        kind: str,
+        workers: int,
+        max_size: int,
+        keep_finished: int,
+        store: JobStore,
+        save_interval: float,
+    ):
+        self.handler = handler
+        self.kind = kind
+        self.workers = workers
+        self.keep_finished = keep_finished
+        self.store = store
+        self.save_interval = save_interval
+        self._queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=max_size)
+        self._jobs: OrderedDict[UUID, Job] = OrderedDict()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # jobs left in the queue are never run by this process
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            job.finish(JobState.failed, "Cancelled on shutdown")
+            await self.save(job)
+
+    async def submit(self, job: Job) -> None:
+        if self._queue.full():
+            raise QueueFull
+
+        # saved before it is queued, so running state isn't overwritten
+        await self.save(job)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull
+
+        self._jobs[job.id] = job
+        self._forget_finished()
+
+    async def get(self, job_id: UUID) -> Job | SimpleNamespace | None:
+        """Job of this process or saved job of another one"""
+
+        job = self._jobs.get(job_id)
+        if job is None:
+            return await self.store.get(job_id, self.kind)
+        return job
+
+    def _forget_finished(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished[: max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    async def save(self, job: Job) -> None:
+        """Save job state, errors are only logged"""
+
+        try:
+            await self.store.save(job)
+        except Exception:
+            logger.exception("%s %s state is not saved", type(job).__name__, job.id)
+
+    async def _save_progress(self, job: Job) -> None:
+        while True:
+            await asyncio.sleep(self.save_interval)
+            await self.save(job)
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.state = JobState.running
+            await self.save(job)
+            progress = asyncio.create_task(self._save_progress(job))
+            try:
+                await self.handler(job)
+            except asyncio.CancelledError as e:
+                job.finish(JobState.failed, "Cancelled on shutdown")
+                raise e
+            except Exception as e:
+                logger.exception("%s %s failed", type(job).__name__, job.id)
+                job.finish(JobState.failed, str(e))
+            else:
+                job.finish(JobState.completed)
+            finally:
+                progress.cancel()
+                self._queue.task_done()
+                await self.save(job)
+
+
+@provide_session
+async def _create_course(data: CourseDTO, session: DBSession):
+    return await CMICourseService(session).create(data)
+
+
+async def publish_course(job: PublishJob) -> None:
+    """Upload course archive to the storage and create course"""
+
+    storage = await get_storage()
+    file_path = await storage.save_course_archive(job.archive, on_uploaded=job.track)
+
+    # content addressed courses are served through the api, which resolves
+    # course files to blobs by the manifest
+    if settings.s3_settings.content_addressed:
+        file_path = urljoin("/", COURSE_FILES_URL, file_path)
+
+    course = await _create_course(
+        CourseDTO(
+            title=job.title,
+            description=job.description,
+            file_path=os.path.join(file_path, "res/index.html"),
+        )
+    )
+    job.course_id = course.id
+
+
+@provide_session
+async def _count_enrollments(course_id: UUID, session: DBSession) -> int:
+    return await CMICourseService(session).count_enrollments(course_id)
+
+
+@provide_session
+async def _delete_enrollments(course_id: UUID, session: DBSession) -> int:
+    return await CMICourseService(session).delete_enrollments(
+        course_id, settings.course_delete_chunk_size
+    )
+
+
+def _course_lock_key(course_id: UUID) -> str:
+    return f"delete_course:{course_id}"
+
+
+async def delete_course_enrollments(job: DeleteCourseJob) -> None:
+    """Soft delete enrollments of the course by chunks
+
+    Every chunk is committed by own transaction, so row locks are short
+    and interrupted deletion is continued by the next job for the course.
+    Enrollments of the course are deleted by one job at a time, the lock
+    of the course is held by it in all worker processes.
+    """
+
+    try:
+        async with advisory_lock(_course_lock_key(job.course_id)) as locked:
+            job.lock_tried.set()
+            if not locked:
+                raise RuntimeError("Course is being deleted by another job")
+
+            job.enrollments_total = await _count_enrollments(job.course_id)
+            while True:
+                while deleted := await _delete_enrollments(job.course_id):
+                    job.enrollments_deleted += deleted
+
+                # chunk is empty also when the rest is locked by other transactions
+                if not await _count_enrollments(job.course_id):
+                    break
+                await asyncio.sleep(settings.course_delete_retry_delay)
+    finally:
+        # also when the session of the lock has failed to open
+        job.lock_tried.set()
+
+
+job_queue_backends: dict[str, Callable[..., IJobQueue]] = {
+    "in_process": InProcessJobQueue,
+}
+
+job_store = JobStore()
+
+publish_queue: IJobQueue = job_queue_backends[settings.publish_queue_backend](
+    publish_course,
+    kind=PublishJob.kind,
+    workers=settings.publish_workers,
+    max_size=settings.publish_queue_size,
+    keep_finished=settings.publish_keep_finished,
+    store=job_store,
+    save_interval=settings.job_save_interval,
+)
+
+delete_queue: IJobQueue = job_queue_backends[settings.publish_queue_backend](
+    delete_course_enrollments,
+    kind=DeleteCourseJob.kind,
+    workers=settings.course_delete_workers,
+    max_size=settings.course_delete_queue_size,
+    keep_finished=settings.publish_keep_finished,
+    store=job_store,
+    save_interval=settings.job_save_interval,
+)
+
+
+def get_publish_queue() -> IJobQueue:
+    return publish_queue
+
+
+def get_delete_queue() -> IJobQueue:
+    return delete_queue
+
+
+@provide_session
+async def _get_deleting_ids(session: DBSession) -> list[UUID]:
+    """Courses with enrollments left, which are not deleted by any job"""
+
+    return [
+        course_id
+        for course_id in await CMICourseService(session).get_deleting_ids()
+        if not (
+            await session.execute(
+                select(advisory_lock_held(_course_lock_key(course_id)))
+            )
+        ).scalar()
+    ]
+
+
+async def _resume_course_deletions() -> None:
+    try:
+        # workers started together look for unfinished deletions once
+        async with advisory_lock("resume_course_deletions") as locked:
+            if not locked:
+                return
+
+            jobs = []
+            for course_id in await _get_deleting_ids():
+                job = DeleteCourseJob(course_id=course_id)
+                try:
+                    await delete_queue.submit(job)
+                except QueueFull:
+                    logger.warning("Deletion of course %s is not resumed", course_id)
+                else:
+                    jobs.append(job)
+
+            # held until the jobs hold locks of their courses, workers
+            # scanning after it skip the courses
+            await asyncio.gather(*(job.lock_tried.wait() for job in jobs))
+    except Exception:
+        logger.exception("Course deletions are not resumed")
+
+
+resume_tasks: set[asyncio.Task] = set()
+
+
+async def resume_course_deletions() -> asyncio.Task:
+    """Continue deletions of courses which still have enrollments
+
+    Runs in background, so the app is started without waiting for the
+    database. Courses deleted by jobs of any worker are not resumed, a
+    course is deleted by one job, see `delete_course_enrollments`.
+
+    Returns:
+        asyncio.Task: background task resuming deletions
+    """
+
+    task = asyncio.create_task(_resume_course_deletions())
+    resume_tasks.add(task)
+    task.add_done_callback(resume_tasks.discard)
+    return task
+
+
+async def stop_resuming_course_deletions() -> None:
+    for task in resume_tasks:
+        task.cancel()
+    await asyncio.gather(*resume_tasks, return_exceptions=True)
@@ -1,7 +1,7 @@
 import datetime
 from uuid import UUID, uuid4
 
-from sqlalchemy import Column, DateTime, ForeignKey, String
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String, text
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import relationship
 
@@ -31,6 +31,29 @@ class CMICourse(Base):
 
 class CMIEnrollment(Base):
     __tablename__ = "cmi5_course_users"
+    __table_args__ = (
+        # also serves lookups by course only
+        Index(
+            "ix_cmi5_course_users_course_id_user_id",
+            "course_id",
+            "user_id",
+            unique=True,
+        ),
+        Index("ix_cmi5_course_users_user_id", "user_id"),
+        Index("ix_cmi5_course_users_statement_id", "statement_id"),
+        # reads skip enrollments of deleted courses, full indexes above
+        # are kept for foreign key checks and the unique constraint
+        Index(
+            "ix_cmi5_course_users_course_id_not_deleted",
+            "course_id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_cmi5_course_users_user_id_not_deleted",
+            "user_id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+    )
 
     id: Column[UUID] = Column(
         postgresql.UUID(as_uuid=True),
@@ -53,7 +76,26 @@ class CMIEnrollment(Base):
         ForeignKey("cmi_statements.id"),
         nullable=True,
     )
+    deleted_at: Column[datetime.datetime] = Column(DateTime)
 
     course: "CMICourse" = relationship("CMICourse")
     user: "User" = relationship("User")
     statement: "CMIStatement" = relationship("CMIStatement")
+
+
+class CourseJob(Base):
+    """State of a background course job, shared by all worker processes"""
+
+    __tablename__ = "course_jobs"
+
+    id: Column[UUID] = Column(postgresql.UUID(as_uuid=True), primary_key=True)
+    kind: Column[str] = Column(String, nullable=False)
+    state: Column[str] = Column(String, nullable=False)
+    course_id: Column[UUID] = Column(postgresql.UUID(as_uuid=True), nullable=True)
+    # job specific counters
+    progress: Column[dict] = Column(
+        postgresql.JSONB, nullable=False, server_default=text("'{}'")
+    )
+    error: Column[str] = Column(String, nullable=True)
+    created_at: Column[datetime.datetime] = Column(DateTime, nullable=False)
+    finished_at: Column[datetime.datetime] = Column(DateTime, nullable=True)
@@ -1,3 +1,6 @@
+import csv
+import json
+from typing import AsyncIterator
 from uuid import UUID
 
 from fastapi import (
@@ -6,39 +9,99 @@ from fastapi import (
     Depends,
     File,
     HTTPException,
+    Request,
+    Response,
     UploadFile,
 )
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import RedirectResponse, StreamingResponse
+import pydantic
 
+from config import settings
+
+from modules.courses.cache import course_cache
+from modules.courses.jobs import (
+    DeleteCourseJob,
+    IJobQueue,
+    JobState,
+    PublishJob,
+    QueueFull,
+    delete_queue,
+    get_delete_queue,
+    get_publish_queue,
+    publish_queue,
+    resume_course_deletions,
+    stop_resuming_course_deletions,
+)
 from modules.courses.schema import (
     CMICourseRead,
     CMICoursesBase,
     CMIEnrollementCreate,
     CMIEnrollementRead,
+    CMIEnrollmentsBulkCreate,
+    CMIEnrollmentsBulkResult,
+    DeleteCourseJobRead,
+    PublishJobRead,
+)
+from modules.courses.service import (
+    CMICourseService,
+    EnrollmentPair,
+    EnrollmentResultStatus,
 )
-from modules.courses.service import CMICourseService, CourseDTO
-from modules.users.services import UserService
 import logging
-from shared.utils import extract_zip
-from storage.storage import IStorage, LocalStorage
-from shutil import rmtree
-import os.path
+from shared.pagination import Pagination
+from shared.responses import (
+    NDJSON_MEDIA_TYPE,
+    FastJSONResponse,
+    RecordsResponse,
+    accepts_ndjson,
+    ndjson_response,
+)
+from shared.utils import aiter_lines, detach_upload, open_zip, urljoin
+from starlette.concurrency import run_in_threadpool
+from storage.storage import IAsyncStorage, get_storage, shared_storage
+from storage.utils import get_content_type
+from zipfile import BadZipFile
 
 logger = logging.getLogger(__name__)
 
-courses_router = APIRouter(tags=["courses"], prefix="/api/courses")
+courses_router = APIRouter(
+    tags=["courses"],
+    prefix="/api/courses",
+    default_response_class=FastJSONResponse,
+    on_startup=[
+        course_cache.start,
+        shared_storage.start,
+        publish_queue.start,
+        delete_queue.start,
+        resume_course_deletions,
+    ],
+    on_shutdown=[
+        stop_resuming_course_deletions,
+        publish_queue.stop,
+        delete_queue.stop,
+        shared_storage.stop,
+        course_cache.stop,
+    ],
+)
 
 
 @courses_router.post(
-    "", response_model=CMICourseRead, name="courses:create_cmi5_course"
+    "",
+    response_model=PublishJobRead,
+    status_code=202,
+    name="courses:create_cmi5_course",
 )
 async def create_cmi5_course(
     title: str = Body(..., description="Course Title"),
     description: str = Body(..., description="Course Description"),
     file: UploadFile = File(...),
-    cmi_course_service: CMICourseService = Depends(CMICourseService),
-    storage: IStorage = Depends(LocalStorage),
+    queue: IJobQueue = Depends(get_publish_queue),
 ):
-    """Create CMI5 Course"""
+    """Create CMI5 Course
+
+    Archive is published in background, course is created when upload completes
+    """
 
     content_type = ""
 
@@ -54,38 +117,182 @@ async def create_cmi5_course(
             status_code=400,
         )
 
-    folder_path = extract_zip(file)
+    try:
+        archive = await run_in_threadpool(open_zip, file)
+    except BadZipFile:
+        raise HTTPException(
+            detail="Uploading Failed: Bad archive or file",
+            status_code=400,
+        )
 
-    if content_type == "zip" and not os.path.exists(f"{folder_path}/cmi5.xml"):
-        rmtree(folder_path)
+    if content_type == "zip" and "cmi5.xml" not in archive.namelist():
+        archive.close()
         raise HTTPException(
             detail="Failed to retrieve course structure data from zip: not found cmi5.xml file",
             status_code=400,
         )
 
-    file_path = storage.save_course_folder(folder_path)
-
-    data = CourseDTO(
+    job = PublishJob(
         title=title,
         description=description,
-        file_path=os.path.join(file_path, "res/index.html"),
+        archive=archive,
+        file=detach_upload(file),
     )
 
-    course = await cmi_course_service.create(data)
-    # delete local folder after uploading scorm course on s3 bucket
-    rmtree(folder_path)
-    return course
+    try:
+        await queue.submit(job)
+    except QueueFull:
+        job.finish(JobState.failed, "Publish queue is full")
+        raise HTTPException(
+            detail="Too many courses are publishing, try again later",
+            status_code=503,
+        )
+
+    return PublishJobRead.from_orm(job)
+
+
+@courses_router.get(
+    "/jobs/{job_id}",
+    response_model=PublishJobRead,
+    name="courses:get_publish_job",
+)
+async def get_publish_job(
+    job_id: UUID,
+    queue: IJobQueue = Depends(get_publish_queue),
+):
+    """Get course publishing progress"""
+
+    job = await queue.get(job_id)
+
+    if not job:
+        raise HTTPException(detail="Job not found", status_code=404)
+
+    return PublishJobRead.from_orm(job)
+
+
+@courses_router.delete(
+    "/{course_id}",
+    response_model=DeleteCourseJobRead,
+    status_code=202,
+    name="courses:delete_course",
+)
+async def delete_course(
+    course_id: UUID,
+    cmi_course_service: CMICourseService = Depends(CMICourseService),
+    queue: IJobQueue = Depends(get_delete_queue),
+):
+    """Delete course
+
+    Course is not available right away, its enrollments are deleted in background
+    """
+
+    course = await cmi_course_service.get_by_id(course_id)
+
+    if not course:
+        raise HTTPException(detail="Курс не найден", status_code=404)
+
+    await cmi_course_service.delete(course)
+
+    job = DeleteCourseJob(course_id=course.id)
+    try:
+        await queue.submit(job)
+    except QueueFull:
+        # the course is deleted already, the failed job is saved so it is
+        # polled as any other one
+        job.finish(
+            JobState.failed,
+            "Delete queue is full, enrollments are deleted on the next startup",
+        )
+        await queue.save(job)
+
+    return DeleteCourseJobRead.from_orm(job)
+
+
+@courses_router.get(
+    "/deletions/{job_id}",
+    response_model=DeleteCourseJobRead,
+    name="courses:get_delete_job",
+)
+async def get_delete_job(
+    job_id: UUID,
+    queue: IJobQueue = Depends(get_delete_queue),
+):
+    """Get course deletion progress"""
+
+    job = await queue.get(job_id)
+
+    if not job:
+        raise HTTPException(detail="Job not found", status_code=404)
+
+    return DeleteCourseJobRead.from_orm(job)
+
+
+@courses_router.get(
+    "/files/{file_path:path}",
+    response_class=RedirectResponse,
+    name="courses:get_course_file",
+)
+async def get_course_file(
+    file_path: str,
+    storage: IAsyncStorage = Depends(get_storage),
+):
+    """Get the course file
+
+    Files of content addressed courses are stored as blobs, they are
+    streamed under the course path, so relative links of course pages
+    are resolved against the course folder. Other files are redirected
+    to the storage by the same path.
+    """
+
+    object_name = await storage.get_course_object(file_path)
+
+    if not object_name:
+        raise HTTPException(detail="File not found", status_code=404)
+
+    if object_name != file_path.strip("/"):
+        return StreamingResponse(
+            storage.iter_object(object_name),
+            media_type=get_content_type(file_path),
+            # course folders are never changed
+            headers={"Cache-Control": "public, max-age=31536000, immutable"},
+        )
+
+    return RedirectResponse(
+        urljoin(settings.storage_url, settings.s3_settings.bucket_name, object_name)
+    )
 
 
 @courses_router.get(
     "/all", response_model=list[CMICoursesBase], name="courses:get_cmi5_all_courses"
 )
 async def get_cmi5_all_courses(
+    request: Request,
+    response: Response,
+    pagination: Pagination = Depends(),
     cmi_course_service: CMICourseService = Depends(CMICourseService),
 ):
-    """Get all courses"""
+    """Get all courses
 
-    courses = await cmi_course_service.get_all()
+    Page of courses ordered by id, cursor of the next page is passed
+    in X-Next-Cursor header. All courses are streamed as NDJSON
+    if it is requested by Accept header.
+    """
+
+    if accepts_ndjson(request):
+        return ndjson_response(
+            lambda session: CMICourseService(session).stream_all(), CMICoursesBase
+        )
+
+    if settings.fast_read_path:
+        records = await cmi_course_service.get_all_records(
+            pagination.cursor, pagination.limit
+        )
+        response = RecordsResponse(records)
+        pagination.set_next_cursor(response, pagination.next_cursor(records))
+        return response
+
+    courses = await cmi_course_service.get_all(pagination.cursor, pagination.limit)
+    pagination.set_next_cursor(response, pagination.next_cursor(courses))
 
     return courses
 
@@ -117,26 +324,106 @@ async def get_cmi5_course(
 )
 async def set_enrollment(
     data: CMIEnrollementCreate,
-    user_service: UserService = Depends(UserService),
     cmi_course_service: CMICourseService = Depends(CMICourseService),
 ):
     """Assign course on user"""
-    course = await cmi_course_service.get_by_id(data.course_id)
-    if not course:
-        raise HTTPException(detail="Курс не найден", status_code=404)
+    result = await cmi_course_service.set_enrollment(data.course_id, data.user_id)
 
-    user = await user_service.get_by_id(data.user_id)
+    if result.status == EnrollmentResultStatus.course_not_found:
+        raise HTTPException(detail="Курс не найден", status_code=404)
 
-    if not user:
+    if result.status == EnrollmentResultStatus.user_not_found:
         raise HTTPException(detail="Пользователь не найден", status_code=404)
 
-    enrollment = await cmi_course_service.get_enrollment(course.id, user.id)
-
-    if enrollment:
+    if result.status == EnrollmentResultStatus.exists:
         raise HTTPException(
             detail="Курс уже назначен на пользователя",
             status_code=400,
         )
 
-    enrollment = await cmi_course_service.set_enrollment(course, user)
-    return enrollment
+    return result.enrollment
+
+
+CSV_MEDIA_TYPE = "text/csv"
+
+
+async def _iter_enrollment_pairs(request: Request) -> AsyncIterator[EnrollmentPair]:
+    """Course and user ids from the bulk enrollment body
+
+    JSON body enrolls every user to every course, NDJSON and CSV bodies
+    are streamed by lines of course and user ids.
+    """
+
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith((NDJSON_MEDIA_TYPE, CSV_MEDIA_TYPE)):
+        line_number = 0
+        try:
+            async for line in aiter_lines(request.stream()):
+                line_number += 1
+                try:
+                    if content_type.startswith(CSV_MEDIA_TYPE):
+                        course_id, user_id = next(csv.reader([line]))
+                        if line_number == 1 and course_id == "course_id":
+                            continue
+                    else:
+                        item = json.loads(line)
+                        course_id, user_id = item["course_id"], item["user_id"]
+                    pair = UUID(course_id), UUID(user_id)
+                except (ValueError, KeyError, TypeError):
+                    raise HTTPException(
+                        detail=f"Некорректная строка {line_number}", status_code=422
+                    )
+                yield pair
+        except UnicodeDecodeError:
+            raise HTTPException(
+                detail=f"Некорректная строка {line_number + 1}", status_code=422
+            )
+        return
+
+    try:
+        data = CMIEnrollmentsBulkCreate.parse_raw(await request.body())
+    except pydantic.ValidationError as e:
+        raise RequestValidationError(e.raw_errors)
+
+    for course_id in data.course_ids:
+        for user_id in data.user_ids:
+            yield course_id, user_id
+
+
+@courses_router.post(
+    "/enrollment/bulk",
+    name="courses:set_enrollments_bulk",
+    response_model=CMIEnrollmentsBulkResult,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "schema": CMIEnrollmentsBulkCreate.schema(),
+                },
+                NDJSON_MEDIA_TYPE: {
+                    "schema": {
+                        "type": "string",
+                        "example": '{"course_id": "...", "user_id": "..."}',
+                    },
+                },
+                CSV_MEDIA_TYPE: {
+                    "schema": {"type": "string", "example": "course_id,user_id"},
+                },
+            },
+            "required": True,
+        },
+    },
+)
+async def set_enrollments_bulk(
+    request: Request,
+    cmi_course_service: CMICourseService = Depends(CMICourseService),
+):
+    """Assign many courses on many users
+
+    Unknown courses and users and already assigned courses are skipped.
+    """
+
+    result = await cmi_course_service.set_enrollments(_iter_enrollment_pairs(request))
+
+    return CMIEnrollmentsBulkResult.from_orm(result)
@@ -1,3 +1,4 @@
+import datetime
 from uuid import UUID
 
 import pydantic
@@ -7,6 +8,18 @@ from config import settings
 from shared.utils import urljoin
 
 
+BUCKET_PATH = urljoin("/", settings.s3_settings.bucket_name)
+
+
+def course_file_link(link: str | None) -> str | None:
+    """Public link of the course file, stored links are relative to the bucket"""
+
+    if link and not link.startswith((BUCKET_PATH, "/api/")):
+        path = link.strip("/")
+        return f"{BUCKET_PATH}/{path}" if path else BUCKET_PATH
+    return link
+
+
 class CMICoursesBase(pydantic.BaseModel):
     id: UUID
     title: str
@@ -15,9 +28,7 @@ class CMICoursesBase(pydantic.BaseModel):
 
     @pydantic.validator("file_link")
     def validate_link(cls, v) -> str | None:
-        if v and not v.startswith(urljoin("/", settings.s3_settings.bucket_name)):
-            return urljoin("/", settings.s3_settings.bucket_name, v)
-        return v
+        return course_file_link(v)
 
     class Config:
         orm_mode = True
@@ -33,6 +44,21 @@ class CMIEnrollementCreate(pydantic.BaseModel):
     user_id: UUID
 
 
+class CMIEnrollmentsBulkCreate(pydantic.BaseModel):
+    """Every user is enrolled to every course"""
+
+    course_ids: pydantic.conlist(UUID, min_items=1)
+    user_ids: pydantic.conlist(UUID, min_items=1)
+
+
+class CMIEnrollmentsBulkResult(pydantic.BaseModel):
+    created: int
+    skipped: int
+
+    class Config:
+        orm_mode = True
+
+
 class CMIEnrollementRead(pydantic.BaseModel):
     course: CMICoursesBase
     user: UserRead
@@ -44,3 +70,33 @@ class CMIEnrollementRead(pydantic.BaseModel):
 class CMIUserCourseFull(pydantic.BaseModel):
     user_id: UUID
     courses: list[CMICoursesBase]
+
+
+class PublishJobRead(pydantic.BaseModel):
+    id: UUID
+    state: str
+    objects_total: int
+    objects_uploaded: int
+    bytes_total: int
+    bytes_processed: int
+    course_id: UUID | None
+    error: str | None
+    created_at: datetime.datetime
+    finished_at: datetime.datetime | None
+
+    class Config:
+        orm_mode = True
+
+
+class DeleteCourseJobRead(pydantic.BaseModel):
+    id: UUID
+    state: str
+    course_id: UUID
+    enrollments_total: int
+    enrollments_deleted: int
+    error: str | None
+    created_at: datetime.datetime
+    finished_at: datetime.datetime | None
+
+    class Config:
+        orm_mode = True
@@ -1,19 +1,69 @@
 from dataclasses import dataclass
 import datetime
+from enum import StrEnum
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable
 from uuid import UUID, uuid4
 
 from fastapi import Depends
-from sqlalchemy import and_, select, update
-from sqlalchemy.orm import selectinload
-
+from sqlalchemy import and_, cast, func, literal, select, true, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import aliased, make_transient_to_detached, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.expression import ColumnElement
+
+from config import settings
+from database.context import get_identity_cache
 from database.db import DBSession
-from database.session import get_session
+from database.session import get_session, read_only
+from shared.cache import MISSING, CacheKey, dump_rows, load_rows
+from shared.pagination import paginate
+from modules.courses.cache import (
+    CATALOGUE,
+    COURSE,
+    COURSE_USERS,
+    get_course_cache,
+)
 from modules.courses.models import CMIEnrollment
+from modules.courses.schema import course_file_link
 from modules.users.models import User
 
 from .models import CMICourse
 
 
+@dataclass(slots=True)
+class CourseRecord:
+    """Course as it is sent by the api, serialized without pydantic"""
+
+    id: UUID
+    title: str
+    description: str
+    file_link: str | None
+
+
+class EnrollmentResultStatus(StrEnum):
+    created: str = "created"
+    exists: str = "exists"
+    course_not_found: str = "course_not_found"
+    user_not_found: str = "user_not_found"
+
+
+@dataclass
+class EnrollmentResult:
+    status: EnrollmentResultStatus
+    enrollment: CMIEnrollment | None = None
+
+
+@dataclass
+class BulkEnrollmentResult:
+    created: int = 0
+    skipped: int = 0
+
+
+EnrollmentPair = tuple[UUID, UUID]
+
+UUID_ARRAY = postgresql.ARRAY(postgresql.UUID(as_uuid=True))
+
+
 @dataclass
 class CourseDTO:
     title: str
@@ -29,7 +79,26 @@ class CMICourseService:
         session: DBSession = Depends(get_session),
     ):
         self.session = session
+        self.identity = get_identity_cache()
+        self.cache = get_course_cache()
 
+    async def _cached(
+        self,
+        key: CacheKey,
+        model: type,
+        load: Callable[[], Awaitable[list]],
+    ) -> list:
+        """Read rows through the cross-request cache"""
+
+        rows = await self.cache.get(key)
+        if rows is not MISSING:
+            return await load_rows(self.session, model, rows)
+
+        objs = await load()
+        await self.cache.set(key, dump_rows(objs))
+        return objs
+
+    @read_only
     async def get_by_id(self, course_id: UUID) -> CMICourse | None:
         """Get course by id
 
@@ -39,19 +108,30 @@ class CMICourseService:
         Returns:
             CMICourse | None: course instance or none
         """
-        course = (
-            await self.session.execute(
-                select(self.model).where(
-                    and_(
-                        self.model.id == course_id,
-                        self.model.deleted_at.is_(None),
+
+        async def query() -> list[CMICourse]:
+            return (
+                (
+                    await self.session.execute(
+                        select(self.model).where(
+                            and_(
+                                self.model.id == course_id,
+                                self.model.deleted_at.is_(None),
+                            )
+                        )
                     )
                 )
+                .scalars()
+                .all()
             )
-        ).scalar()
 
-        return course
+        async def load() -> CMICourse | None:
+            courses = await self._cached((COURSE, course_id), self.model, query)
+            return courses[0] if courses else None
+
+        return await self.identity.get_or_load((self.model, course_id), load)
 
+    @read_only
     async def get_by_user_id(self, user_id: UUID) -> list[CMICourse | None]:
         """Get course by user id
 
@@ -68,6 +148,7 @@ class CMICourseService:
                     .join(CMIEnrollment, self.model.id == CMIEnrollment.course_id)
                     .where(
                         CMIEnrollment.user_id == user_id,
+                        CMIEnrollment.deleted_at.is_(None),
                         self.model.deleted_at.is_(None),
                     )
                 )
@@ -98,12 +179,16 @@ class CMICourseService:
 
         self.session.add(course)
         await self.session.commit()
+        await self.cache.invalidate(CATALOGUE)
 
         return course
 
     async def delete(self, course: CMICourse) -> None:
         """
-        Delete CMI5 Course and all CMIEnrollment rows by this course
+        Delete CMI5 Course
+
+        Enrollments of the course are not read after it and are soft deleted
+        by chunks in background, see delete_enrollments.
 
         Args:
             course (CMICourse): CMI5Course object
@@ -112,38 +197,78 @@ class CMICourseService:
             None:
         """
 
-        await self.session.execute(
-            update(CMIEnrollment)
-            .where(CMIEnrollment.course_id == course.id)
-            .values(deleted_at=datetime.datetime.utcnow())
-        )
-
         await self.session.execute(
             update(self.model)
             .where(self.model.id == course.id)
             .values(deleted_at=datetime.datetime.utcnow())
         )
+        await self.session.commit()
 
-    async def get_users(self, course: CMICourse) -> list[User | None]:
-        """Get users by CMI5Course
+        self.identity.invalidate(self.model, CMIEnrollment)
+        await self.cache.delete((COURSE, course.id))
+        await self.cache.delete((COURSE_USERS, course.id))
+        await self.cache.invalidate(CATALOGUE)
+
+    async def count_enrollments(self, course_id: UUID) -> int:
+        """Count not deleted enrollments of the course"""
+
+        return (
+            await self.session.execute(
+                select(func.count()).where(
+                    CMIEnrollment.course_id == course_id,
+                    CMIEnrollment.deleted_at.is_(None),
+                )
+            )
+        ).scalar()
+
+    async def delete_enrollments(self, course_id: UUID, limit: int) -> int:
+        """Soft delete next chunk of enrollments of the course and commit it
+
+        Rows locked by other transactions are left for the next chunk.
 
         Args:
-            course (CMICourse): course object
+            course_id (UUID): course id
+            limit (int): max enrollments deleted at once
 
         Returns:
-            list[User | None]: list with users or empty list
+            int: deleted enrollments count, zero when nothing is left
         """
 
-        users = (
+        chunk = (
+            select(CMIEnrollment.id)
+            .where(
+                CMIEnrollment.course_id == course_id,
+                CMIEnrollment.deleted_at.is_(None),
+            )
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        deleted = (
+            await self.session.execute(
+                update(CMIEnrollment)
+                .where(CMIEnrollment.id.in_(chunk))
+                .values(deleted_at=datetime.datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+        ).rowcount
+        await self.session.commit()
+        return deleted
+
+    async def get_deleting_ids(self) -> list[UUID]:
+        """Ids of deleted courses which still have not deleted enrollments"""
+
+        return (
             (
                 await self.session.execute(
-                    select(User)
-                    .join(CMIEnrollment, User.id == CMIEnrollment.user_id)
-                    .where(
-                        and_(
-                            CMIEnrollment.course_id == course.id,
-                            User.deleted_at.is_(None),
+                    select(self.model.id).where(
+                        self.model.deleted_at.is_not(None),
+                        select(CMIEnrollment.id)
+                        .where(
+                            CMIEnrollment.course_id == self.model.id,
+                            CMIEnrollment.deleted_at.is_(None),
                         )
+                        .exists(),
                     )
                 )
             )
@@ -151,7 +276,37 @@ class CMICourseService:
             .all()
         )
 
-        return users
+    @read_only
+    async def get_users(self, course: CMICourse) -> list[User | None]:
+        """Get users by CMI5Course
+
+        Args:
+            course (CMICourse): course object
+
+        Returns:
+            list[User | None]: list with users or empty list
+        """
+
+        async def query() -> list[User]:
+            return (
+                (
+                    await self.session.execute(
+                        select(User)
+                        .join(CMIEnrollment, User.id == CMIEnrollment.user_id)
+                        .where(
+                            and_(
+                                CMIEnrollment.course_id == course.id,
+                                CMIEnrollment.deleted_at.is_(None),
+                                User.deleted_at.is_(None),
+                            )
+                        )
+                    )
+                )
+                .scalars()
+                .all()
+            )
+
+        return await self._cached((COURSE_USERS, course.id), User, query)
 
     async def get_enrollment(
         self, course_id: UUID, user_id: UUID
@@ -166,72 +321,291 @@ class CMICourseService:
             CMIEnrollment | None: CMIEnrollment or None
         """
 
-        enrollment = (
-            await self.session.execute(
-                select(CMIEnrollment)
-                .where(
-                    and_(
-                        CMIEnrollment.course_id == course_id,
-                        CMIEnrollment.user_id == user_id,
-                    )
-                )
-                .options(selectinload(CMIEnrollment.statement))
-                .options(selectinload(CMIEnrollment.user))
-                .options(selectinload(CMIEnrollment.course))
+        async def load() -> CMIEnrollment | None:
+            return await self._load_enrollment(
+                and_(
+                    CMIEnrollment.course_id == course_id,
+                    CMIEnrollment.user_id == user_id,
+                ),
+                course_id,
+                user_id,
+                with_statement=True,
             )
-        ).scalar()
-        return enrollment
 
-    async def set_enrollment(self, course: CMICourse, user: User) -> CMIEnrollment:
+        return await self.identity.get_or_load(
+            (CMIEnrollment, course_id, user_id), load
+        )
+
+    async def set_enrollment(self, course_id: UUID, user_id: UUID) -> EnrollmentResult:
         """Set course on user
 
+        Course and user are checked, enrollment is inserted and its course
+        and user are read back by one statement. Concurrent assigns of
+        the same course are resolved by the unique (course_id, user_id) index.
+
         Args:
-            course (CMICourse): CMI5 Course
-            user (User): User
+            course_id (UUID): CMI5 Course id
+            user_id (UUID): User id
 
         Returns:
-            CMIEnrollment: CMI5 nrollment
+            EnrollmentResult: status and created enrollment
         """
 
+        enrollment_id = uuid4()
+        course_cte = (
+            select(self.model)
+            .where(and_(self.model.id == course_id, self.model.deleted_at.is_(None)))
+            .cte("course")
+        )
+        user_cte = (
+            select(User)
+            .where(and_(User.id == user_id, User.deleted_at.is_(None)))
+            .cte("user")
+        )
+        inserted_cte = (
+            postgresql.insert(CMIEnrollment)
+            .from_select(
+                ["id", "course_id", "user_id"],
+                select(
+                    literal(enrollment_id, CMIEnrollment.id.type),
+                    course_cte.c.id,
+                    user_cte.c.id,
+                ).join_from(course_cte, user_cte, true()),
+            )
+            .on_conflict_do_nothing(index_elements=["course_id", "user_id"])
+            .returning(CMIEnrollment.id)
+            .cte("inserted")
+        )
+        course_entity = aliased(self.model, course_cte)
+        user_entity = aliased(User, user_cte)
+
+        # one row even if course or user is not found
+        row = (
+            await self.session.execute(
+                select(course_entity, user_entity, inserted_cte.c.id)
+                .select_from(select(literal(1)).subquery())
+                .outerjoin(course_cte, true())
+                .outerjoin(user_cte, true())
+                .outerjoin(inserted_cte, true())
+            )
+        ).one()
+        course, user, inserted_id = row
+
+        if course is None:
+            return EnrollmentResult(EnrollmentResultStatus.course_not_found)
+        if user is None:
+            return EnrollmentResult(EnrollmentResultStatus.user_not_found)
+        if inserted_id is None:
+            return EnrollmentResult(EnrollmentResultStatus.exists)
+
+        await self.session.commit()
+        await self.cache.delete((COURSE_USERS, course_id))
+
         enrollment = CMIEnrollment(
-            id=uuid4(),
-            course_id=course.id,
-            user_id=user.id,
+            id=enrollment_id, course_id=course_id, user_id=user_id, statement_id=None
         )
+        make_transient_to_detached(enrollment)
         self.session.add(enrollment)
-        await self.session.commit()
+        for name, obj in (("course", course), ("user", user), ("statement", None)):
+            set_committed_value(enrollment, name, obj)
 
-        return await self._get_enrollment_by_id(enrollment.id)
+        self.identity.put((CMIEnrollment, course_id, user_id), enrollment)
+        self.identity.put((CMIEnrollment, enrollment_id), enrollment)
+        return EnrollmentResult(EnrollmentResultStatus.created, enrollment)
 
-    async def get_all(self) -> list[CMICourse | None]:
-        """Get all not deleted courses"""
+    async def set_enrollments(
+        self, pairs: AsyncIterable[EnrollmentPair]
+    ) -> BulkEnrollmentResult:
+        """Set many courses on many users in one transaction
 
-        courses = (
-            (
-                await self.session.execute(
-                    select(self.model).where(self.model.deleted_at.is_(None))
+        Pairs are inserted by chunks, every chunk is one INSERT ... SELECT
+        from unnested id arrays joined to not deleted courses and users,
+        so unknown ids and existing enrollments are skipped set-wise.
+
+        Args:
+            pairs (AsyncIterable[EnrollmentPair]): course and user ids
+
+        Returns:
+            BulkEnrollmentResult: created and skipped enrollments count
+        """
+
+        result = BulkEnrollmentResult()
+        chunk: list[EnrollmentPair] = []
+
+        async def flush() -> None:
+            created = await self._insert_enrollments(chunk)
+            result.created += created
+            result.skipped += len(chunk) - created
+            chunk.clear()
+
+        try:
+            async for pair in pairs:
+                chunk.append(pair)
+                if len(chunk) >= settings.enrollments_chunk_size:
+                    await flush()
+            if chunk:
+                await flush()
+        except Exception as e:
+            # pairs failed mid-stream, chunks inserted before aren't kept
+            await self.session.rollback()
+            raise e
+
+        if result.created:
+            await self.session.commit()
+            await self.cache.invalidate(COURSE_USERS)
+            self.identity.invalidate(CMIEnrollment)
+        return result
+
+    async def _insert_enrollments(self, pairs: list[EnrollmentPair]) -> int:
+        """Insert enrollments of existing courses and users, returns inserted count"""
+
+        rows = (
+            func.unnest(
+                cast([uuid4() for _ in pairs], UUID_ARRAY),
+                cast([pair[0] for pair in pairs], UUID_ARRAY),
+                cast([pair[1] for pair in pairs], UUID_ARRAY),
+            )
+            .table_valued("id", "course_id", "user_id")
+            .render_derived()
+        )
+        query = (
+            postgresql.insert(CMIEnrollment)
+            .from_select(
+                ["id", "course_id", "user_id"],
+                select(rows.c.id, rows.c.course_id, rows.c.user_id)
+                .join(
+                    self.model,
+                    and_(
+                        self.model.id == rows.c.course_id,
+                        self.model.deleted_at.is_(None),
+                    ),
                 )
+                .join(
+                    User,
+                    and_(User.id == rows.c.user_id, User.deleted_at.is_(None)),
+                ),
             )
-            .scalars()
-            .all()
+            .on_conflict_do_nothing(index_elements=["course_id", "user_id"])
         )
 
-        return courses
+        return (await self.session.execute(query)).rowcount
 
-    async def _get_enrollment_by_id(self, enrollment_id: UUID) -> CMIEnrollment | None:
-        """Get enrollment by id
+    @read_only
+    async def get_all(
+        self, cursor: UUID | None = None, limit: int | None = None
+    ) -> list[CMICourse | None]:
+        """Get all not deleted courses ordered by id
 
         Args:
-            enrollment_id (UUID): enrollment id
+            cursor (UUID | None): id of the last course of the previous page
+            limit (int | None): page size, all courses if not set
 
         Returns:
-            CMIEnrollment | None: enrollemnt instance or none
+            list[CMICourse | None]: list courses or empty list
         """
-        return (
+
+        async def query() -> list[CMICourse]:
+            return (
+                (
+                    await self.session.execute(
+                        paginate(
+                            select(self.model).where(self.model.deleted_at.is_(None)),
+                            self.model.id,
+                            cursor,
+                            limit,
+                        )
+                    )
+                )
+                .scalars()
+                .all()
+            )
+
+        return await self._cached((CATALOGUE, cursor, limit), self.model, query)
+
+    @read_only
+    async def get_all_records(
+        self, cursor: UUID | None = None, limit: int | None = None
+    ) -> list[CourseRecord]:
+        """Get page of courses like get_all, reading only columns by Core query
+
+        Args:
+            cursor (UUID | None): id of the last course of the previous page
+            limit (int | None): page size, all courses if not set
+
+        Returns:
+            list[CourseRecord]: list courses or empty list
+        """
+
+        key = (CATALOGUE, CourseRecord.__name__, cursor, limit)
+        records = await self.cache.get(key)
+        if records is not MISSING:
+            return records
+
+        rows = (
             await self.session.execute(
-                select(CMIEnrollment)
-                .where(CMIEnrollment.id == enrollment_id)
-                .options(selectinload(CMIEnrollment.user))
-                .options(selectinload(CMIEnrollment.course))
+                paginate(
+                    select(
+                        self.model.id,
+                        self.model.title,
+                        self.model.description,
+                        self.model.file_link,
+                    ).where(self.model.deleted_at.is_(None)),
+                    self.model.id,
+                    cursor,
+                    limit,
+                )
             )
-        ).scalar()
+        ).all()
+        records = [
+            CourseRecord(id, title, description, course_file_link(file_link))
+            for id, title, description, file_link in rows
+        ]
+
+        await self.cache.set(key, records)
+        return records
+
+    async def stream_all(self) -> AsyncIterator[CMICourse]:
+        """Iterate over all not deleted courses by server-side cursor"""
+
+        result = await self.session.stream_scalars(
+            select(self.model)
+            .where(self.model.deleted_at.is_(None))
+            .order_by(self.model.id)
+            .execution_options(yield_per=settings.stream_chunk_size)
+        )
+        async for obj in result:
+            yield obj
+
+    async def _load_enrollment(
+        self,
+        where: ColumnElement,
+        course_id: UUID | None = None,
+        user_id: UUID | None = None,
+        with_statement: bool = False,
+    ) -> CMIEnrollment | None:
+        """Select enrollment with its user and course
+
+        User and course already read by this request are attached from
+        the identity cache instead of being loaded again.
+        """
+
+        course = self.identity.peek((self.model, course_id)) if course_id else None
+        user = self.identity.peek((User, user_id)) if user_id else None
+
+        query = select(CMIEnrollment).where(where, CMIEnrollment.deleted_at.is_(None))
+        if with_statement:
+            query = query.options(selectinload(CMIEnrollment.statement))
+        if course is None:
+            query = query.options(selectinload(CMIEnrollment.course))
+        if user is None:
+            query = query.options(selectinload(CMIEnrollment.user))
+
+        enrollment = (await self.session.execute(query)).scalar()
+        if enrollment is None:
+            return None
+
+        for name, obj in (("course", course), ("user", user)):
+            if obj is not None:
+                set_committed_value(enrollment, name, obj)
+                self.identity.record_hit()
+        return enrollment
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from shared.metrics import metrics
+
+metrics_router = APIRouter(tags=["metrics"], prefix="/api/metrics")
+
+
+@metrics_router.get("", name="metrics:get_metrics")
+async def get_metrics():
+    """Get runtime metrics of the service"""
+
+    return metrics.collect()
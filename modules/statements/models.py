@@ -1,14 +1,24 @@
 import datetime
 from uuid import UUID, uuid4
 
-from sqlalchemy import Column, DateTime
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, text
 from sqlalchemy.dialects import postgresql
 
 from database.db import Base
+from shared.sqlalchemy import utcnow
 
 
 class CMIStatement(Base):
+    """Current state of enrollment statements, projection of the statement log"""
+
     __tablename__ = "cmi_statements"
+    __table_args__ = (
+        Index(
+            "ix_cmi_statements_updated_at_not_deleted",
+            "updated_at",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+    )
 
     id: Column[UUID] = Column(
         postgresql.UUID(as_uuid=True),
@@ -17,4 +27,28 @@ class CMIStatement(Base):
         index=True,
     )
     statements: Column[dict | None] = Column(postgresql.JSONB)
+    last_event_id: Column[int | None] = Column(BigInteger)
+    updated_at: Column[datetime.datetime | None] = Column(
+        DateTime, server_default=utcnow(), onupdate=utcnow()
+    )
     deleted_at: Column[datetime.datetime] = Column(DateTime)
+
+
+class CMIStatementEvent(Base):
+    """Append-only log of statements sent for enrollment"""
+
+    __tablename__ = "cmi_statement_events"
+    __table_args__ = (
+        Index("ix_cmi_statement_events_enrollment_id_id", "enrollment_id", "id"),
+    )
+
+    id: Column[int] = Column(BigInteger, primary_key=True, autoincrement=True)
+    enrollment_id: Column[UUID] = Column(
+        postgresql.UUID(as_uuid=True),
+        ForeignKey("cmi5_course_users.id"),
+        nullable=False,
+    )
+    statement: Column[dict] = Column(postgresql.JSONB, nullable=False)
+    created_at: Column[datetime.datetime] = Column(
+        DateTime, nullable=False, server_default=utcnow()
+    )
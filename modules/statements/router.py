@@ -1,18 +1,39 @@
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from config import settings
 from modules.courses.schema import CMICoursesBase
 
 from modules.courses.service import CMICourseService
 from modules.statements.schema import (
     CMIStatementBase,
+    CMIStatementBatchResult,
+    CMIStatementEventRead,
     CMIStatementRead,
+    CMIStatementsBatchCreate,
     CMIStatementsCreate,
 )
-from modules.statements.service import CMIStatementService
+from modules.statements.service import (
+    CMIStatementService,
+    StatementDTO,
+    StatementFilter,
+)
 
 from modules.users.schema import UserRead
+from shared.pagination import Pagination
+from shared.responses import (
+    FastJSONResponse,
+    RawJSONResponse,
+    RecordsResponse,
+    accepts_ndjson,
+    ndjson_response,
+)
 
-statement_router = APIRouter(tags=["statement"], prefix="/api/statement")
+statement_router = APIRouter(
+    tags=["statement"],
+    prefix="/api/statement",
+    default_response_class=FastJSONResponse,
+)
 
 
 @statement_router.post(
@@ -34,41 +55,100 @@ async def create_statement(
         raise HTTPException(
             detail="Can't get enrollment by course and user", status_code=404
         )
-    if enrollment.statement_id:
-        statement = await cmi_statement_service.update_statement(
-            enrollment.statement_id, data.statement
-        )
-        return CMIStatementRead(
+
+    statement = await cmi_statement_service.append(enrollment, data.statement)
+
+    return FastJSONResponse(
+        CMIStatementRead(
             course=CMICoursesBase.from_orm(enrollment.course),
             user=UserRead.from_orm(enrollment.user),
             statement=CMIStatementBase.from_orm(statement),
         )
-    else:
-        statement_obj = await cmi_statement_service.create(data.statement)
-        enrollment_obj = await cmi_statement_service.set_statement(
-            statement_obj, enrollment
-        )
-        return CMIStatementRead(
-            course=CMICoursesBase.from_orm(enrollment_obj.course),
-            user=UserRead.from_orm(enrollment_obj.user),
-            statement=CMIStatementBase.from_orm(statement_obj),
-        )
+    )
+
+
+@statement_router.post(
+    "/batch",
+    response_model=list[CMIStatementBatchResult],
+    name="statements:create_statements_batch",
+)
+async def create_statements_batch(
+    data: CMIStatementsBatchCreate,
+    cmi_statement_service: CMIStatementService = Depends(CMIStatementService),
+):
+    """Create or update statements for many users and courses at once"""
+
+    results = await cmi_statement_service.upsert_many(
+        [
+            StatementDTO(
+                user_id=item.user_id,
+                course_id=item.course_id,
+                statement=item.statement,
+            )
+            for item in data
+        ]
+    )
+
+    return [CMIStatementBatchResult.from_orm(result) for result in results]
 
 
 @statement_router.get(
     "/all", response_model=list[CMIStatementRead], name="statements:get_all_statements"
 )
 async def get_all_statements(
+    request: Request,
+    filters: StatementFilter = Depends(),
+    pagination: Pagination = Depends(),
     cmi_statement_service: CMIStatementService = Depends(CMIStatementService),
 ):
-    """Get all statements"""
+    """Get all statements
+
+    Statements can be filtered by course, user and time window of the last
+    update [updated_from, updated_to). Page of statements ordered by statement
+    id, cursor of the next page is passed in X-Next-Cursor header.
+    All statements are streamed as NDJSON if it is requested by Accept header.
+    """
+
+    if accepts_ndjson(request):
+        return ndjson_response(
+            lambda session: CMIStatementService(session).stream_full_rows(filters),
+            CMIStatementRead,
+        )
+
+    rows = await cmi_statement_service.get_full_rows(
+        filters, pagination.cursor, pagination.limit
+    )
+    response = FastJSONResponse([CMIStatementRead.from_orm(row) for row in rows])
+    pagination.set_next_cursor(
+        response, pagination.next_cursor(rows, key=lambda row: row.statement["id"])
+    )
+
+    return response
+
+
+@statement_router.get(
+    "/{course_id}/{user_id}/events",
+    response_model=list[CMIStatementEventRead],
+    name="statements:get_statement_events",
+)
+async def get_statement_events(
+    course_id: UUID,
+    user_id: UUID,
+    statement_service: CMIStatementService = Depends(CMIStatementService),
+    cmi_course_service: CMICourseService = Depends(CMICourseService),
+):
+    """Get all statements sent by user for course"""
+
+    enrollment = await cmi_course_service.get_enrollment(course_id, user_id)
+
+    if not enrollment:
+        raise HTTPException(
+            detail="Can't get enrollment by course and user", status_code=404
+        )
 
-    statements = await cmi_statement_service.get_all()
-    if not statements:
-        raise HTTPException(detail="Statements not found", status_code=404)
+    events = await statement_service.get_events(enrollment.id)
 
-    objs = await cmi_statement_service.get_full_objs(statements)
-    return objs
+    return FastJSONResponse([CMIStatementEventRead.from_orm(event) for event in events])
 
 
 @statement_router.get(
@@ -83,9 +163,17 @@ async def get_statement(
 ):
     """Get statement by user for course"""
 
+    if settings.statement_raw_read:
+        raw = await statement_service.get_statement_raw(course_id, user_id)
+        return RawJSONResponse(raw.json() if raw else b"{}")
+
+    if settings.fast_read_path:
+        record = await statement_service.get_statement_record(course_id, user_id)
+        return RecordsResponse(record or {})
+
     statement = await statement_service.get_statement(course_id, user_id)
 
     if not statement:
         return {}
 
-    return statement
+    return FastJSONResponse(CMIStatementBase.from_orm(statement))
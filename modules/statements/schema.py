@@ -1,7 +1,9 @@
+import datetime
 from uuid import UUID
 
 import pydantic
 
+from config import settings
 from modules.courses.schema import CMICoursesBase
 from modules.users.schema import UserRead
 
@@ -12,6 +14,21 @@ class CMIStatementsCreate(pydantic.BaseModel):
     statement: dict
 
 
+CMIStatementsBatchCreate = pydantic.conlist(
+    CMIStatementsCreate, min_items=1, max_items=settings.statements_batch_size
+)
+
+
+class CMIStatementBatchResult(pydantic.BaseModel):
+    user_id: UUID
+    course_id: UUID
+    status: str
+    statement_id: UUID | None
+
+    class Config:
+        orm_mode = True
+
+
 class CMIStatementBase(pydantic.BaseModel):
     id: UUID
     statements: dict
@@ -20,6 +37,15 @@ class CMIStatementBase(pydantic.BaseModel):
         orm_mode = True
 
 
+class CMIStatementEventRead(pydantic.BaseModel):
+    id: int
+    statement: dict
+    created_at: datetime.datetime
+
+    class Config:
+        orm_mode = True
+
+
 class CMIStatementRead(pydantic.BaseModel):
     course: CMICoursesBase
     user: UserRead
@@ -1,13 +1,95 @@
+from dataclasses import dataclass
+import datetime
+from enum import StrEnum
+from typing import AsyncIterator
 from uuid import UUID, uuid4
 
 from fastapi import Depends
-from sqlalchemy import and_, select, update
-from sqlalchemy.orm import selectinload
+from sqlalchemy import (
+    BigInteger,
+    Text,
+    and_,
+    case,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+    tuple_,
+    type_coerce,
+    update,
+    values,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.expression import CTE, ColumnElement, Select
 
+from config import settings
+from database.context import get_identity_cache
 from database.db import DBSession
-from database.session import get_session
+from database.session import get_session, read_only
 from modules.courses.models import CMICourse, CMIEnrollment
-from modules.statements.models import CMIStatement
+from modules.statements.models import CMIStatement, CMIStatementEvent
+from modules.users.models import User
+from shared.pagination import paginate
+from shared.sqlalchemy import DictBundle
+
+EMPTY_STATEMENT = cast(literal("{}"), postgresql.JSONB)
+
+
+class StatementResultStatus(StrEnum):
+    created: str = "created"
+    updated: str = "updated"
+    not_found: str = "not_found"
+
+
+@dataclass
+class StatementDTO:
+    user_id: UUID
+    course_id: UUID
+    statement: dict
+
+
+@dataclass(slots=True)
+class StatementRecord:
+    """Statement as it is sent by the api, serialized without pydantic"""
+
+    id: UUID
+    statements: dict | None
+
+
+@dataclass(slots=True)
+class RawStatementRecord:
+    """Statement with statements as stored JSON text"""
+
+    id: UUID
+    statements: str | None
+
+    def json(self) -> bytes:
+        """Statement document, statements text is spliced as is"""
+
+        return b'{"id":"%s","statements":%s}' % (
+            str(self.id).encode(),
+            self.statements.encode() if self.statements is not None else b"null",
+        )
+
+
+@dataclass
+class StatementFilter:
+    course_id: UUID | None = None
+    user_id: UUID | None = None
+    updated_from: datetime.datetime | None = None
+    updated_to: datetime.datetime | None = None
+
+
+@dataclass
+class StatementResult:
+    user_id: UUID
+    course_id: UUID
+    status: StatementResultStatus
+    statement_id: UUID | None = None
 
 
 class CMIStatementService:
@@ -15,9 +97,17 @@ class CMIStatementService:
 
     def __init__(self, session: DBSession = Depends(get_session)):
         self.session = session
+        self.identity = get_identity_cache()
 
-    async def get_all(self) -> list[CMIStatement]:
-        """Get all statements
+    @read_only
+    async def get_all(
+        self, cursor: UUID | None = None, limit: int | None = None
+    ) -> list[CMIStatement]:
+        """Get all statements ordered by id
+
+        Args:
+            cursor (UUID | None): id of the last statement of the previous page
+            limit (int | None): page size, all statements if not set
 
         Returns:
             list[CMIStatement]: list statements or empty list
@@ -25,7 +115,12 @@ class CMIStatementService:
         objs = (
             (
                 await self.session.execute(
-                    select(self.model).where(self.model.deleted_at.is_(None))
+                    paginate(
+                        select(self.model).where(self.model.deleted_at.is_(None)),
+                        self.model.id,
+                        cursor,
+                        limit,
+                    )
                 )
             )
             .scalars()
@@ -35,82 +130,192 @@ class CMIStatementService:
         return objs
 
     async def get_by_id(self, statement_id: UUID) -> CMIStatement:
-        return (
-            await self.session.execute(
-                select(self.model).where(self.model.id == statement_id)
+        async def load() -> CMIStatement | None:
+            return (
+                await self.session.execute(
+                    select(self.model).where(self.model.id == statement_id)
+                )
+            ).scalar()
+
+        return await self.identity.get_or_load((self.model, statement_id), load)
+
+    def _fold(self, statement: ColumnElement, event_id: ColumnElement | int) -> dict:
+        """Values folding statement event into the current state
+
+        Statement of the event replaces the current state unless a newer event
+        is already folded in, with `statement_merge` it is shallow merged.
+
+        Args:
+            statement (ColumnElement): JSONB statement of the event
+            event_id (ColumnElement | int): id of the event
+
+        Returns:
+            dict: values of statement columns
+        """
+        if settings.statement_merge:
+            statements = func.coalesce(self.model.statements, EMPTY_STATEMENT).concat(
+                statement
+            )
+        else:
+            statements = case(
+                (func.coalesce(self.model.last_event_id, 0) < event_id, statement),
+                else_=self.model.statements,
             )
-        ).scalar()
 
-    async def update_statement(
-        self, statement_id: UUID, new_statement: dict
-    ) -> CMIStatement:
-        await self.session.execute(
-            update(self.model)
-            .where(self.model.id == statement_id)
-            .values(statements=new_statement)
+        return dict(
+            statements=statements,
+            last_event_id=func.greatest(self.model.last_event_id, event_id),
+        )
+
+    def _append_event(self, enrollment_id: UUID, statement: dict) -> CTE:
+        return (
+            insert(CMIStatementEvent)
+            .values(enrollment_id=enrollment_id, statement=statement)
+            .returning(CMIStatementEvent.id)
+            .cte("event")
         )
 
-        return await self.get_by_id(statement_id)
+    async def update_statement(
+        self, enrollment: CMIEnrollment, new_statement: dict
+    ) -> Row:
+        """Append statement to the log and fold it into enrollment statement
 
-    async def create(self, statement: dict) -> CMIStatement:
-        """Create statement for User by course
+        Both are done by one query, of concurrent writes the one with the
+        newest event is kept, every one of them stays in the log.
 
         Args:
-            statement (dict): statement data
+            enrollment (CMIEnrollment): enrollment with statement
+            new_statement (dict): statement data
 
         Returns:
-            CMIStatement: statement object
+            Row: current statement state (id, statements)
         """
-        statement = CMIStatement(
-            id=uuid4(),
-            statements=statement,
-        )
-        self.session.add(statement)
-        await self.session.commit()
-        await self.session.refresh(statement)
+        event = self._append_event(enrollment.id, new_statement)
 
-        return statement
+        return (
+            await self.session.execute(
+                update(self.model)
+                .add_cte(event)
+                .where(self.model.id == enrollment.statement_id)
+                .values(
+                    **self._fold(
+                        type_coerce(new_statement, postgresql.JSONB),
+                        select(event.c.id).scalar_subquery(),
+                    )
+                )
+                .returning(self.model.id, self.model.statements)
+                .execution_options(synchronize_session=False)
+            )
+        ).one()
 
-    async def set_statement(
-        self, statement: CMIStatement, enrollment: CMIEnrollment
-    ) -> CMIEnrollment:
-        """Set statement for user by course
+    async def create(self, enrollment: CMIEnrollment, statement: dict) -> Row:
+        """Create statement for User by course
 
         Args:
-            statement (CMIStatement): Statement object
-            enrollment (CMIEnrollment): Enrollment object
+            enrollment (CMIEnrollment): enrollment without statement
+            statement (dict): statement data
 
         Returns:
-            CMIEnrollment: Updated statement object
+            Row: current statement state (id, statements)
         """
-        await self.session.execute(
-            update(CMIEnrollment)
-            .where(CMIEnrollment.id == enrollment.id)
-            .values(statement_id=statement.id)
-        )
+        event = self._append_event(enrollment.id, statement)
+
         obj = (
             await self.session.execute(
-                select(CMIEnrollment)
-                .where(CMIEnrollment.id == enrollment.id)
-                .options(
-                    selectinload(
-                        CMIEnrollment.user,
-                    )
+                insert(self.model)
+                .add_cte(event)
+                .values(
+                    id=uuid4(),
+                    statements=statement,
+                    last_event_id=select(event.c.id).scalar_subquery(),
                 )
-                .options(
-                    selectinload(
-                        CMIEnrollment.course,
-                    )
+                .returning(
+                    self.model.id, self.model.statements, self.model.last_event_id
                 )
-                .options(
-                    selectinload(
-                        CMIEnrollment.statement,
+            )
+        ).one()
+
+        linked = (
+            await self.session.execute(
+                update(CMIEnrollment)
+                .where(
+                    and_(
+                        CMIEnrollment.id == enrollment.id,
+                        CMIEnrollment.statement_id.is_(None),
                     )
                 )
+                .values(statement_id=obj.id)
+                .returning(CMIEnrollment.id)
+                .execution_options(synchronize_session=False)
             )
         ).scalar()
-        return obj
 
+        if linked:
+            return obj
+
+        # concurrent request has created statement for the enrollment first,
+        # fold ours into it, the event is already in the log
+        await self.session.execute(delete(self.model).where(self.model.id == obj.id))
+        return (
+            await self.session.execute(
+                update(self.model)
+                .where(
+                    self.model.id
+                    == select(CMIEnrollment.statement_id)
+                    .where(CMIEnrollment.id == enrollment.id)
+                    .scalar_subquery()
+                )
+                .values(
+                    **self._fold(
+                        type_coerce(statement, postgresql.JSONB), obj.last_event_id
+                    )
+                )
+                .returning(self.model.id, self.model.statements)
+                .execution_options(synchronize_session=False)
+            )
+        ).one()
+
+    async def append(self, enrollment: CMIEnrollment, statement: dict) -> Row:
+        """Append statement for user by course
+
+        Args:
+            enrollment (CMIEnrollment): Enrollment object
+            statement (dict): statement data
+
+        Returns:
+            Row: current statement state (id, statements)
+        """
+        # statement rows and statement links of enrollments are written
+        # by core queries, cached objects would be stale
+        self.identity.invalidate(self.model, CMIEnrollment)
+
+        if enrollment.statement_id:
+            return await self.update_statement(enrollment, statement)
+        return await self.create(enrollment, statement)
+
+    @read_only
+    async def get_events(self, enrollment_id: UUID) -> list[CMIStatementEvent]:
+        """Get statements log of enrollment
+
+        Args:
+            enrollment_id (UUID): enrollment id
+
+        Returns:
+            list[CMIStatementEvent]: statements in the order they were sent
+        """
+        return (
+            (
+                await self.session.execute(
+                    select(CMIStatementEvent)
+                    .where(CMIStatementEvent.enrollment_id == enrollment_id)
+                    .order_by(CMIStatementEvent.id)
+                )
+            )
+            .scalars()
+            .all()
+        )
+
+    @read_only
     async def get_statement(
         self, course_id: UUID, user_id: UUID
     ) -> CMIEnrollment | None:
@@ -132,6 +337,7 @@ class CMIStatementService:
                     and_(
                         CMIEnrollment.user_id == user_id,
                         CMIEnrollment.course_id == course_id,
+                        CMIEnrollment.deleted_at.is_(None),
                         CMICourse.deleted_at.is_(None),
                     )
                 )
@@ -140,46 +346,321 @@ class CMIStatementService:
 
         return obj
 
-    async def get_full_objs(
-        self, statements: list[CMIStatement]
-    ) -> list[CMIEnrollment | None]:
-        """Get fill objects with user, courses, and sattements by this courses
-        if this stament include in list[statements]
+    def _statement_query(self, course_id: UUID, user_id: UUID, *columns) -> Select:
+        return (
+            select(*columns)
+            .join(CMIEnrollment, CMIEnrollment.statement_id == self.model.id)
+            .join(CMICourse, CMIEnrollment.course_id == CMICourse.id)
+            .where(
+                and_(
+                    CMIEnrollment.user_id == user_id,
+                    CMIEnrollment.course_id == course_id,
+                    CMIEnrollment.deleted_at.is_(None),
+                    CMICourse.deleted_at.is_(None),
+                )
+            )
+        )
+
+    @read_only
+    async def get_statement_record(
+        self, course_id: UUID, user_id: UUID
+    ) -> StatementRecord | None:
+        """Get statement like get_statement, reading only columns by Core query
 
         Args:
-            statements (list[CMIStatement]): list of statements
+            course_id (UUID): course id
+            user_id (UUID): user id
 
         Returns:
-            list[CMIEnrollment | None]: list of enrollments or empty list
+            StatementRecord | None: statement or none
         """
+        row = (
+            await self.session.execute(
+                self._statement_query(
+                    course_id, user_id, self.model.id, self.model.statements
+                )
+            )
+        ).first()
 
-        objs = (
-            (
+        return StatementRecord(*row) if row else None
+
+    @read_only
+    async def get_statement_raw(
+        self, course_id: UUID, user_id: UUID
+    ) -> RawStatementRecord | None:
+        """Get statement like get_statement, statements are read as JSON text
+
+        Stored statements are not decoded and validated, so read time
+        doesn't depend on statements size besides the transfer.
+
+        Args:
+            course_id (UUID): course id
+            user_id (UUID): user id
+
+        Returns:
+            RawStatementRecord | None: statement or none
+        """
+        row = (
+            await self.session.execute(
+                self._statement_query(
+                    course_id,
+                    user_id,
+                    self.model.id,
+                    cast(self.model.statements, Text),
+                )
+            )
+        ).first()
+
+        return RawStatementRecord(*row) if row else None
+
+    def _full_query(self, filters: StatementFilter) -> Select:
+        """Columns of statement read schema from one joined query"""
+
+        query = (
+            select(
+                DictBundle(
+                    "course",
+                    CMICourse.id,
+                    CMICourse.title,
+                    CMICourse.description,
+                    CMICourse.file_link,
+                ),
+                DictBundle("user", User.id, User.email),
+                DictBundle("statement", self.model.id, self.model.statements),
+            )
+            .select_from(CMIEnrollment)
+            .join(self.model, self.model.id == CMIEnrollment.statement_id)
+            .join(CMICourse, CMICourse.id == CMIEnrollment.course_id)
+            .join(User, User.id == CMIEnrollment.user_id)
+            .where(self.model.deleted_at.is_(None), CMIEnrollment.deleted_at.is_(None))
+        )
+
+        if filters.course_id is not None:
+            query = query.where(CMIEnrollment.course_id == filters.course_id)
+        if filters.user_id is not None:
+            query = query.where(CMIEnrollment.user_id == filters.user_id)
+        if filters.updated_from is not None:
+            query = query.where(self.model.updated_at >= filters.updated_from)
+        if filters.updated_to is not None:
+            query = query.where(self.model.updated_at < filters.updated_to)
+
+        return query
+
+    @read_only
+    async def get_full_rows(
+        self,
+        filters: StatementFilter,
+        cursor: UUID | None = None,
+        limit: int | None = None,
+    ) -> list[Row]:
+        """Get statements with their users and courses ordered by statement id
+
+        Args:
+            filters (StatementFilter): course, user and time window filters
+            cursor (UUID | None): id of the last statement of the previous page
+            limit (int | None): page size, all statements if not set
+
+        Returns:
+            list[Row]: rows with course, user and statement or empty list
+        """
+
+        return (
+            await self.session.execute(
+                paginate(self._full_query(filters), self.model.id, cursor, limit)
+            )
+        ).all()
+
+    async def upsert_many(self, items: list[StatementDTO]) -> list[StatementResult]:
+        """Append statements for many enrollments at once
+
+        Enrollments are resolved by one query, statements are written by
+        set-based statements, so number of queries doesn't depend on items count.
+        Statements for the same enrollment are folded in the batch order.
+
+        Args:
+            items (list[StatementDTO]): statements with user and course ids
+
+        Returns:
+            list[StatementResult]: result for every item in the same order
+        """
+
+        keys = {(item.course_id, item.user_id) for item in items}
+        if not keys:
+            return []
+
+        self.identity.invalidate(self.model, CMIEnrollment)
+
+        enrollments = {
+            (row.course_id, row.user_id): row
+            for row in await self.session.execute(
+                select(
+                    CMIEnrollment.id,
+                    CMIEnrollment.course_id,
+                    CMIEnrollment.user_id,
+                    CMIEnrollment.statement_id,
+                ).where(
+                    tuple_(CMIEnrollment.course_id, CMIEnrollment.user_id).in_(keys),
+                    CMIEnrollment.deleted_at.is_(None),
+                )
+            )
+        }
+
+        found = [
+            (enrollments[(item.course_id, item.user_id)], item.statement)
+            for item in items
+            if (item.course_id, item.user_id) in enrollments
+        ]
+        if not found:
+            return [
+                StatementResult(
+                    user_id=item.user_id,
+                    course_id=item.course_id,
+                    status=StatementResultStatus.not_found,
+                )
+                for item in items
+            ]
+
+        # order of RETURNING rows is not guaranteed, they are matched
+        # to enrollments by id
+        events = await self.session.execute(
+            insert(CMIStatementEvent)
+            .values(
+                [
+                    dict(enrollment_id=enrollment.id, statement=statement)
+                    for enrollment, statement in found
+                ]
+            )
+            .returning(CMIStatementEvent.id, CMIStatementEvent.enrollment_id)
+        )
+
+        last_event_ids: dict[UUID, int] = {}
+        for event_id, enrollment_id in events:
+            last_event_ids[enrollment_id] = max(
+                event_id, last_event_ids.get(enrollment_id, event_id)
+            )
+
+        merged: dict[UUID, dict] = {}
+        for enrollment, statement in found:
+            if settings.statement_merge:
+                merged.setdefault(enrollment.id, {}).update(statement)
+            else:
+                merged[enrollment.id] = statement
+
+        statement_ids = {
+            enrollment.id: enrollment.statement_id or uuid4() for enrollment, _ in found
+        }
+        created = {
+            enrollment.id for enrollment, _ in found if not enrollment.statement_id
+        }
+        updated = [
+            (statement_ids[enrollment_id], statement, last_event_ids[enrollment_id])
+            for enrollment_id, statement in merged.items()
+            if enrollment_id not in created
+        ]
+
+        if created:
+            await self.session.execute(
+                insert(self.model).values(
+                    [
+                        dict(
+                            id=statement_ids[enrollment_id],
+                            statements=merged[enrollment_id],
+                            last_event_id=last_event_ids[enrollment_id],
+                        )
+                        for enrollment_id in created
+                    ]
+                )
+            )
+            enrollment_statements = values(
+                column("id", postgresql.UUID(as_uuid=True)),
+                column("statement_id", postgresql.UUID(as_uuid=True)),
+                name="enrollment_statements",
+            ).data([(id, statement_ids[id]) for id in created])
+            linked = (
                 await self.session.execute(
-                    select(CMIEnrollment)
+                    update(CMIEnrollment)
                     .where(
-                        CMIEnrollment.statement_id.in_(
-                            [st.id for st in statements],
-                        )
-                    )
-                    .options(
-                        selectinload(
-                            CMIEnrollment.user,
+                        and_(
+                            CMIEnrollment.id == enrollment_statements.c.id,
+                            CMIEnrollment.statement_id.is_(None),
                         )
                     )
-                    .options(
-                        selectinload(
-                            CMIEnrollment.course,
-                        )
-                    )
-                    .options(
-                        selectinload(
-                            CMIEnrollment.statement,
+                    .values(statement_id=enrollment_statements.c.statement_id)
+                    .returning(CMIEnrollment.id)
+                    .execution_options(synchronize_session=False)
+                )
+            ).scalars()
+
+            # statements created by concurrent requests first, fold ours into them
+            lost = created - set(linked)
+            if lost:
+                await self.session.execute(
+                    delete(self.model)
+                    .where(self.model.id.in_([statement_ids[id] for id in lost]))
+                    .execution_options(synchronize_session=False)
+                )
+                statement_ids.update(
+                    (
+                        await self.session.execute(
+                            select(CMIEnrollment.id, CMIEnrollment.statement_id).where(
+                                CMIEnrollment.id.in_(lost)
+                            )
                         )
+                    ).all()
+                )
+                updated += [
+                    (statement_ids[id], merged[id], last_event_ids[id]) for id in lost
+                ]
+                created -= lost
+
+        if updated:
+            new_statements = values(
+                column("id", postgresql.UUID(as_uuid=True)),
+                column("statements", postgresql.JSONB),
+                column("last_event_id", BigInteger),
+                name="new_statements",
+            ).data(updated)
+            await self.session.execute(
+                update(self.model)
+                .where(self.model.id == new_statements.c.id)
+                .values(
+                    **self._fold(
+                        new_statements.c.statements, new_statements.c.last_event_id
                     )
                 )
+                .execution_options(synchronize_session=False)
             )
-            .scalars()
-            .all()
+
+        results = []
+        for item in items:
+            enrollment = enrollments.get((item.course_id, item.user_id))
+            if not enrollment:
+                status = StatementResultStatus.not_found
+            elif enrollment.id in created:
+                status = StatementResultStatus.created
+            else:
+                status = StatementResultStatus.updated
+
+            results.append(
+                StatementResult(
+                    user_id=item.user_id,
+                    course_id=item.course_id,
+                    status=status,
+                    statement_id=statement_ids.get(enrollment.id)
+                    if enrollment
+                    else None,
+                )
+            )
+
+        return results
+
+    async def stream_full_rows(self, filters: StatementFilter) -> AsyncIterator[Row]:
+        """Iterate over rows of get_full_rows by server-side cursor"""
+
+        result = await self.session.stream(
+            self._full_query(filters)
+            .order_by(self.model.id)
+            .execution_options(yield_per=settings.stream_chunk_size)
         )
-        return objs
+        async for row in result:
+            yield row
@@ -1,7 +1,7 @@
 import datetime
 from uuid import UUID, uuid4
 
-from sqlalchemy import Column, DateTime, String
+from sqlalchemy import Column, DateTime, Index, String, text
 from sqlalchemy.dialects import postgresql
 
 from database.db import Base
@@ -9,6 +9,13 @@ from database.db import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index(
+            "ix_users_email_not_deleted",
+            "email",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+    )
 
     id: Column[UUID] = Column(
         "id",
@@ -1,13 +1,28 @@
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+
+from config import settings
 from modules.courses.service import CMICourseService
 from modules.statements.schema import CMICourseStatementLite, CMIFullUserDataRead
 
 from modules.users.schema import UserCreate, UserRead
 from modules.users.services import UserService
+from modules.users.utils import PasswordHasherBusy, password_hasher
+from shared.pagination import Pagination
+from shared.responses import (
+    FastJSONResponse,
+    RecordsResponse,
+    accepts_ndjson,
+    ndjson_response,
+)
 
-users_router = APIRouter(tags=["users"], prefix="/api/users")
+users_router = APIRouter(
+    tags=["users"],
+    prefix="/api/users",
+    default_response_class=FastJSONResponse,
+    on_shutdown=[password_hasher.shutdown],
+)
 
 
 @users_router.post("", response_model=UserRead, name="users:create_user")
@@ -22,18 +37,38 @@ async def create_user(
     if user:
         raise HTTPException(detail="User already exist", status_code=400)
 
-    user = await user_service.create(data.dict())
+    try:
+        user = await user_service.create(data.dict())
+    except PasswordHasherBusy:
+        raise HTTPException(
+            detail="Too many users are signing up, try again later",
+            status_code=503,
+        )
 
     return user
 
 
 @users_router.get("", response_model=list[UserRead], name="users:get_all_users")
 async def get_all_users(
+    request: Request,
+    response: Response,
+    pagination: Pagination = Depends(),
     user_service: UserService = Depends(UserService),
 ):
-    """Get all not deleted users"""
+    """Get all not deleted users
 
-    users = await user_service.get_all()
+    Page of users ordered by id, cursor of the next page is passed
+    in X-Next-Cursor header. All users are streamed as NDJSON
+    if it is requested by Accept header.
+    """
+
+    if accepts_ndjson(request):
+        return ndjson_response(
+            lambda session: UserService(session).stream_all(), UserRead
+        )
+
+    users = await user_service.get_all(pagination.cursor, pagination.limit)
+    pagination.set_next_cursor(response, pagination.next_cursor(users))
 
     return users
 
@@ -48,6 +83,12 @@ async def get_by_id(
 ):
     """Get user by id"""
 
+    if settings.fast_read_path:
+        record = await user_service.get_courses_record(user_id)
+        if not record:
+            raise HTTPException(detail="User not found", status_code=404)
+        return RecordsResponse(record)
+
     user = await user_service.get_by_id(user_id)
 
     if not user:
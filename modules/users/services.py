@@ -1,14 +1,36 @@
+from dataclasses import dataclass
 import datetime
+from typing import AsyncIterator
 from uuid import UUID, uuid4
 
 from fastapi import Depends
 from sqlalchemy import and_, select, update
 
+from config import settings
 from database.db import DBSession
-from database.session import get_session
+from database.context import get_identity_cache
+from database.session import get_session, read_only
+from shared.pagination import paginate
+from modules.courses.cache import COURSE_USERS, get_course_cache
+from modules.courses.models import CMICourse, CMIEnrollment
+from modules.courses.schema import course_file_link
+from modules.courses.service import CourseRecord
 from modules.users.models import User
 
-from .utils import get_password_hash
+from .utils import get_password_hasher
+
+
+@dataclass(slots=True)
+class UserCourseRecord:
+    course: CourseRecord
+
+
+@dataclass(slots=True)
+class UserCoursesRecord:
+    """User with courses as it is sent by the api, serialized without pydantic"""
+
+    user_id: UUID
+    data: list[UserCourseRecord]
 
 
 class UserService:
@@ -16,6 +38,8 @@ class UserService:
 
     def __init__(self, session: DBSession = Depends(get_session)):
         self.session = session
+        self.identity = get_identity_cache()
+        self.password_hasher = get_password_hasher()
 
     async def create(self, data: dict) -> User:
         """Create a new user
@@ -25,11 +49,14 @@ class UserService:
 
         Returns:
             User: yser instance
+
+        Raises:
+            PasswordHasherBusy: too many passwords are hashed at the moment
         """
         user = User(
             id=uuid4(),
             email=data.get("email"),
-            password=get_password_hash(data.get("password")),
+            password=await self.password_hasher.hash(data.get("password")),
         )
 
         self.session.add(user)
@@ -76,17 +103,35 @@ class UserService:
         )
 
         await self.session.execute(query)
+        await self.session.commit()
+
+        # invalidated after commit, other workers reload committed state
+        self.identity.invalidate(self.model)
+        await get_course_cache().invalidate(COURSE_USERS)
 
-    async def get_all(self) -> list[User | None]:
-        """Get all users
+    @read_only
+    async def get_all(
+        self, cursor: UUID | None = None, limit: int | None = None
+    ) -> list[User | None]:
+        """Get all not deleted users ordered by id
+
+        Args:
+            cursor (UUID | None): id of the last user of the previous page
+            limit (int | None): page size, all users if not set
 
         Returns:
             list[User | None]: list users or empty list
         """
+
         user = (
             (
                 await self.session.execute(
-                    select(self.model).where(self.model.deleted_at.is_(None))
+                    paginate(
+                        select(self.model).where(self.model.deleted_at.is_(None)),
+                        self.model.id,
+                        cursor,
+                        limit,
+                    )
                 )
             )
             .scalars()
@@ -95,6 +140,19 @@ class UserService:
 
         return user
 
+    async def stream_all(self) -> AsyncIterator[User]:
+        """Iterate over all not deleted users by server-side cursor"""
+
+        result = await self.session.stream_scalars(
+            select(self.model)
+            .where(self.model.deleted_at.is_(None))
+            .order_by(self.model.id)
+            .execution_options(yield_per=settings.stream_chunk_size)
+        )
+        async for obj in result:
+            yield obj
+
+    @read_only
     async def get_by_id(self, user_id: UUID) -> User | None:
         """Get user by id
 
@@ -104,15 +162,73 @@ class UserService:
         Returns:
             User | None: user instance or none
         """
-        user = (
+
+        async def load() -> User | None:
+            return (
+                await self.session.execute(
+                    select(self.model).where(
+                        and_(
+                            self.model.id == user_id,
+                            self.model.deleted_at.is_(None),
+                        )
+                    )
+                )
+            ).scalar()
+
+        return await self.identity.get_or_load((self.model, user_id), load)
+
+    @read_only
+    async def get_courses_record(self, user_id: UUID) -> UserCoursesRecord | None:
+        """Get user with not deleted courses by one Core query
+
+        Args:
+            user_id (UUID): user id
+
+        Returns:
+            UserCoursesRecord | None: user courses or none if user is not found
+        """
+
+        rows = (
             await self.session.execute(
-                select(self.model).where(
+                select(
+                    self.model.id,
+                    CMICourse.id,
+                    CMICourse.title,
+                    CMICourse.description,
+                    CMICourse.file_link,
+                )
+                .outerjoin(
+                    CMIEnrollment,
+                    and_(
+                        CMIEnrollment.user_id == self.model.id,
+                        CMIEnrollment.deleted_at.is_(None),
+                    ),
+                )
+                .outerjoin(
+                    CMICourse,
+                    and_(
+                        CMICourse.id == CMIEnrollment.course_id,
+                        CMICourse.deleted_at.is_(None),
+                    ),
+                )
+                .where(
                     and_(
                         self.model.id == user_id,
                         self.model.deleted_at.is_(None),
                     )
                 )
             )
-        ).scalar()
-
-        return user
+        ).all()
+        if not rows:
+            return None
+
+        return UserCoursesRecord(
+            user_id=user_id,
+            data=[
+                UserCourseRecord(
+                    CourseRecord(id, title, description, course_file_link(file_link))
+                )
+                for _, id, title, description, file_link in rows
+                if id is not None
+            ],
+        )
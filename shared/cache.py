@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Protocol
+
+import asyncpg
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from database.db import DATABASE_URL, DBSession
+
+logger = logging.getLogger(__name__)
+
+CacheKey = tuple[Hashable, ...]
+MISSING = object()
+
+
+class ICache(Protocol):
+    """Cache shared between requests
+
+    Keys are tuples starting with a namespace, so related entries
+    are invalidated together. Values must be picklable to be stored
+    by a shared backend.
+    """
+
+    async def get(self, key: CacheKey) -> Any:
+        """Cached value or MISSING"""
+        ...
+
+    async def set(self, key: CacheKey, value: Any) -> None:
+        ...
+
+    async def delete(self, key: CacheKey) -> None:
+        ...
+
+    async def invalidate(self, namespace: str) -> None:
+        ...
+
+    async def clear(self) -> None:
+        ...
+
+    async def start(self) -> None:
+        ...
+
+    async def stop(self) -> None:
+        ...
+
+    def stats(self) -> dict[str, Any]:
+        ...
+
+
+class LocalCache:
+    """Process-local LRU cache with TTL
+
+    Entries expire `ttl` seconds after they were set, the least recently used
+    entry is evicted when cache is full.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[CacheKey, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: CacheKey) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, key: CacheKey, value: Any) -> None:
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: CacheKey) -> None:
+        self._entries.pop(key, None)
+
+    async def invalidate(self, namespace: str) -> None:
+        for key in [key for key in self._entries if key[0] == namespace]:
+            del self._entries[key]
+
+    async def clear(self) -> None:
+        """Drop all entries and reset counters"""
+
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, Any]:
+        requests = self.hits + self.misses
+        return dict(
+            size=len(self._entries),
+            max_size=self.max_size,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / requests if requests else 0.0,
+            evictions=self.evictions,
+            expirations=self.expirations,
+        )
+
+
+class PgNotifyCache(LocalCache):
+    """Process-local cache invalidated across processes by Postgres NOTIFY
+
+    Every process keeps own entries. Invalidations are applied locally and
+    published to the channel, other processes listening on it drop their
+    entries of the namespace, so workers don't serve changes of other
+    workers until the TTL. A deleted key invalidates its whole namespace
+    in other processes.
+
+    Notifications are missed while the listener is disconnected, so the
+    cache is bypassed until it is connected again.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+        dsn: str = DATABASE_URL.replace("+asyncpg", ""),
+        channel: str = "cache_invalidation",
+        reconnect_delay: float = 1.0,
+    ):
+        super().__init__(max_size, ttl, clock)
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.notifications = 0
+        self._id = uuid.uuid4().hex
+        self._connection: asyncpg.Connection | None = None
+        self._connect_task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def listening(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed()
+
+    async def start(self) -> None:
+        """Listen for invalidations, connected in background if db is down"""
+
+        if self._connect_task is None and not self.listening:
+            self._connect_task = asyncio.create_task(self._connect())
+            await asyncio.wait([self._connect_task], timeout=self.reconnect_delay)
+
+    async def stop(self) -> None:
+        if self._connect_task is not None:
+            self._connect_task.cancel()
+            self._connect_task = None
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await connection.close()
+
+    async def _connect(self) -> None:
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(self.channel, self._on_notification)
+                connection.add_termination_listener(self._on_termination)
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("Cache listener is not connected: %s", e)
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            # entries may have been changed while notifications were missed
+            self._entries.clear()
+            self._connection = connection
+            self._connect_task = None
+            return
+
+    def _on_termination(self, connection: asyncpg.Connection) -> None:
+        if connection is not self._connection:
+            return
+        self._connection = None
+        self._entries.clear()
+        self._connect_task = asyncio.create_task(self._connect())
+
+    def _on_notification(self, connection, pid, channel, payload: str) -> None:
+        sender, namespace = payload.split(":", 1)
+        if sender == self._id:
+            return
+        self.notifications += 1
+        if namespace:
+            for key in [key for key in self._entries if key[0] == namespace]:
+                del self._entries[key]
+        else:
+            self._entries.clear()
+
+    async def _publish(self, namespace: str) -> None:
+        if not self.listening:
+            logger.warning("Cache invalidation of %r is not published", namespace)
+            return
+
+        async with self._lock:
+            try:
+                await self._connection.execute(
+                    "SELECT pg_notify($1, $2)", self.channel, f"{self._id}:{namespace}"
+                )
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("Cache invalidation of %r failed: %s", namespace, e)
+
+    async def get(self, key: CacheKey) -> Any:
+        if not self.listening:
+            self.misses += 1
+            return MISSING
+        return await super().get(key)
+
+    async def set(self, key: CacheKey, value: Any) -> None:
+        if self.listening:
+            await super().set(key, value)
+
+    async def delete(self, key: CacheKey) -> None:
+        await super().delete(key)
+        await self._publish(key[0])
+
+    async def invalidate(self, namespace: str) -> None:
+        await super().invalidate(namespace)
+        await self._publish(namespace)
+
+    async def clear(self) -> None:
+        await super().clear()
+        self.notifications = 0
+        await self._publish("")
+
+    def stats(self) -> dict[str, Any]:
+        return dict(
+            super().stats(),
+            listening=self.listening,
+            notifications=self.notifications,
+        )
+
+
+cache_backends: dict[str, Callable[..., ICache]] = {
+    "local": LocalCache,
+    "pg_notify": PgNotifyCache,
+}
+
+
+def dump_rows(objs: list[Any]) -> list[dict[str, Any]]:
+    """Column values of ORM objects, to be kept in a cache"""
+
+    return [
+        {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+        for obj in objs
+    ]
+
+
+async def load_rows(
+    session: DBSession, model: type, rows: list[dict[str, Any]]
+) -> list[Any]:
+    """ORM objects of the session from cached column values, without queries"""
+
+    objs = []
+    for row in rows:
+        obj = model(**row)
+        make_transient_to_detached(obj)
+        objs.append(await session.merge(obj, load=False))
+    return objs
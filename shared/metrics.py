@@ -0,0 +1,19 @@
+from typing import Any, Callable
+
+MetricsSource = Callable[[], dict[str, Any]]
+
+
+class MetricsRegistry:
+    """Named sources of runtime metrics exposed by the metrics endpoint"""
+
+    def __init__(self):
+        self._sources: dict[str, MetricsSource] = {}
+
+    def register(self, name: str, source: MetricsSource) -> None:
+        self._sources[name] = source
+
+    def collect(self) -> dict[str, dict[str, Any]]:
+        return {name: source() for name, source in self._sources.items()}
+
+
+metrics = MetricsRegistry()
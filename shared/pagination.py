@@ -0,0 +1,71 @@
+from operator import attrgetter
+from typing import Any, Callable, Sequence
+from uuid import UUID
+
+from fastapi import Query, Response
+from sqlalchemy.sql import ColumnElement, Select
+
+from config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def paginate(
+    query: Select,
+    key: ColumnElement,
+    cursor: Any | None = None,
+    limit: int | None = None,
+) -> Select:
+    """Apply keyset pagination to the query
+
+    Args:
+        query (Select): query
+        key (ColumnElement): unique column, rows are ordered by it
+        cursor (Any | None): key of the last row of the previous page
+        limit (int | None): page size, all rows if not set
+
+    Returns:
+        Select: query for the page
+    """
+
+    query = query.order_by(key)
+    if cursor is not None:
+        query = query.where(key > cursor)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+class Pagination:
+    """Keyset pagination query params"""
+
+    def __init__(
+        self,
+        cursor: UUID
+        | None = Query(
+            None, description="Cursor from X-Next-Cursor header of previous page"
+        ),
+        limit: int = Query(settings.page_size, ge=1, le=settings.max_page_size),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+    def set_next_cursor(self, response: Response, cursor: Any | None) -> None:
+        """Pass cursor of the next page in the response header
+
+        Args:
+            response (Response): response
+            cursor (Any | None): key of the last row of the page
+        """
+
+        if cursor is not None:
+            response.headers[NEXT_CURSOR_HEADER] = str(cursor)
+
+    def next_cursor(
+        self, items: Sequence[Any], key: Callable[[Any], Any] = attrgetter("id")
+    ) -> Any | None:
+        """Key of the last item if page is full"""
+
+        if len(items) < self.limit:
+            return None
+        return key(items[-1])
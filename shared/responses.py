@@ -0,0 +1,69 @@
+from typing import Any, AsyncIterator, Callable
+
+import pydantic
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from database.db import DBSession
+from database.session import SessionManager, use_replica
+from shared import serializers
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by the configured fast encoder
+
+    Default response class of the api routers. Endpoints returning big
+    payloads return it with pydantic schemas as content, so the schemas
+    are encoded directly instead of by jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return serializers.dumps(content)
+
+
+class RecordsResponse(FastJSONResponse):
+    """JSON response of dataclass records
+
+    Content is not validated and not passed through jsonable_encoder.
+    """
+
+
+class RawJSONResponse(Response):
+    """JSON response of an already encoded body
+
+    Content is bytes of a JSON document, it is sent as is.
+    """
+
+    media_type = "application/json"
+
+
+def accepts_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(
+    rows: Callable[[DBSession], AsyncIterator],
+    schema: type[pydantic.BaseModel],
+) -> StreamingResponse:
+    """Stream rows as newline delimited json
+
+    Response body is sent after the request session is closed,
+    so rows are read by own session, from the replica if it is configured.
+
+    Args:
+        rows (Callable): returns async iterator of rows for the session
+        schema (type[pydantic.BaseModel]): schema of every row
+
+    Returns:
+        StreamingResponse: response
+    """
+
+    async def content():
+        async with SessionManager() as session:
+            with use_replica(session):
+                async for row in rows(session):
+                    yield serializers.dumps(schema.from_orm(row).dict()) + b"\n"
+
+    return StreamingResponse(content(), media_type=NDJSON_MEDIA_TYPE)
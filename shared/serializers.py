@@ -0,0 +1,58 @@
+import datetime
+import json
+from typing import Any, Callable
+from uuid import UUID
+
+import orjson
+import pydantic
+
+from config import settings
+
+JSONDumps = Callable[[Any], bytes]
+
+
+def _default(obj: Any) -> Any:
+    # asyncpg returns own UUID subclass, orjson serializes only uuid.UUID
+    if isinstance(obj, UUID):
+        return str(obj)
+    # validated schemas are rendered without jsonable_encoder, fields
+    # are not copied like by .dict(), nested schemas come back here
+    if isinstance(obj, pydantic.BaseModel):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class _Encoder(json.JSONEncoder):
+    def default(self, obj: Any) -> Any:
+        if isinstance(obj, UUID):
+            return str(obj)
+        if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+            return obj.isoformat()
+        if isinstance(obj, pydantic.BaseModel):
+            return dict(obj)
+        return super().default(obj)
+
+
+_encoder = _Encoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def stdlib_dumps(obj: Any) -> bytes:
+    return _encoder.encode(obj).encode()
+
+
+json_backends: dict[str, JSONDumps] = {
+    "orjson": orjson_dumps,
+    "stdlib": stdlib_dumps,
+}
+
+dumps: JSONDumps = json_backends[settings.json_backend]
+
+
+def dumps_str(obj: Any) -> str:
+    """Serialize to str, UUIDs and datetimes are serialized natively"""
+
+    return dumps(obj).decode()
@@ -2,6 +2,7 @@ import sqlalchemy as sa
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Bundle
 from sqlalchemy.sql import expression
 from sqlalchemy.types import DateTime
 
@@ -124,3 +125,19 @@ class utcnow(expression.FunctionElement):
 @compiles(utcnow, "postgresql")
 def pg_utcnow(element, compiler, **kw):
     return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+class DictBundle(Bundle):
+    """Bundle of columns loaded as dict keyed by column names
+
+    Default bundle rows are keyed by labels of the select, which are
+    deduplicated when several bundles have columns with the same name.
+    """
+
+    def create_row_processor(self, query, procs, labels):
+        keys = [column.key for column in self.exprs]
+
+        def proc(row):
+            return dict(zip(keys, (proc(row) for proc in procs)))
+
+        return proc
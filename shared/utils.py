@@ -1,9 +1,10 @@
 # flake8: noqa
 import io
 from os import mkdir
+import posixpath
 import re
 from secrets import token_urlsafe
-from typing import Union
+from typing import AsyncIterator, BinaryIO, Iterator, Union
 import zipfile
 from os.path import join
 
@@ -122,3 +123,89 @@ def extract_zip(_zipfile: UploadFile) -> str:
         zf.extractall(tempdir)
 
     return tempdir
+
+
+def open_zip(_zipfile: UploadFile) -> zipfile.ZipFile:
+    """Open uploaded zip archive in place
+
+    The archive is read straight from the spooled upload file, nothing
+    is copied into memory or extracted on disk.
+
+    Args:
+        _zipfile (UploadFile): zip file
+
+    Raises:
+        zipfile.BadZipFile: file is not a zip archive
+
+    Returns:
+        zipfile.ZipFile: opened archive
+    """
+
+    _zipfile.file.seek(0)
+    return zipfile.ZipFile(_zipfile.file)
+
+
+def detach_upload(_file: UploadFile) -> BinaryIO:
+    """Take ownership of uploaded file data
+
+    FastAPI closes uploaded files right after the response, detached
+    file stays open and must be closed by the new owner.
+
+    Args:
+        _file (UploadFile): uploaded file
+
+    Returns:
+        BinaryIO: spooled file with uploaded data
+    """
+
+    detached = _file.file
+    _file.file = io.BytesIO()
+    return detached
+
+
+def iter_zip_members(archive: zipfile.ZipFile) -> Iterator[tuple[str, zipfile.ZipInfo]]:
+    """Iterate over archive files with normalized relative paths
+
+    Directories and members pointing outside of the archive root
+    (absolute paths, `..`) are skipped.
+
+    Args:
+        archive (zipfile.ZipFile): opened archive
+
+    Yields:
+        tuple[str, zipfile.ZipInfo]: relative path and member info
+    """
+
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+
+        path = posixpath.normpath(info.filename.replace("\\", "/")).lstrip("/")
+        if path in ("", ".", "..") or path.startswith("../"):
+            continue
+
+        yield path, info
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split streamed body into not empty utf-8 lines
+
+    Args:
+        chunks (AsyncIterator[bytes]): body chunks, like request.stream()
+
+    Raises:
+        UnicodeDecodeError: line is not utf-8
+
+    Yields:
+        str: line without line break
+    """
+
+    tail = b""
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line.decode().rstrip("\r")
+    if tail.strip():
+        yield tail.decode().rstrip("\r")
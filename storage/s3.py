@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import math
+import os
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator
+from uuid import uuid4
+from zipfile import ZipFile
+
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.exceptions import ClientError
+
+from config import settings
+from shared.cache import MISSING, LocalCache
+from storage.storage import (
+    MANIFEST_NAME,
+    BlobBuffer,
+    OnUploaded,
+    StorageTypeEnum,
+    STREAM_CHUNK_SIZE,
+    archive_tasks,
+    course_folder,
+    folder_tasks,
+    make_manifest,
+    split_course_path,
+)
+from storage.uploader import AsyncUploader, UploadTask
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND_CODES = ("404", "NoSuchKey", "NoSuchObject")
+
+
+def _is_not_found(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") in NOT_FOUND_CODES
+
+
+class AsyncS3Storage:
+    """Course storage on S3 by aiobotocore
+
+    Requests run on the event loop. Archive members are uploaded concurrently
+    by `AsyncUploader`, big members by multipart upload. Only blocking reads
+    of members (inflate and hash) run in threads, a part at a time, so the
+    loop keeps serving other requests during a publish.
+    """
+
+    def __init__(self, client: Any, exit_stack: AsyncExitStack | None = None):
+        self._bucket_name = settings.s3_settings.bucket_name
+        self.client = client
+        self._exit_stack = exit_stack
+        self.uploader = AsyncUploader(
+            client,
+            self._bucket_name,
+            workers=settings.s3_settings.upload_workers,
+            part_size=settings.s3_settings.upload_part_size,
+            retries=settings.s3_settings.upload_retries,
+            retry_delay=settings.s3_settings.upload_retry_delay,
+        )
+        self.content_addressed = settings.s3_settings.content_addressed
+        self._known_blobs: set[str] = set()
+        # course folders are never changed, so manifests don't expire
+        self._manifests = LocalCache(max_size=256, ttl=math.inf)
+
+    async def _blob_exists(self, object_name: str) -> bool:
+        if object_name in self._known_blobs:
+            return True
+
+        try:
+            await self.client.head_object(Bucket=self._bucket_name, Key=object_name)
+        except ClientError as e:
+            if _is_not_found(e):
+                return False
+            raise e
+
+        self._known_blobs.add(object_name)
+        return True
+
+    async def _save_blob(self, task: UploadTask) -> tuple[str, str, bool]:
+        """Store object data once under its digest
+
+        Returns:
+            tuple[str, str, bool]: object name, digest, was blob uploaded
+        """
+
+        with BlobBuffer(task) as buffer:
+            # members are inflated and hashed off the event loop
+            blob = await asyncio.to_thread(buffer.read)
+            digest = buffer.digest
+            if await self._blob_exists(blob.object_name):
+                return task.object_name, digest, False
+
+            await self.uploader.put(blob)
+
+        self._known_blobs.add(blob.object_name)
+        return task.object_name, digest, True
+
+    async def _save_archive_content_addressed(
+        self,
+        archive: ZipFile,
+        path_prefix: str | None = None,
+        on_uploaded: OnUploaded | None = None,
+    ) -> str:
+        folder_root, folder_path_on_bucket = course_folder(
+            StorageTypeEnum.courses, uuid4().hex, path_prefix
+        )
+
+        async def save(task: UploadTask) -> tuple[str, str, bool]:
+            result = await self._save_blob(task)
+            if on_uploaded:
+                on_uploaded(task)
+            return result
+
+        # object names of tasks are paths relative to the folder root,
+        # they are kept only in the manifest
+        results = await self.uploader.map(
+            save, archive_tasks(archive, path_prefix or "")
+        )
+
+        await self.client.put_object(
+            Bucket=self._bucket_name,
+            Key=os.path.join(folder_root, MANIFEST_NAME),
+            Body=make_manifest(results),
+            ContentType="application/json",
+        )
+
+        logger.info(
+            "Stored %s files of %s, %s uploaded as new blobs",
+            len(results),
+            folder_root,
+            sum(uploaded for _, _, uploaded in results),
+        )
+
+        return folder_path_on_bucket
+
+    async def _read_manifest(self, folder_root: str) -> dict[str, str] | None:
+        manifest = await self._manifests.get(folder_root)
+        if manifest is not MISSING:
+            return manifest
+
+        try:
+            response = await self.client.get_object(
+                Bucket=self._bucket_name, Key=os.path.join(folder_root, MANIFEST_NAME)
+            )
+        except ClientError as e:
+            if not _is_not_found(e):
+                raise e
+            manifest = None
+        else:
+            async with response["Body"] as body:
+                manifest = json.loads(await body.read())["files"]
+
+        await self._manifests.set(folder_root, manifest)
+        return manifest
+
+    async def save_course_folder(
+        self, file_path: str, path_prefix: str | None = None
+    ) -> str:
+        _, folder_path_on_bucket = course_folder(
+            StorageTypeEnum.courses, file_path, path_prefix
+        )
+        await self.uploader.upload(folder_tasks(file_path, folder_path_on_bucket))
+
+        return folder_path_on_bucket
+
+    async def save_course_archive(
+        self,
+        archive: ZipFile,
+        path_prefix: str | None = None,
+        on_uploaded: OnUploaded | None = None,
+    ) -> str:
+        if self.content_addressed:
+            return await self._save_archive_content_addressed(
+                archive, path_prefix, on_uploaded
+            )
+
+        _, folder_path_on_bucket = course_folder(
+            StorageTypeEnum.courses, uuid4().hex, path_prefix
+        )
+        await self.uploader.upload(
+            archive_tasks(archive, folder_path_on_bucket), on_uploaded
+        )
+
+        return folder_path_on_bucket
+
+    async def get_course_object(self, file_path: str) -> str | None:
+        """Get object name of the course file, see LocalStorage.get_course_object"""
+
+        course_path = split_course_path(file_path)
+        if course_path is None:
+            return None
+
+        folder_root, path = course_path
+        manifest = await self._read_manifest(folder_root)
+        if manifest is None:
+            return file_path.strip("/")
+
+        digest = manifest.get(path)
+        if not digest:
+            return None
+        return os.path.join(StorageTypeEnum.blobs.value, digest)
+
+    async def iter_object(self, object_name: str) -> AsyncIterator[bytes]:
+        """Read object data by chunks"""
+
+        response = await self.client.get_object(
+            Bucket=self._bucket_name, Key=object_name
+        )
+        async with response["Body"] as body:
+            async for chunk in body.iter_chunks(STREAM_CHUNK_SIZE):
+                yield chunk
+
+    async def close(self) -> None:
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+
+    def stats(self) -> dict[str, Any]:
+        return dict(
+            max_connections=settings.s3_settings.max_connections,
+            uploads=self.uploader.stats(),
+        )
+
+
+async def create_s3_storage() -> AsyncS3Storage:
+    """Storage with aiobotocore client tuned by S3Settings"""
+
+    s3_settings = settings.s3_settings
+    exit_stack = AsyncExitStack()
+    client = await exit_stack.enter_async_context(
+        get_session().create_client(
+            "s3",
+            endpoint_url=f"http://{s3_settings.endpoint_url}",
+            region_name=s3_settings.region_name,
+            aws_access_key_id=s3_settings.access_key_id,
+            aws_secret_access_key=s3_settings.secret_access_key,
+            config=AioConfig(
+                max_pool_connections=s3_settings.max_connections,
+                connect_timeout=s3_settings.connect_timeout,
+                read_timeout=s3_settings.read_timeout,
+                connector_args={"force_close": not s3_settings.keepalive},
+                # bucket name in the path like minio client does
+                s3={"addressing_style": "path"},
+            ),
+        )
+    )
+    return AsyncS3Storage(client, exit_stack)
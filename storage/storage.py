@@ -1,17 +1,50 @@
+import asyncio
+from contextlib import nullcontext
 from enum import StrEnum
+from functools import lru_cache, partial
+import hashlib
+import io
+import json
+import logging
 import os
-from typing import Protocol
+import socket
+from tempfile import SpooledTemporaryFile
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    Protocol,
+)
+from uuid import uuid4
+from zipfile import ZipFile
 
 from fastapi import UploadFile
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+import urllib3
+from urllib3.connection import HTTPConnection
 from config import settings
 
 from minio import Minio
-from shared.utils import urljoin
+from minio.error import S3Error
+from shared.metrics import metrics
+from shared.utils import iter_zip_members, urljoin
+from storage.uploader import ParallelUploader, UploadTask
 from storage.utils import get_content_type
 
+logger = logging.getLogger(__name__)
+
+OnUploaded = Callable[[UploadTask], None]
+
+MANIFEST_NAME = "manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class StorageTypeEnum(StrEnum):
     courses: str = "courses"
+    blobs: str = "blobs"
 
 
 class IStorage(Protocol):
@@ -21,11 +54,226 @@ class IStorage(Protocol):
     def save_course_folder(self, file_path: str, path_prefix: str | None = None):
         ...
 
+    def save_course_archive(
+        self,
+        archive: ZipFile,
+        path_prefix: str | None = None,
+        on_uploaded: OnUploaded | None = None,
+    ):
+        ...
+
+    def get_course_object(self, file_path: str) -> str | None:
+        ...
+
+    def iter_object(self, object_name: str) -> Iterator[bytes]:
+        ...
+
+    def close(self) -> None:
+        ...
+
+    def stats(self) -> dict[str, Any]:
+        ...
+
+
+class IAsyncStorage(Protocol):
+    async def save_course_folder(
+        self, file_path: str, path_prefix: str | None = None
+    ) -> str:
+        ...
+
+    async def save_course_archive(
+        self,
+        archive: ZipFile,
+        path_prefix: str | None = None,
+        on_uploaded: OnUploaded | None = None,
+    ) -> str:
+        ...
+
+    async def get_course_object(self, file_path: str) -> str | None:
+        ...
+
+    def iter_object(self, object_name: str) -> AsyncIterator[bytes]:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+    def stats(self) -> dict[str, Any]:
+        ...
+
+
+def course_folder(
+    folder: StorageTypeEnum, name: str, path_prefix: str | None = None
+) -> tuple[str, str]:
+    """Folder of course files in the bucket
+
+    Returns:
+        tuple[str, str]: folder root and folder path with the prefix
+    """
+
+    folder_root = os.path.join(folder.value, name)
+    return folder_root, (
+        os.path.join(folder_root, path_prefix) if path_prefix else folder_root
+    )
+
+
+def folder_tasks(dir_path: str, folder_path_on_bucket: str) -> Iterator[UploadTask]:
+    for root, _, files in os.walk(dir_path):
+        for file_path in (os.path.join(root, file) for file in files):
+            yield UploadTask(
+                object_name=os.path.join(
+                    folder_path_on_bucket, os.path.relpath(file_path, dir_path)
+                ),
+                length=os.stat(file_path).st_size,
+                content_type=get_content_type(file_path),
+                open=partial(open, file_path, "rb"),
+            )
+
+
+def archive_tasks(archive: ZipFile, folder_path_on_bucket: str) -> Iterator[UploadTask]:
+    # every member is streamed from the archive into the bucket,
+    # it is read by parts so memory usage doesn't depend on file size
+    for path, info in iter_zip_members(archive):
+        yield UploadTask(
+            object_name=os.path.join(folder_path_on_bucket, path),
+            length=info.file_size,
+            content_type=get_content_type(path),
+            open=partial(archive.open, info),
+        )
+
+
+class BlobBuffer:
+    """Object data read once and hashed into a buffer
+
+    The blob task uploads the buffered data, so an archive member is
+    decompressed once for both hashing and upload. Data bigger than
+    the upload part is spooled to a temporary file.
+    """
+
+    def __init__(self, task: UploadTask):
+        self.task = task
+        self.digest: str | None = None
+        self._buffer = SpooledTemporaryFile(
+            max_size=settings.s3_settings.upload_part_size
+        )
+
+    def read(self) -> UploadTask:
+        """Read and hash object data, blocking
+
+        Returns:
+            UploadTask: task of the blob named by the digest
+        """
+
+        sha256 = hashlib.sha256()
+        with self.task.open() as data:
+            while chunk := data.read(HASH_CHUNK_SIZE):
+                sha256.update(chunk)
+                self._buffer.write(chunk)
+
+        self.digest = sha256.hexdigest()
+        return UploadTask(
+            object_name=os.path.join(StorageTypeEnum.blobs.value, self.digest),
+            length=self.task.length,
+            content_type=self.task.content_type,
+            open=self._open,
+        )
+
+    def _open(self):
+        # the buffer stays open for retries, it is closed with the blob buffer
+        self._buffer.seek(0)
+        return nullcontext(self._buffer)
+
+    def close(self) -> None:
+        self._buffer.close()
+
+    def __enter__(self) -> "BlobBuffer":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def make_manifest(results: list[tuple[str, str, bool]]) -> bytes:
+    return json.dumps(
+        {"files": {path: digest for path, digest, _ in results}},
+        sort_keys=True,
+    ).encode()
+
+
+def split_course_path(file_path: str) -> tuple[str, str] | None:
+    """Split course file path to the course folder root and the file path in it
+
+    Args:
+        file_path (str): path like courses/<folder>/res/index.html
+
+    Returns:
+        tuple[str, str] | None: folder root and file path or none
+            if it is not a course file path
+    """
+
+    parts = file_path.strip("/").split("/", 2)
+    if len(parts) < 3 or parts[0] != StorageTypeEnum.courses.value:
+        return None
+    return urljoin(parts[0], parts[1]), parts[2]
+
+
+def make_http_client() -> urllib3.PoolManager:
+    """HTTP connection pool of the minio client tuned by S3Settings"""
+
+    s3_settings = settings.s3_settings
+    socket_options = list(HTTPConnection.default_socket_options)
+    if s3_settings.keepalive:
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+
+    return urllib3.PoolManager(
+        maxsize=s3_settings.max_connections,
+        # wait for a free connection instead of opening one
+        # which is thrown away after the request
+        block=True,
+        timeout=urllib3.Timeout(
+            connect=s3_settings.connect_timeout, read=s3_settings.read_timeout
+        ),
+        # the same retries as the default client of minio
+        retries=urllib3.Retry(
+            total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+        ),
+        socket_options=socket_options,
+    )
+
+
+def http_pool_stats(http_client: urllib3.PoolManager) -> dict[str, Any]:
+    pools = [
+        pool
+        for pool in (http_client.pools.get(key) for key in http_client.pools.keys())
+        if pool is not None
+    ]
+    return dict(
+        max_connections=http_client.connection_pool_kw["maxsize"],
+        pools=len(pools),
+        connections_created=sum(pool.num_connections for pool in pools),
+        idle_connections=sum(
+            conn is not None for pool in pools for conn in list(pool.pool.queue)
+        ),
+        requests=sum(pool.num_requests for pool in pools),
+    )
+
 
 class LocalStorage:
-    def __init__(self):
+    def __init__(self, http_client: urllib3.PoolManager | None = None):
         self._bucket_name = settings.s3_settings.bucket_name
+        self.http_client = http_client or make_http_client()
         self.minio = self.__set_connection()
+        self.uploader = ParallelUploader(
+            self.minio,
+            self._bucket_name,
+            workers=settings.s3_settings.upload_workers,
+            part_size=settings.s3_settings.upload_part_size,
+            retries=settings.s3_settings.upload_retries,
+            retry_delay=settings.s3_settings.upload_retry_delay,
+        )
+        self.content_addressed = settings.s3_settings.content_addressed
+        self._known_blobs: set[str] = set()
+        self._read_manifest = lru_cache(maxsize=256)(self._read_manifest)
 
     def __set_connection(self):
         minio_client = Minio(
@@ -33,9 +281,18 @@ class LocalStorage:
             access_key=settings.s3_settings.access_key_id,
             secret_key=settings.s3_settings.secret_access_key,
             secure=False,
+            http_client=self.http_client,
         )
         return minio_client
 
+    def close(self) -> None:
+        """Close pooled connections"""
+
+        self.http_client.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return http_pool_stats(self.http_client)
+
     def _get_path(
         self, filename: str, folder: str, path_prefix: str | None = None
     ) -> str:
@@ -46,32 +303,264 @@ class LocalStorage:
     def _save(
         self, _filepath: str, folder: StorageTypeEnum, path_prefix: str | None = None
     ):
-        folder_path_on_bucket = (
-            os.path.join(folder.value, _filepath, path_prefix)
-            if path_prefix
-            else os.path.join(folder.value, _filepath)
+        _, folder_path_on_bucket = course_folder(folder, _filepath, path_prefix)
+        self.uploader.upload(folder_tasks(_filepath, folder_path_on_bucket))
+
+        return folder_path_on_bucket
+
+    def _save_archive(
+        self,
+        archive: ZipFile,
+        folder: StorageTypeEnum,
+        path_prefix: str | None = None,
+        on_uploaded: OnUploaded | None = None,
+    ) -> str:
+        _, folder_path_on_bucket = course_folder(folder, uuid4().hex, path_prefix)
+        self.uploader.upload(archive_tasks(archive, folder_path_on_bucket), on_uploaded)
+
+        return folder_path_on_bucket
+
+    def _blob_exists(self, object_name: str) -> bool:
+        if object_name in self._known_blobs:
+            return True
+
+        try:
+            self.minio.stat_object(self._bucket_name, object_name)
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            raise e
+
+        self._known_blobs.add(object_name)
+        return True
+
+    def _save_blob(self, task: UploadTask) -> tuple[str, str, bool]:
+        """Store object data once under its digest
+
+        Returns:
+            tuple[str, str, bool]: object name, digest, was blob uploaded
+        """
+
+        with BlobBuffer(task) as buffer:
+            blob = buffer.read()
+            digest = buffer.digest
+            if self._blob_exists(blob.object_name):
+                return task.object_name, digest, False
+
+            self.uploader.put(blob)
+
+        self._known_blobs.add(blob.object_name)
+        return task.object_name, digest, True
+
+    def _save_archive_content_addressed(
+        self,
+        archive: ZipFile,
+        folder: StorageTypeEnum,
+        path_prefix: str | None = None,
+        on_uploaded: OnUploaded | None = None,
+    ) -> str:
+        folder_root, folder_path_on_bucket = course_folder(
+            folder, uuid4().hex, path_prefix
         )
 
-        for root, _, files in os.walk(_filepath):
-            for file in files:
-                file_path = os.path.join(root, file)
-                object_name = os.path.join(
-                    folder_path_on_bucket,
-                    os.path.relpath(file_path, _filepath),
-                )
-                content_type = get_content_type(object_name)
-                file_size = os.stat(file_path).st_size
-
-                with open(file_path, "rb") as file_data:
-                    self.minio.put_object(
-                        self._bucket_name,
-                        object_name,
-                        file_data,
-                        length=file_size,
-                        content_type=content_type,
-                    )
+        def save(task: UploadTask) -> tuple[str, str, bool]:
+            result = self._save_blob(task)
+            if on_uploaded:
+                on_uploaded(task)
+            return result
+
+        # object names of tasks are paths relative to the folder root,
+        # they are kept only in the manifest
+        tasks = (
+            UploadTask(
+                object_name=os.path.join(path_prefix or "", path),
+                length=info.file_size,
+                content_type=get_content_type(path),
+                open=partial(archive.open, info),
+            )
+            for path, info in iter_zip_members(archive)
+        )
+        results = self.uploader.map(save, tasks)
+
+        manifest = make_manifest(results)
+        self.minio.put_object(
+            self._bucket_name,
+            os.path.join(folder_root, MANIFEST_NAME),
+            io.BytesIO(manifest),
+            length=len(manifest),
+            content_type="application/json",
+        )
+
+        logger.info(
+            "Stored %s files of %s, %s uploaded as new blobs",
+            len(results),
+            folder_root,
+            sum(uploaded for _, _, uploaded in results),
+        )
 
         return folder_path_on_bucket
 
+    def _read_manifest(self, folder_root: str) -> dict[str, str] | None:
+        try:
+            response = self.minio.get_object(
+                self._bucket_name, os.path.join(folder_root, MANIFEST_NAME)
+            )
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return None
+            raise e
+
+        try:
+            return json.loads(response.read())["files"]
+        finally:
+            response.close()
+            response.release_conn()
+
     def save_course_folder(self, file_path: str, path_prefix: str | None = None) -> str:
         return self._save(file_path, StorageTypeEnum.courses, path_prefix)
+
+    def save_course_archive(
+        self,
+        archive: ZipFile,
+        path_prefix: str | None = None,
+        on_uploaded: OnUploaded | None = None,
+    ) -> str:
+        if self.content_addressed:
+            return self._save_archive_content_addressed(
+                archive, StorageTypeEnum.courses, path_prefix, on_uploaded
+            )
+        return self._save_archive(
+            archive, StorageTypeEnum.courses, path_prefix, on_uploaded
+        )
+
+    def get_course_object(self, file_path: str) -> str | None:
+        """Get object name of the course file
+
+        Files of content addressed courses are resolved by the course manifest,
+        other files are stored under their own path.
+
+        Args:
+            file_path (str): path like courses/<folder>/res/index.html
+
+        Returns:
+            str | None: object name or none if file is not in the manifest
+        """
+
+        course_path = split_course_path(file_path)
+        if course_path is None:
+            return None
+
+        folder_root, path = course_path
+        manifest = self._read_manifest(folder_root)
+        if manifest is None:
+            return file_path.strip("/")
+
+        digest = manifest.get(path)
+        if not digest:
+            return None
+        return os.path.join(StorageTypeEnum.blobs.value, digest)
+
+    def iter_object(self, object_name: str) -> Iterator[bytes]:
+        """Read object data by chunks"""
+
+        response = self.minio.get_object(self._bucket_name, object_name)
+        try:
+            yield from response.stream(STREAM_CHUNK_SIZE)
+        finally:
+            response.close()
+            response.release_conn()
+
+
+class ThreadPoolStorage:
+    """Async adapter running blocking storage calls in the threadpool"""
+
+    def __init__(self, storage: IStorage):
+        self.storage = storage
+
+    async def save_course_folder(
+        self, file_path: str, path_prefix: str | None = None
+    ) -> str:
+        return await run_in_threadpool(
+            self.storage.save_course_folder, file_path, path_prefix
+        )
+
+    async def save_course_archive(
+        self,
+        archive: ZipFile,
+        path_prefix: str | None = None,
+        on_uploaded: OnUploaded | None = None,
+    ) -> str:
+        return await run_in_threadpool(
+            self.storage.save_course_archive, archive, path_prefix, on_uploaded
+        )
+
+    async def get_course_object(self, file_path: str) -> str | None:
+        return await run_in_threadpool(self.storage.get_course_object, file_path)
+
+    def iter_object(self, object_name: str) -> AsyncIterator[bytes]:
+        return iterate_in_threadpool(self.storage.iter_object(object_name))
+
+    async def close(self) -> None:
+        self.storage.close()
+
+    def stats(self) -> dict[str, Any]:
+        return self.storage.stats()
+
+
+async def create_minio_storage() -> IAsyncStorage:
+    return ThreadPoolStorage(LocalStorage())
+
+
+async def create_aiobotocore_storage() -> IAsyncStorage:
+    # aiobotocore is imported only by deployments which select it
+    from storage.s3 import create_s3_storage
+
+    return await create_s3_storage()
+
+
+storage_backends: dict[str, Callable[[], Awaitable[IAsyncStorage]]] = {
+    "minio": create_minio_storage,
+    "aiobotocore": create_aiobotocore_storage,
+}
+
+
+class SharedStorage:
+    """Application-lifetime storage
+
+    One storage and its connection pool are shared by all requests and jobs,
+    so connections to the endpoint are reused. Started on startup of the
+    courses router and closed on its shutdown, outside of the app it is
+    started on first use. Backend is selected by `settings.storage_backend`.
+    """
+
+    def __init__(self):
+        self._storage: IAsyncStorage | None = None
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        async with self._lock:
+            if self._storage is None:
+                self._storage = await storage_backends[settings.storage_backend]()
+
+    async def stop(self) -> None:
+        async with self._lock:
+            if self._storage is not None:
+                await self._storage.close()
+                self._storage = None
+
+    async def get(self) -> IAsyncStorage:
+        if self._storage is None:
+            await self.start()
+        return self._storage
+
+    def stats(self) -> dict[str, Any]:
+        return self._storage.stats() if self._storage else {}
+
+
+shared_storage = SharedStorage()
+
+metrics.register("storage", shared_storage.stats)
+
+
+async def get_storage() -> IAsyncStorage:
+    return await shared_storage.get()
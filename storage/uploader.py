@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Awaitable, BinaryIO, Callable, Iterable, TypeVar
+
+from minio import Minio
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class UploadTask:
+    object_name: str
+    length: int
+    content_type: str
+    # opens a fresh stream with object data, called again on every retry
+    open: Callable[[], BinaryIO]
+
+
+@dataclass
+class UploadReport:
+    objects: int = 0
+    bytes: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    _lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+
+    @property
+    def throughput(self) -> float:
+        """Uploaded bytes per second"""
+
+        if not self.seconds:
+            return 0.0
+        return self.bytes / self.seconds
+
+    def add(self, task: UploadTask, retries: int) -> None:
+        with self._lock:
+            self.objects += 1
+            self.bytes += task.length
+            self.retries += retries
+
+
+class ParallelUploader:
+    """Upload objects to the bucket by a pool of threads
+
+    Objects bigger than `part_size` are sent by minio as multipart upload,
+    every object is retried independently of others.
+    """
+
+    def __init__(
+        self,
+        minio: Minio,
+        bucket_name: str,
+        workers: int,
+        part_size: int,
+        retries: int,
+        retry_delay: float,
+    ):
+        self.minio = minio
+        self.bucket_name = bucket_name
+        self.workers = workers
+        self.part_size = part_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def put(self, task: UploadTask) -> int:
+        """Upload one object
+
+        Returns:
+            int: number of retries spent on the object
+        """
+
+        attempt = 0
+        while True:
+            try:
+                with task.open() as data:
+                    self.minio.put_object(
+                        self.bucket_name,
+                        task.object_name,
+                        data,
+                        length=task.length,
+                        content_type=task.content_type,
+                        part_size=self.part_size,
+                    )
+                return attempt
+            except Exception as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise e
+                logger.warning(
+                    "Retry %s/%s uploading %s: %s",
+                    attempt,
+                    self.retries,
+                    task.object_name,
+                    e,
+                )
+                time.sleep(self.retry_delay * attempt)
+
+    def map(self, func: Callable[[T], R], items: Iterable[T]) -> list[R]:
+        """Run func over items by the pool, fails on the first error
+
+        Returns:
+            list: results in completion order
+        """
+
+        results: list[R] = []
+
+        # keep a bounded number of items in flight,
+        # so items generator isn't drained into memory at once
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending: set[Future] = set()
+            try:
+                for item in items:
+                    if len(pending) >= self.workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        results += [future.result() for future in done]
+                    pending.add(executor.submit(func, item))
+
+                results += [future.result() for future in as_completed(pending)]
+            except Exception as e:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise e
+
+        return results
+
+    def upload(
+        self,
+        tasks: Iterable[UploadTask],
+        on_uploaded: Callable[[UploadTask], None] | None = None,
+    ) -> UploadReport:
+        """Upload all tasks, fails on the first object which run out of retries
+
+        Args:
+            tasks (Iterable[UploadTask]): objects for uploading
+            on_uploaded (Callable | None): called from worker thread
+                after every uploaded object
+
+        Returns:
+            UploadReport: aggregate upload statistics
+        """
+
+        report = UploadReport()
+        started_at = time.perf_counter()
+
+        def run(task: UploadTask) -> None:
+            report.add(task, self.put(task))
+            if on_uploaded:
+                on_uploaded(task)
+
+        self.map(run, tasks)
+
+        report.seconds = time.perf_counter() - started_at
+        logger.info(
+            "Uploaded %s objects (%s bytes, %s retries) in %.2fs: %.2f MB/s",
+            report.objects,
+            report.bytes,
+            report.retries,
+            report.seconds,
+            report.throughput / 1024 / 1024,
+        )
+
+        return report
+
+
+class AsyncUploader:
+    """Upload objects to the bucket by tasks of the event loop
+
+    Uploads in flight are limited by `workers` for all callers together.
+    Object data is read from the task stream by `part_size` parts in threads,
+    objects bigger than a part are sent by multipart upload, so memory usage
+    is at most a part per upload in flight. Every object is retried
+    independently of others.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        bucket_name: str,
+        workers: int,
+        part_size: int,
+        retries: int,
+        retry_delay: float,
+    ):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.workers = workers
+        self.part_size = part_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(workers)
+
+    async def _put_multipart(self, task: UploadTask, data: BinaryIO) -> None:
+        upload_id = (
+            await self.client.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=task.object_name,
+                ContentType=task.content_type,
+            )
+        )["UploadId"]
+
+        try:
+            parts = []
+            while part := await asyncio.to_thread(data.read, self.part_size):
+                number = len(parts) + 1
+                response = await self.client.upload_part(
+                    Bucket=self.bucket_name,
+                    Key=task.object_name,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=part,
+                )
+                parts.append({"ETag": response["ETag"], "PartNumber": number})
+
+            await self.client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=task.object_name,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException as e:
+            # cancelled uploads are aborted too, parts aren't left in the bucket
+            await self.client.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=task.object_name, UploadId=upload_id
+            )
+            raise e
+
+    async def put(self, task: UploadTask) -> int:
+        """Upload one object
+
+        Returns:
+            int: number of retries spent on the object
+        """
+
+        attempt = 0
+        while True:
+            try:
+                # archive members are inflated on read, it blocks,
+                # so reads run in threads to keep the event loop free
+                with await asyncio.to_thread(task.open) as data:
+                    if task.length > self.part_size:
+                        await self._put_multipart(task, data)
+                    else:
+                        await self.client.put_object(
+                            Bucket=self.bucket_name,
+                            Key=task.object_name,
+                            Body=await asyncio.to_thread(data.read),
+                            ContentType=task.content_type,
+                        )
+                return attempt
+            except Exception as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise e
+                logger.warning(
+                    "Retry %s/%s uploading %s: %s",
+                    attempt,
+                    self.retries,
+                    task.object_name,
+                    e,
+                )
+                await asyncio.sleep(self.retry_delay * attempt)
+
+    def _release(self, task: asyncio.Task) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def map(
+        self, func: Callable[[T], Awaitable[R]], items: Iterable[T]
+    ) -> list[R]:
+        """Run func over items concurrently, fails on the first error
+
+        Returns:
+            list: results in completion order
+        """
+
+        results: list[R] = []
+
+        # an item is taken from the generator only when a slot is free,
+        # so items aren't drained into memory at once
+        pending: set[asyncio.Task] = set()
+        try:
+            for item in items:
+                await self._semaphore.acquire()
+                self.in_flight += 1
+                task = asyncio.create_task(func(item))
+                # released by callback, tasks cancelled before start too
+                task.add_done_callback(self._release)
+                pending.add(task)
+
+                done = {task for task in pending if task.done()}
+                pending -= done
+                results += [task.result() for task in done]
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                results += [task.result() for task in done]
+        except BaseException as e:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise e
+
+        return results
+
+    async def upload(
+        self,
+        tasks: Iterable[UploadTask],
+        on_uploaded: Callable[[UploadTask], None] | None = None,
+    ) -> UploadReport:
+        """Upload all tasks, fails on the first object which run out of retries
+
+        Args:
+            tasks (Iterable[UploadTask]): objects for uploading
+            on_uploaded (Callable | None): called after every uploaded object
+
+        Returns:
+            UploadReport: aggregate upload statistics
+        """
+
+        report = UploadReport()
+        started_at = time.perf_counter()
+
+        async def run(task: UploadTask) -> None:
+            report.add(task, await self.put(task))
+            if on_uploaded:
+                on_uploaded(task)
+
+        await self.map(run, tasks)
+
+        report.seconds = time.perf_counter() - started_at
+        logger.info(
+            "Uploaded %s objects (%s bytes, %s retries) in %.2fs: %.2f MB/s",
+            report.objects,
+            report.bytes,
+            report.retries,
+            report.seconds,
+            report.throughput / 1024 / 1024,
+        )
+
+        return report
+
+    def stats(self) -> dict[str, Any]:
+        return dict(workers=self.workers, in_flight=self.in_flight)
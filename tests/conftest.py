@@ -54,6 +54,7 @@ def api_app(db_session):
     from middlewares import register_middlewares
 
     from modules.courses.router import courses_router
+    from modules.metrics.router import metrics_router
     from modules.statements.router import statement_router
     from modules.users.router import users_router
     from app import __version__
@@ -64,6 +65,7 @@ def api_app(db_session):
         app.include_router(courses_router)
         app.include_router(statement_router)
         app.include_router(users_router)
+        app.include_router(metrics_router)
         app = register_middlewares(app)
 
         return app
@@ -195,6 +197,13 @@ async def truncate_db(db_session):
         await conn.execute(text)
 
 
+@pytest.fixture(autouse=True)
+async def clear_caches():
+    from modules.courses.cache import course_cache
+
+    await course_cache.clear()
+
+
 @pytest.fixture(scope="session")
 async def db_session(
     create_test_db,
@@ -1,11 +1,34 @@
+import asyncio
+import datetime
 import io
+import json
 import os
+import statistics
+import time
+import urllib.parse
 from uuid import uuid4
+import zipfile
 
+import pytest
+from sqlalchemy import event, select, update
+
+from config import settings
 from modules.users.models import User
-from modules.courses.models import CMICourse, CMIEnrollment
+from database.session import advisory_lock
+from modules.courses.jobs import (
+    DeleteCourseJob,
+    QueueFull,
+    delete_course_enrollments,
+    delete_queue,
+    publish_queue,
+    resume_course_deletions,
+)
+from modules.courses.models import CMICourse, CMIEnrollment, CourseJob
 from modules.statements.models import CMIStatement
 from shared.utils import matches
+from storage.s3 import AsyncS3Storage
+from storage.storage import LocalStorage, ThreadPoolStorage, shared_storage
+from tests.test_storage import FakeMinio, FakeS3Client
 
 ARCHIVE_PATH = os.path.join(
     os.path.dirname(os.path.realpath(__file__)),
@@ -61,6 +84,45 @@ class TestCourseAPI:
             ],
         )
 
+    async def test_get_courses__paginated(self, db_session, api_app, client):
+        other_course = CMICourse(
+            id=uuid4(),
+            title="other",
+            description="other",
+            organization_id=uuid4(),
+        )
+        async with db_session() as session:
+            session.add_all((self.course, other_course))
+            await session.commit()
+
+        first_id, last_id = sorted((self.course.id, other_course.id))
+
+        response = await client.get(
+            api_app.url_path_for("courses:get_cmi5_all_courses"),
+            params=dict(limit=1),
+        )
+
+        assert response.status_code == 200
+        assert [course["id"] for course in response.json()] == [str(first_id)]
+        assert response.headers["X-Next-Cursor"] == str(first_id)
+
+        response = await client.get(
+            api_app.url_path_for("courses:get_cmi5_all_courses"),
+            params=dict(limit=1, cursor=str(first_id)),
+        )
+
+        assert response.status_code == 200
+        assert [course["id"] for course in response.json()] == [str(last_id)]
+
+        response = await client.get(
+            api_app.url_path_for("courses:get_cmi5_all_courses"),
+            params=dict(limit=1, cursor=str(last_id)),
+        )
+
+        assert response.status_code == 200
+        assert response.json() == []
+        assert "X-Next-Cursor" not in response.headers
+
     async def test_get_course_by_id(self, db_session, api_app, client):
         async with db_session() as session:
             session.add_all(
@@ -94,6 +156,46 @@ class TestCourseAPI:
             },
         )
 
+    async def test_get_course_by_id__cached(self, db_session, api_app, client):
+        async with db_session() as session:
+            session.add_all((self.course, self.user))
+            await session.commit()
+
+        url = api_app.url_path_for("courses:get_cmi5_course", course_id=self.course.id)
+        response = await client.get(url)
+
+        assert response.status_code == 200
+        assert response.json()["users"] == []
+
+        async with db_session() as session:
+            await session.execute(
+                update(CMICourse)
+                .where(CMICourse.id == self.course.id)
+                .values(title="changed")
+            )
+
+        response = await client.get(url)
+
+        assert response.json()["title"] == self.course.title
+
+        response = await client.post(
+            api_app.url_path_for("courses:set_enrollment"),
+            json=dict(course_id=str(self.course.id), user_id=str(self.user.id)),
+        )
+        assert response.status_code == 200
+
+        response = await client.get(url)
+
+        assert response.json()["title"] == self.course.title
+        assert [user["id"] for user in response.json()["users"]] == [str(self.user.id)]
+
+        response = await client.get(api_app.url_path_for("metrics:get_metrics"))
+
+        assert matches(
+            response.json()["course_cache"],
+            {"hits": 3, "misses": 3, "evictions": 0, ...: ...},
+        )
+
     async def test_get_course_by_id__not_found(self, api_app, client):
         response = await client.get(
             api_app.url_path_for("courses:get_cmi5_course", course_id=uuid4()),
@@ -101,16 +203,23 @@ class TestCourseAPI:
 
         assert response.status_code == 404
 
+    async def wait_publish_job(self, api_app, client, job_id: str) -> dict:
+        while True:
+            response = await client.get(
+                api_app.url_path_for("courses:get_publish_job", job_id=job_id),
+            )
+            assert response.status_code == 200
+            if response.json()["state"] in ("completed", "failed"):
+                return response.json()
+            await asyncio.sleep(0.05)
+
     async def test_create_course(self, api_app, client, mocker):
-        # INFO: not mockeing extract_zip and delete_folder, becouse need tests this functional
+        # INFO: not mocking open_zip, becouse need tests this functional
         with open(str(ARCHIVE_PATH), "rb") as f:
             fake_file = f.read()
             scorm_archive = {"file": io.BytesIO(fake_file)}
 
-        mocker.patch(
-            "storage.storage.LocalStorage.save_course_folder",
-            return_value=f"courses/{str(uuid4())}.zip",
-        )
+        put_object = mocker.patch("minio.Minio.put_object")
 
         response = await client.post(
             api_app.url_path_for("courses:create_cmi5_course"),
@@ -118,12 +227,37 @@ class TestCourseAPI:
             data={"title": "string2", "description": "string2"},
         )
 
-        assert response.status_code == 200
+        assert response.status_code == 202
+        assert response.json()["state"] == "pending"
+
+        job = await self.wait_publish_job(api_app, client, response.json()["id"])
 
+        assert matches(
+            job,
+            {
+                "id": response.json()["id"],
+                "state": "completed",
+                "objects_total": 4,
+                "objects_uploaded": 4,
+                "bytes_total": ...,
+                "bytes_processed": job["bytes_total"],
+                "course_id": ...,
+                "error": None,
+                "created_at": ...,
+                "finished_at": ...,
+            },
+        )
+        assert put_object.call_count == 4
+
+        response = await client.get(
+            api_app.url_path_for("courses:get_cmi5_course", course_id=job["course_id"]),
+        )
+
+        assert response.status_code == 200
         assert matches(
             response.json(),
             {
-                "id": str(response.json()["id"]),
+                "id": job["course_id"],
                 "title": "string2",
                 "description": "string2",
                 "file_link": ...,
@@ -131,6 +265,225 @@ class TestCourseAPI:
             },
         )
 
+    async def test_create_course__aiobotocore_storage(self, api_app, client, mocker):
+        s3_client = FakeS3Client()
+        mocker.patch.object(shared_storage, "_storage", AsyncS3Storage(s3_client))
+        run_in_threadpool = mocker.patch("storage.storage.run_in_threadpool")
+
+        with open(str(ARCHIVE_PATH), "rb") as f:
+            response = await client.post(
+                api_app.url_path_for("courses:create_cmi5_course"),
+                files={"file": io.BytesIO(f.read())},
+                data={"title": "string2", "description": "string2"},
+            )
+
+        assert response.status_code == 202
+
+        job = await self.wait_publish_job(api_app, client, response.json()["id"])
+
+        assert job["state"] == "completed"
+        assert job["objects_uploaded"] == len(s3_client.objects) == 4
+        assert not run_in_threadpool.called
+
+    async def test_get_publish_job__other_worker(self, api_app, client, mocker):
+        mocker.patch("minio.Minio.put_object")
+
+        with open(str(ARCHIVE_PATH), "rb") as f:
+            response = await client.post(
+                api_app.url_path_for("courses:create_cmi5_course"),
+                files={"file": io.BytesIO(f.read())},
+                data={"title": "string2", "description": "string2"},
+            )
+        job = await self.wait_publish_job(api_app, client, response.json()["id"])
+
+        # the job is polled from a worker which didn't run it
+        mocker.patch.object(publish_queue, "_jobs", {})
+        response = await client.get(
+            api_app.url_path_for("courses:get_publish_job", job_id=job["id"]),
+        )
+
+        assert response.status_code == 200
+        assert response.json() == job
+        assert job["state"] == "completed"
+
+        response = await client.get(
+            api_app.url_path_for("courses:get_delete_job", job_id=job["id"]),
+        )
+
+        assert response.status_code == 404
+
+    async def test_create_course__upload_failed(self, api_app, client, mocker):
+        mocker.patch(
+            "storage.storage.LocalStorage.save_course_archive",
+            side_effect=ConnectionError("s3 is down"),
+        )
+
+        with open(str(ARCHIVE_PATH), "rb") as f:
+            response = await client.post(
+                api_app.url_path_for("courses:create_cmi5_course"),
+                files={"file": io.BytesIO(f.read())},
+                data={"title": "string2", "description": "string2"},
+            )
+
+        assert response.status_code == 202
+
+        job = await self.wait_publish_job(api_app, client, response.json()["id"])
+
+        assert job["state"] == "failed"
+        assert job["error"] == "s3 is down"
+        assert job["course_id"] is None
+
+    async def test_get_publish_job__not_found(self, api_app, client):
+        response = await client.get(
+            api_app.url_path_for("courses:get_publish_job", job_id=uuid4()),
+        )
+
+        assert response.status_code == 404
+
+    async def test_create_course__does_not_block_statements(
+        self, db_session, api_app, client, mocker
+    ):
+        async with db_session() as session:
+            session.add_all((self.course, self.user, self.statements, self.enrollment))
+            await session.commit()
+
+        upload_seconds = 1.0
+
+        def blocking_upload(*args, **kwargs):
+            time.sleep(upload_seconds)
+            return f"courses/{str(uuid4())}"
+
+        mocker.patch(
+            "storage.storage.LocalStorage.save_course_archive",
+            side_effect=blocking_upload,
+        )
+
+        async def post_statement() -> float:
+            started_at = time.perf_counter()
+            response = await client.post(
+                api_app.url_path_for("statements:create_statement"),
+                json={
+                    "course_id": str(self.course.id),
+                    "user_id": str(self.user.id),
+                    "statement": {"status": "progressed"},
+                },
+            )
+            assert response.status_code == 200
+            return time.perf_counter() - started_at
+
+        async def statements_burst(rounds: int) -> list[float]:
+            latencies = []
+            for _ in range(rounds):
+                latencies += await asyncio.gather(*(post_statement() for _ in range(5)))
+            return latencies
+
+        def p99(latencies: list[float]) -> float:
+            return statistics.quantiles(latencies, n=100)[98]
+
+        baseline = await statements_burst(10)
+
+        with open(str(ARCHIVE_PATH), "rb") as f:
+            response = await client.post(
+                api_app.url_path_for("courses:create_cmi5_course"),
+                files={"file": io.BytesIO(f.read())},
+                data={"title": "string2", "description": "string2"},
+            )
+        assert response.status_code == 202
+        upload = asyncio.create_task(
+            self.wait_publish_job(api_app, client, response.json()["id"])
+        )
+
+        during_upload = []
+        while not upload.done():
+            during_upload += await statements_burst(1)
+
+        assert (await upload)["state"] == "completed"
+        assert len(during_upload) >= 10
+        # a blocked event loop would stall statements for the whole upload
+        assert p99(during_upload) < upload_seconds / 2
+        assert p99(during_upload) < max(p99(baseline) * 5, 0.1)
+
+    async def test_create_course__without_cmi5_xml(self, api_app, client, mocker):
+        content = io.BytesIO()
+        with zipfile.ZipFile(content, "w") as zf:
+            zf.writestr("res/index.html", "<html/>")
+
+        save_course_archive = mocker.patch(
+            "storage.storage.LocalStorage.save_course_archive",
+        )
+
+        response = await client.post(
+            api_app.url_path_for("courses:create_cmi5_course"),
+            files={"file": io.BytesIO(content.getvalue())},
+            data={"title": "string2", "description": "string2"},
+        )
+
+        assert response.status_code == 400
+        save_course_archive.assert_not_called()
+
+    async def test_get_course_file(self, api_app, client, mocker):
+        mocker.patch(
+            "storage.storage.LocalStorage.get_course_object",
+            return_value="courses/folder/res/index.html",
+        )
+
+        response = await client.get(
+            api_app.url_path_for(
+                "courses:get_course_file", file_path="courses/folder/res/index.html"
+            ),
+        )
+
+        assert response.status_code == 307
+        assert response.headers["location"].endswith(
+            "/secure-t/courses/folder/res/index.html"
+        )
+
+    async def test_get_course_file__content_addressed(self, api_app, client, mocker):
+        mocker.patch("config.settings.s3_settings.content_addressed", True)
+        storage = LocalStorage()
+        storage.minio = storage.uploader.minio = FakeMinio()
+        mocker.patch.object(shared_storage, "_storage", ThreadPoolStorage(storage))
+
+        with open(str(ARCHIVE_PATH), "rb") as f:
+            response = await client.post(
+                api_app.url_path_for("courses:create_cmi5_course"),
+                files={"file": io.BytesIO(f.read())},
+                data={"title": "string2", "description": "string2"},
+            )
+        job = await self.wait_publish_job(api_app, client, response.json()["id"])
+        response = await client.get(
+            api_app.url_path_for("courses:get_cmi5_course", course_id=job["course_id"]),
+        )
+        file_link = response.json()["file_link"]
+
+        response = await client.get(file_link)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/html")
+        assert 'src="app.js"' in response.text
+
+        # relative assets of the page are resolved under the course folder
+        response = await client.get(urllib.parse.urljoin(file_link, "app.js"))
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/javascript"
+        with zipfile.ZipFile(ARCHIVE_PATH) as archive:
+            assert response.content == archive.read("res/app.js")
+
+    async def test_get_course_file__not_found(self, api_app, client, mocker):
+        mocker.patch(
+            "storage.storage.LocalStorage.get_course_object",
+            return_value=None,
+        )
+
+        response = await client.get(
+            api_app.url_path_for(
+                "courses:get_course_file", file_path="courses/folder/res/missing.js"
+            ),
+        )
+
+        assert response.status_code == 404
+
     async def test_enrollment_create(self, db_session, api_app, client):
         course = CMICourse(
             id=uuid4(),
@@ -190,6 +543,355 @@ class TestCourseAPI:
 
         assert response.status_code == 400
 
+    async def test_enrollment_create__not_found(self, db_session, api_app, client):
+        async with db_session() as session:
+            session.add_all((self.course, self.user))
+            await session.commit()
+
+        for course_id, user_id in (
+            (uuid4(), self.user.id),
+            (self.course.id, uuid4()),
+        ):
+            response = await client.post(
+                api_app.url_path_for("courses:set_enrollment"),
+                json={"course_id": str(course_id), "user_id": str(user_id)},
+            )
+
+            assert response.status_code == 404
+
+    async def test_enrollment_create__concurrent(
+        self, db_session, api_app, client, test_engine
+    ):
+        async with db_session() as session:
+            session.add_all((self.course, self.user))
+            await session.commit()
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count)
+        try:
+            responses = await asyncio.gather(
+                *(
+                    client.post(
+                        api_app.url_path_for("courses:set_enrollment"),
+                        json={
+                            "course_id": str(self.course.id),
+                            "user_id": str(self.user.id),
+                        },
+                    )
+                    for _ in range(5)
+                )
+            )
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count)
+
+        assert sorted(response.status_code for response in responses) == [
+            200,
+            400,
+            400,
+            400,
+            400,
+        ]
+        # one statement per assign
+        assert len(statements) == 5
+
+        async with db_session() as session:
+            enrollments = (await session.execute(select(CMIEnrollment))).all()
+
+        assert len(enrollments) == 1
+
+    async def test_enrollments_bulk(self, db_session, api_app, client):
+        other_user = User(id=uuid4(), email="test2@gmail.com", password="password")
+        async with db_session() as session:
+            session.add_all(
+                (self.course, self.user, other_user, self.statements, self.enrollment)
+            )
+            await session.commit()
+
+        response = await client.post(
+            api_app.url_path_for("courses:set_enrollments_bulk"),
+            json={
+                "course_ids": [str(self.course.id), str(uuid4())],
+                "user_ids": [str(self.user.id), str(other_user.id), str(uuid4())],
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"created": 1, "skipped": 5}
+
+        async with db_session() as session:
+            enrollments = (
+                await session.execute(
+                    select(CMIEnrollment.user_id).where(
+                        CMIEnrollment.course_id == self.course.id
+                    )
+                )
+            ).scalars()
+
+        assert set(enrollments) == {self.user.id, other_user.id}
+
+    async def test_enrollments_bulk__stream(self, db_session, api_app, client):
+        other_user = User(id=uuid4(), email="test2@gmail.com", password="password")
+        async with db_session() as session:
+            session.add_all((self.course, self.user, other_user))
+            await session.commit()
+
+        response = await client.post(
+            api_app.url_path_for("courses:set_enrollments_bulk"),
+            content=f"course_id,user_id\r\n{self.course.id},{self.user.id}\r\n",
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"created": 1, "skipped": 0}
+
+        response = await client.post(
+            api_app.url_path_for("courses:set_enrollments_bulk"),
+            content="\n".join(
+                json.dumps({"course_id": str(self.course.id), "user_id": str(user_id)})
+                for user_id in (self.user.id, other_user.id, other_user.id)
+            ),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"created": 1, "skipped": 2}
+
+    async def test_enrollments_bulk__invalid_line(self, db_session, api_app, client):
+        async with db_session() as session:
+            session.add_all((self.course, self.user))
+            await session.commit()
+
+        response = await client.post(
+            api_app.url_path_for("courses:set_enrollments_bulk"),
+            content=f"{self.course.id},{self.user.id}\n{self.course.id},string\n",
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 422
+
+        async with db_session() as session:
+            enrollments = (await session.execute(select(CMIEnrollment))).all()
+
+        assert enrollments == []
+
+    async def test_enrollments_bulk__invalid_line_after_chunk(
+        self, db_session, api_app, client, mocker
+    ):
+        mocker.patch.object(settings, "enrollments_chunk_size", 1)
+        other_user = User(id=uuid4(), email="test2@gmail.com", password="password")
+        async with db_session() as session:
+            session.add_all((self.course, self.user, other_user))
+            await session.commit()
+
+        for content in (
+            f"{self.course.id},{self.user.id}\n{self.course.id},{other_user.id}\n"
+            f"{self.course.id},string\n",
+            f"{self.course.id},{self.user.id}\n".encode() + b"\xff\xfe\n",
+        ):
+            response = await client.post(
+                api_app.url_path_for("courses:set_enrollments_bulk"),
+                content=content,
+                headers={"Content-Type": "text/csv"},
+            )
+
+            assert response.status_code == 422
+
+            async with db_session() as session:
+                enrollments = (await session.execute(select(CMIEnrollment))).all()
+
+            # chunks inserted before the bad line are rolled back
+            assert enrollments == []
+
+    async def wait_delete_job(self, api_app, client, job_id: str) -> dict:
+        while True:
+            response = await client.get(
+                api_app.url_path_for("courses:get_delete_job", job_id=job_id),
+            )
+            assert response.status_code == 200
+            if response.json()["state"] in ("completed", "failed"):
+                return response.json()
+            await asyncio.sleep(0.05)
+
+    async def test_delete_course(self, db_session, api_app, client, mocker):
+        mocker.patch.object(settings, "course_delete_chunk_size", 2)
+        users = [
+            User(id=uuid4(), email=f"test{index}@gmail.com", password="password")
+            for index in range(5)
+        ]
+        async with db_session() as session:
+            session.add_all((self.course, *users))
+            session.add_all(
+                CMIEnrollment(id=uuid4(), course_id=self.course.id, user_id=user.id)
+                for user in users
+            )
+            await session.commit()
+
+        response = await client.delete(
+            api_app.url_path_for("courses:delete_course", course_id=self.course.id),
+        )
+
+        assert response.status_code == 202
+        job = await self.wait_delete_job(api_app, client, response.json()["id"])
+        assert matches(
+            job,
+            {
+                "state": "completed",
+                "course_id": str(self.course.id),
+                "enrollments_total": 5,
+                "enrollments_deleted": 5,
+                ...: ...,
+            },
+        )
+
+        async with db_session() as session:
+            deleted_at = (
+                await session.execute(select(CMIEnrollment.deleted_at))
+            ).scalars()
+
+        assert all(deleted_at)
+
+        response = await client.get(
+            api_app.url_path_for("courses:get_cmi5_course", course_id=self.course.id),
+        )
+
+        assert response.status_code == 404
+
+    async def test_delete_course__queue_full(self, db_session, api_app, client, mocker):
+        async with db_session() as session:
+            session.add(self.course)
+            await session.commit()
+
+        mocker.patch.object(delete_queue, "submit", side_effect=QueueFull)
+        response = await client.delete(
+            api_app.url_path_for("courses:delete_course", course_id=self.course.id),
+        )
+
+        assert response.status_code == 202
+        response = await client.get(
+            api_app.url_path_for(
+                "courses:get_delete_job", job_id=response.json()["id"]
+            ),
+        )
+        assert response.status_code == 200
+        assert matches(
+            response.json(),
+            {
+                "state": "failed",
+                "course_id": str(self.course.id),
+                "error": "Delete queue is full, enrollments are deleted on the next "
+                "startup",
+                ...: ...,
+            },
+        )
+
+    async def test_delete_course__not_found(self, api_app, client):
+        response = await client.delete(
+            api_app.url_path_for("courses:delete_course", course_id=uuid4()),
+        )
+
+        assert response.status_code == 404
+
+    async def test_delete_course__resumed(self, db_session):
+        self.course.deleted_at = datetime.datetime.utcnow()
+        self.enrollment.statement_id = None
+        async with db_session() as session:
+            session.add_all((self.course, self.user, self.enrollment))
+            await session.commit()
+
+        await (await resume_course_deletions())
+
+        for _ in range(100):
+            async with db_session() as session:
+                enrollment = await session.get(CMIEnrollment, self.enrollment.id)
+            if enrollment.deleted_at:
+                break
+            await asyncio.sleep(0.05)
+
+        assert enrollment.deleted_at
+
+    async def test_delete_course__resumed_once(self, db_session):
+        self.course.deleted_at = datetime.datetime.utcnow()
+        self.enrollment.statement_id = None
+        async with db_session() as session:
+            session.add_all((self.course, self.user, self.enrollment))
+            await session.commit()
+
+        # the course is deleted by a job of another worker
+        async with advisory_lock(f"delete_course:{self.course.id}") as locked:
+            assert locked
+            await (await resume_course_deletions())
+
+        async with db_session() as session:
+            jobs = (await session.execute(select(CourseJob))).scalars().all()
+        assert jobs == []
+
+        await (await resume_course_deletions())
+
+        async with db_session() as session:
+            jobs = (await session.execute(select(CourseJob))).scalars().all()
+        assert [(job.kind, job.course_id) for job in jobs] == [
+            ("delete_course", self.course.id)
+        ]
+
+    async def test_delete_course__locked(self, db_session, api_app, client, mocker):
+        mocker.patch.object(settings, "course_delete_retry_delay", 0.05)
+        self.enrollment.statement_id = None
+        async with db_session() as session:
+            session.add_all((self.course, self.user, self.enrollment))
+            await session.commit()
+
+        async with db_session() as session:
+            # the enrollment is locked, chunks of the deletion skip it
+            await session.execute(
+                select(CMIEnrollment)
+                .where(CMIEnrollment.id == self.enrollment.id)
+                .with_for_update()
+            )
+            response = await client.delete(
+                api_app.url_path_for("courses:delete_course", course_id=self.course.id),
+            )
+            assert response.status_code == 202
+            await asyncio.sleep(0.2)
+
+            async with advisory_lock(f"delete_course:{self.course.id}") as locked:
+                assert not locked
+
+        job = await self.wait_delete_job(api_app, client, response.json()["id"])
+        assert matches(
+            job,
+            {
+                "state": "completed",
+                "enrollments_total": 1,
+                "enrollments_deleted": 1,
+                ...: ...,
+            },
+        )
+
+        job = DeleteCourseJob(course_id=self.course.id)
+        async with advisory_lock(f"delete_course:{self.course.id}") as locked:
+            assert locked
+            with pytest.raises(RuntimeError):
+                await delete_course_enrollments(job)
+
+    async def test_get_course_users__deleted_enrollment(
+        self, db_session, api_app, client
+    ):
+        self.enrollment.deleted_at = datetime.datetime.utcnow()
+        async with db_session() as session:
+            session.add_all((self.course, self.user, self.statements, self.enrollment))
+            await session.commit()
+
+        response = await client.get(
+            api_app.url_path_for("courses:get_cmi5_course", course_id=self.course.id),
+        )
+
+        assert response.status_code == 200
+        assert response.json()["users"] == []
+
     async def test_get_all_statements(self, db_session, api_app, client):
         async with db_session() as session:
             session.add_all(
@@ -296,6 +998,31 @@ class TestCourseAPI:
 
         assert response.status_code == 404
 
+    async def test_fast_read_path(self, db_session, api_app, client, mocker):
+        async with db_session() as session:
+            session.add_all((self.user, self.course, self.enrollment, self.statements))
+            await session.commit()
+
+        urls = [
+            api_app.url_path_for("courses:get_cmi5_all_courses"),
+            api_app.url_path_for("users:get_by_id", user_id=self.user.id),
+            api_app.url_path_for(
+                "statements:get_statement",
+                course_id=str(self.course.id),
+                user_id=str(self.user.id),
+            ),
+            api_app.url_path_for(
+                "statements:get_statement", course_id=uuid4(), user_id=uuid4()
+            ),
+        ]
+        fast = [(await client.get(url)).json() for url in urls]
+
+        mocker.patch.object(settings, "fast_read_path", False)
+        slow = [(await client.get(url)).json() for url in urls]
+
+        assert fast == slow
+        assert fast[0][0]["file_link"] == "/secure-t/courses/string.zip"
+
     async def test_get_statement(self, db_session, api_app, client):
         async with db_session() as session:
             session.add_all(
@@ -0,0 +1,61 @@
+from uuid import uuid4
+
+from database.identity import IdentityCache, identity_cache_stats
+from modules.courses.models import CMICourse
+from modules.users.models import User
+
+
+class TestMetricsAPI:
+    def setup(self):
+        self.course = CMICourse(
+            id=uuid4(),
+            title="string",
+            description="string",
+            organization_id=uuid4(),
+            file_link="/courses/string.zip",
+        )
+        self.user = User(id=uuid4(), email="test@gmail.com", password="password")
+        identity_cache_stats.reset()
+
+    async def test_identity_cache__set_enrollment(self, db_session, api_app, client):
+        async with db_session() as session:
+            session.add_all((self.course, self.user))
+            await session.commit()
+
+        response = await client.post(
+            api_app.url_path_for("courses:set_enrollment"),
+            json=dict(course_id=str(self.course.id), user_id=str(self.user.id)),
+        )
+        assert response.status_code == 200
+
+        response = await client.get(api_app.url_path_for("metrics:get_metrics"))
+
+        assert response.status_code == 200
+        # enrollment is checked, inserted and read back by one statement
+        assert response.json()["identity_cache"]["set_enrollment"] == {
+            "requests": 1,
+            "hits": 0,
+            "misses": 0,
+            "hit_rate": 0.0,
+            "queries_saved": 0,
+        }
+
+
+async def test_identity_cache():
+    cache = IdentityCache()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return "course"
+
+    assert await cache.get_or_load((CMICourse, 1), load) == "course"
+    assert await cache.get_or_load((CMICourse, 1), load) == "course"
+    assert len(loads) == 1
+
+    cache.invalidate(User)
+    assert cache.peek((CMICourse, 1)) == "course"
+
+    cache.invalidate(CMICourse)
+    assert await cache.get_or_load((CMICourse, 1), load) == "course"
+    assert (cache.hits, cache.misses) == (1, 2)
@@ -0,0 +1,419 @@
+import datetime
+import json
+from uuid import uuid4
+
+from sqlalchemy import select
+
+from config import settings
+from modules.courses.models import CMICourse, CMIEnrollment
+from modules.statements.models import CMIStatement
+from modules.users.models import User
+from shared.utils import matches
+
+
+class TestStatementsAPI:
+    def setup(self):
+        self.course = CMICourse(
+            id=uuid4(),
+            title="string",
+            description="string",
+            organization_id=uuid4(),
+            file_link="/courses/string.zip",
+        )
+        self.user = User(id=uuid4(), email="test@gmail.com", password="password")
+        self.other_user = User(id=uuid4(), email="test2@gmail.com", password="password")
+        self.statements = CMIStatement(id=uuid4(), statements=dict(status="ok"))
+        self.enrollment = CMIEnrollment(
+            id=uuid4(),
+            course_id=self.course.id,
+            user_id=self.user.id,
+            statement_id=self.statements.id,
+        )
+        self.other_enrollment = CMIEnrollment(
+            id=uuid4(),
+            course_id=self.course.id,
+            user_id=self.other_user.id,
+        )
+
+    async def test_create_statements_batch(self, db_session, api_app, client):
+        async with db_session() as session:
+            session.add_all(
+                (
+                    self.course,
+                    self.user,
+                    self.other_user,
+                    self.statements,
+                    self.enrollment,
+                    self.other_enrollment,
+                )
+            )
+            await session.commit()
+
+        unknown_user_id = str(uuid4())
+        response = await client.post(
+            api_app.url_path_for("statements:create_statements_batch"),
+            json=[
+                {
+                    "course_id": str(self.course.id),
+                    "user_id": str(self.user.id),
+                    "statement": {"status": "progressed"},
+                },
+                {
+                    "course_id": str(self.course.id),
+                    "user_id": str(self.other_user.id),
+                    "statement": {"status": "initialized"},
+                },
+                {
+                    "course_id": str(self.course.id),
+                    "user_id": unknown_user_id,
+                    "statement": {"status": "initialized"},
+                },
+                {
+                    "course_id": str(self.course.id),
+                    "user_id": str(self.other_user.id),
+                    "statement": {"status": "completed"},
+                },
+            ],
+        )
+
+        assert response.status_code == 200
+        assert matches(
+            response.json(),
+            [
+                {
+                    "course_id": str(self.course.id),
+                    "user_id": str(self.user.id),
+                    "status": "updated",
+                    "statement_id": str(self.statements.id),
+                },
+                {
+                    "course_id": str(self.course.id),
+                    "user_id": str(self.other_user.id),
+                    "status": "created",
+                    "statement_id": ...,
+                },
+                {
+                    "course_id": str(self.course.id),
+                    "user_id": unknown_user_id,
+                    "status": "not_found",
+                    "statement_id": None,
+                },
+                {
+                    "course_id": str(self.course.id),
+                    "user_id": str(self.other_user.id),
+                    "status": "created",
+                    "statement_id": response.json()[1]["statement_id"],
+                },
+            ],
+        )
+
+        async with db_session() as session:
+            statements = dict(
+                (
+                    await session.execute(
+                        select(CMIEnrollment.user_id, CMIStatement.statements).join(
+                            CMIStatement,
+                            CMIStatement.id == CMIEnrollment.statement_id,
+                        )
+                    )
+                ).all()
+            )
+
+        assert statements == {
+            self.user.id: {"status": "progressed"},
+            self.other_user.id: {"status": "completed"},
+        }
+
+    async def test_create_statements_batch__empty(self, api_app, client):
+        response = await client.post(
+            api_app.url_path_for("statements:create_statements_batch"),
+            json=[],
+        )
+
+        assert response.status_code == 422
+
+    async def test_create_statement__appends_events(self, db_session, api_app, client):
+        async with db_session() as session:
+            session.add_all((self.course, self.other_user, self.other_enrollment))
+            await session.commit()
+
+        for statement in (
+            {"status": "initialized", "progress": 0},
+            {"progress": 50},
+            {"status": "completed", "progress": 100},
+        ):
+            response = await client.post(
+                api_app.url_path_for("statements:create_statement"),
+                json={
+                    "course_id": str(self.course.id),
+                    "user_id": str(self.other_user.id),
+                    "statement": statement,
+                },
+            )
+            assert response.status_code == 200
+
+        response = await client.get(
+            api_app.url_path_for(
+                "statements:get_statement",
+                course_id=str(self.course.id),
+                user_id=str(self.other_user.id),
+            ),
+        )
+
+        assert response.status_code == 200
+        assert response.json()["statements"] == {
+            "status": "completed",
+            "progress": 100,
+        }
+
+        response = await client.get(
+            api_app.url_path_for(
+                "statements:get_statement_events",
+                course_id=str(self.course.id),
+                user_id=str(self.other_user.id),
+            ),
+        )
+
+        assert response.status_code == 200
+        assert matches(
+            response.json(),
+            [
+                {
+                    "id": ...,
+                    "statement": {"status": "initialized", "progress": 0},
+                    "created_at": ...,
+                },
+                {"id": ..., "statement": {"progress": 50}, "created_at": ...},
+                {
+                    "id": ...,
+                    "statement": {"status": "completed", "progress": 100},
+                    "created_at": ...,
+                },
+            ],
+        )
+        ids = [event["id"] for event in response.json()]
+        assert ids == sorted(ids)
+
+    async def test_create_statement__merge(self, db_session, api_app, client, mocker):
+        async with db_session() as session:
+            session.add_all((self.course, self.other_user, self.other_enrollment))
+            await session.commit()
+
+        async def post(statement):
+            response = await client.post(
+                api_app.url_path_for("statements:create_statement"),
+                json={
+                    "course_id": str(self.course.id),
+                    "user_id": str(self.other_user.id),
+                    "statement": statement,
+                },
+            )
+            assert response.status_code == 200
+            return response.json()["statement"]["statements"]
+
+        assert await post({"status": "initialized", "progress": 0}) == {
+            "status": "initialized",
+            "progress": 0,
+        }
+        assert await post({"progress": 50}) == {"progress": 50}
+
+        mocker.patch.object(settings, "statement_merge", True)
+        assert await post({"status": "completed"}) == {
+            "status": "completed",
+            "progress": 50,
+        }
+
+    async def test_create_statement__concurrent_create(self, db_session):
+        from modules.statements.service import CMIStatementService
+
+        async with db_session() as session:
+            session.add_all((self.course, self.other_user, self.other_enrollment))
+            await session.commit()
+
+        stale = CMIEnrollment(id=self.other_enrollment.id, statement_id=None)
+        async with db_session() as session:
+            first = await CMIStatementService(session).create(
+                stale, {"status": "initialized"}
+            )
+        async with db_session() as session:
+            second = await CMIStatementService(session).create(
+                stale, {"status": "completed"}
+            )
+
+        assert second.id == first.id
+        assert second.statements == {"status": "completed"}
+
+        async with db_session() as session:
+            statement = await session.get(CMIStatement, first.id)
+            events = await CMIStatementService(session).get_events(stale.id)
+
+        assert statement.statements == {"status": "completed"}
+        assert statement.last_event_id == events[-1].id
+        assert len(events) == 2
+
+    async def test_get_statement_events__enrollment_not_found(self, api_app, client):
+        response = await client.get(
+            api_app.url_path_for(
+                "statements:get_statement_events",
+                course_id=str(uuid4()),
+                user_id=str(uuid4()),
+            ),
+        )
+
+        assert response.status_code == 404
+
+    async def test_get_statement__read_modes(self, db_session, api_app, client, mocker):
+        self.statements.statements = dict(
+            status="progressed",
+            title="Курс \"один\"\n",
+            events=[dict(id=str(uuid4()), progress=i / 3) for i in range(1000)],
+        )
+        async with db_session() as session:
+            session.add_all((self.user, self.course, self.enrollment, self.statements))
+            await session.commit()
+
+        urls = [
+            api_app.url_path_for(
+                "statements:get_statement",
+                course_id=str(self.course.id),
+                user_id=str(self.user.id),
+            ),
+            api_app.url_path_for(
+                "statements:get_statement", course_id=uuid4(), user_id=uuid4()
+            ),
+        ]
+
+        async def get_all():
+            responses = [await client.get(url) for url in urls]
+            assert all(r.status_code == 200 for r in responses)
+            assert all(
+                r.headers["content-type"] == "application/json" for r in responses
+            )
+            return [r.json() for r in responses]
+
+        raw = await get_all()
+        mocker.patch.object(settings, "statement_raw_read", False)
+        records = await get_all()
+        mocker.patch.object(settings, "fast_read_path", False)
+        orm = await get_all()
+
+        assert raw == records == orm
+        assert raw == [
+            {"id": str(self.statements.id), "statements": self.statements.statements},
+            {},
+        ]
+
+    async def test_get_all_statements__paginated(self, db_session, api_app, client):
+        other_statements = CMIStatement(id=uuid4(), statements=dict(status="new"))
+        self.other_enrollment.statement_id = other_statements.id
+        async with db_session() as session:
+            session.add_all(
+                (
+                    self.course,
+                    self.user,
+                    self.other_user,
+                    self.statements,
+                    other_statements,
+                    self.enrollment,
+                    self.other_enrollment,
+                )
+            )
+            await session.commit()
+
+        response = await client.get(
+            api_app.url_path_for("statements:get_all_statements"),
+            params=dict(limit=1),
+        )
+        first_id = min(self.statements.id, other_statements.id)
+
+        assert response.status_code == 200
+        assert [obj["statement"]["id"] for obj in response.json()] == [str(first_id)]
+        assert response.headers["X-Next-Cursor"] == str(first_id)
+
+        response = await client.get(
+            api_app.url_path_for("statements:get_all_statements"),
+            params=dict(limit=1, cursor=response.headers["X-Next-Cursor"]),
+        )
+        last_id = max(self.statements.id, other_statements.id)
+
+        assert response.status_code == 200
+        assert [obj["statement"]["id"] for obj in response.json()] == [str(last_id)]
+
+        response = await client.get(
+            api_app.url_path_for("statements:get_all_statements"),
+            params=dict(limit=1, cursor=response.headers["X-Next-Cursor"]),
+        )
+
+        assert response.status_code == 200
+        assert response.json() == []
+        assert "X-Next-Cursor" not in response.headers
+
+    async def test_get_all_statements__ndjson(self, db_session, api_app, client):
+        async with db_session() as session:
+            session.add_all((self.course, self.user, self.statements, self.enrollment))
+            await session.commit()
+
+        response = await client.get(
+            api_app.url_path_for("statements:get_all_statements"),
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 200
+        assert matches(
+            [json.loads(line) for line in response.text.splitlines()],
+            [
+                {
+                    "course": {"id": str(self.course.id), ...: ...},
+                    "user": {"id": str(self.user.id), "email": "test@gmail.com"},
+                    "statement": {
+                        "id": str(self.statements.id),
+                        "statements": {"status": "ok"},
+                    },
+                }
+            ],
+        )
+
+    async def test_get_all_statements__filtered(self, db_session, api_app, client):
+        other_statements = CMIStatement(id=uuid4(), statements=dict(status="new"))
+        self.other_enrollment.statement_id = other_statements.id
+        async with db_session() as session:
+            session.add_all(
+                (
+                    self.course,
+                    self.user,
+                    self.other_user,
+                    self.statements,
+                    other_statements,
+                    self.enrollment,
+                    self.other_enrollment,
+                )
+            )
+            await session.commit()
+
+        response = await client.get(
+            api_app.url_path_for("statements:get_all_statements"),
+            params=dict(course_id=str(self.course.id), user_id=str(self.user.id)),
+        )
+
+        assert response.status_code == 200
+        assert [obj["user"]["id"] for obj in response.json()] == [str(self.user.id)]
+
+        now = datetime.datetime.utcnow()
+        response = await client.get(
+            api_app.url_path_for("statements:get_all_statements"),
+            params=dict(
+                updated_from=(now - datetime.timedelta(hours=1)).isoformat(),
+                updated_to=(now + datetime.timedelta(hours=1)).isoformat(),
+            ),
+        )
+
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+
+        response = await client.get(
+            api_app.url_path_for("statements:get_all_statements"),
+            params=dict(updated_from=(now + datetime.timedelta(hours=1)).isoformat()),
+        )
+
+        assert response.status_code == 200
+        assert response.json() == []
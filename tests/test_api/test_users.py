@@ -1,8 +1,12 @@
+import json
 from uuid import uuid4
 
 from sqlalchemy import and_, select
+from modules.courses.cache import course_cache
 from modules.courses.models import CMICourse, CMIEnrollment
+from modules.courses.service import CMICourseService
 from modules.users.models import User
+from modules.users.utils import password_hasher
 from shared.utils import matches
 
 
@@ -30,6 +34,66 @@ class TestUsersAPI:
             ],
         )
 
+    async def test_get_all_users__paginated(self, db_session, api_app, client):
+        users = [
+            User(id=uuid4(), email=f"test{i}@gmail.com", password="password")
+            for i in range(5)
+        ]
+        async with db_session() as session:
+            session.add_all(users)
+            await session.commit()
+
+        ids, cursor = [], None
+        for _ in range(3):
+            response = await client.get(
+                api_app.url_path_for("users:get_all_users"),
+                params=dict(limit=2, **({"cursor": cursor} if cursor else {})),
+            )
+            assert response.status_code == 200
+            ids += [user["id"] for user in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+
+        assert cursor is None
+        assert ids == sorted(str(user.id) for user in users)
+
+    async def test_get_all_users__cors(self, db_session, api_app, client):
+        async with db_session() as session:
+            session.add(self.user)
+            await session.commit()
+
+        response = await client.get(
+            api_app.url_path_for("users:get_all_users"),
+            params=dict(limit=1),
+            headers={"Origin": "http://example.com"},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["Access-Control-Expose-Headers"] == "X-Next-Cursor"
+
+    async def test_get_all_users__limit_too_large(self, api_app, client):
+        response = await client.get(
+            api_app.url_path_for("users:get_all_users"),
+            params=dict(limit=100000),
+        )
+
+        assert response.status_code == 422
+
+    async def test_get_all_users__ndjson(self, db_session, api_app, client):
+        async with db_session() as session:
+            session.add(self.user)
+            await session.commit()
+
+        response = await client.get(
+            api_app.url_path_for("users:get_all_users"),
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in response.text.splitlines()] == [
+            {"id": str(self.user.id), "email": "test@gmail.com"}
+        ]
+
     async def test_create_user(self, api_app, client):
         response = await client.post(
             api_app.url_path_for("users:create_user"),
@@ -45,6 +109,16 @@ class TestUsersAPI:
             },
         )
 
+    async def test_create_user__hasher_busy(self, api_app, client, mocker):
+        mocker.patch.object(password_hasher, "max_pending", 0)
+
+        response = await client.post(
+            api_app.url_path_for("users:create_user"),
+            json=dict(email="test2@gmail.com", password="password"),
+        )
+
+        assert response.status_code == 503
+
     async def test_create_user__already_exist(self, db_session, api_app, client):
         async with db_session() as session:
             session.add(self.user)
@@ -82,6 +156,49 @@ class TestUsersAPI:
 
         assert not user
 
+    async def test_delete_user__course_users_cache(
+        self, db_session, api_app, client, mocker
+    ):
+        course = CMICourse(
+            id=uuid4(),
+            title="string",
+            description="string",
+            file_link="string",
+            organization_id=uuid4(),
+        )
+        async with db_session() as session:
+            session.add_all(
+                (
+                    self.user,
+                    course,
+                    CMIEnrollment(
+                        id=uuid4(), course_id=course.id, user_id=self.user.id
+                    ),
+                )
+            )
+            await session.commit()
+
+        url = api_app.url_path_for("courses:get_cmi5_course", course_id=course.id)
+        response = await client.get(url)
+        assert [user["id"] for user in response.json()["users"]] == [str(self.user.id)]
+
+        invalidate = course_cache.invalidate
+
+        async def reload_after_invalidate(namespace):
+            await invalidate(namespace)
+            # another worker reloads course users as soon as it is notified
+            async with db_session() as session:
+                await CMICourseService(session).get_users(course)
+
+        mocker.patch.object(course_cache, "invalidate", reload_after_invalidate)
+        response = await client.delete(
+            api_app.url_path_for("users:delete_user", user_id=self.user.id),
+        )
+        assert response.status_code == 204
+
+        response = await client.get(url)
+        assert response.json()["users"] == []
+
     async def test_delete_user__not_found(self, db_session, api_app, client):
         async with db_session() as session:
             session.add(self.user)
@@ -0,0 +1,63 @@
+import asyncio
+import io
+import os
+import zipfile
+
+from modules.courses.jobs import (
+    InProcessJobQueue,
+    JobState,
+    JobStore,
+    PublishJob,
+)
+
+ARCHIVE_PATH = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "../resources/scorm.zip",
+)
+
+
+def make_job() -> PublishJob:
+    with open(ARCHIVE_PATH, "rb") as f:
+        file = io.BytesIO(f.read())
+    return PublishJob(
+        title="string", description="string", archive=zipfile.ZipFile(file), file=file
+    )
+
+
+async def test_job_queue__stop(db_session):
+    started = asyncio.Event()
+
+    async def handler(job):
+        job.objects_uploaded = 1
+        started.set()
+        await asyncio.sleep(60)
+
+    store = JobStore()
+    queue = InProcessJobQueue(
+        handler,
+        kind=PublishJob.kind,
+        workers=1,
+        max_size=10,
+        keep_finished=10,
+        store=store,
+        save_interval=0.01,
+    )
+    await queue.start()
+    running, pending = make_job(), make_job()
+    await queue.submit(running)
+    await queue.submit(pending)
+    await started.wait()
+    await asyncio.sleep(0.05)
+
+    saved = await store.get(running.id, PublishJob.kind)
+    assert (saved.state, saved.objects_uploaded) == ("running", 1)
+
+    await queue.stop()
+
+    for job in (running, pending):
+        assert job.state == JobState.failed
+        assert job.error == "Cancelled on shutdown"
+        assert job.file.closed
+        saved = await store.get(job.id, PublishJob.kind)
+        assert saved.state == "failed"
+        assert saved.finished_at is not None
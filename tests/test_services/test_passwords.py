@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from modules.users.utils import PasswordHasher, PasswordHasherBusy, verify_password
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=2, max_pending=2)
+    yield hasher
+    hasher.shutdown()
+
+
+async def test_password_hasher(hasher):
+    hashed = await hasher.hash("password")
+
+    assert verify_password("password", hashed)
+    assert not verify_password("other", hashed)
+    assert hasher.stats()["pending"] == 0
+
+
+async def test_password_hasher__busy(hasher):
+    results = await asyncio.gather(
+        *(hasher.hash("password") for _ in range(3)), return_exceptions=True
+    )
+
+    assert sum(isinstance(result, PasswordHasherBusy) for result in results) == 1
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["pending"] == 0
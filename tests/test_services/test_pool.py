@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.pool import InstrumentedPool
+
+
+async def test_instrumented_pool(POSTGRES_TEST_DSN, create_test_db):
+    engine = create_async_engine(
+        POSTGRES_TEST_DSN,
+        poolclass=InstrumentedPool,
+        pool_size=1,
+        max_overflow=0,
+        connect_args=dict(server_settings=dict(jit="off")),
+    )
+
+    async def query():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT pg_sleep(0.05)"))
+            return (await connection.execute(text("SHOW jit"))).scalar()
+
+    try:
+        assert await asyncio.gather(query(), query()) == ["off", "off"]
+        stats = engine.sync_engine.pool.stats()
+    finally:
+        await engine.dispose()
+
+    assert stats["checkouts"] == 2
+    assert stats["waits"] == 1
+    assert stats["wait_seconds_max"] >= 0.04
+    assert stats["checked_out"] == 0
+
+
+async def test_instrumented_pool__timeout(POSTGRES_TEST_DSN, create_test_db):
+    engine = create_async_engine(
+        POSTGRES_TEST_DSN,
+        poolclass=InstrumentedPool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+
+    try:
+        async with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+        stats = engine.sync_engine.pool.stats()
+    finally:
+        await engine.dispose()
+
+    assert stats["checkouts"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["waits"] == 0
+    assert stats["checked_out"] == 0
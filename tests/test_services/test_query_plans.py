@@ -0,0 +1,150 @@
+import hashlib
+import json
+from uuid import UUID
+
+import pytest
+from sqlalchemy import event
+
+from modules.courses.service import CMICourseService
+from modules.statements.service import CMIStatementService, StatementFilter
+from modules.users.services import UserService
+
+COURSES = 5000
+USERS = 20000
+COURSES_PER_USER = 4
+
+SEEDED_TABLES = {
+    "cmi_courses",
+    "users",
+    "cmi_statements",
+    "cmi5_course_users",
+    "cmi_statement_events",
+}
+
+
+def seeded_id(kind: str, number: int) -> UUID:
+    """Same ids as generated by the seed statements"""
+
+    return UUID(hashlib.md5(f"{kind}{number}".encode()).hexdigest())
+
+
+SEED = (
+    f"""
+    INSERT INTO cmi_courses (id, title, description, organization_id, file_link)
+    SELECT md5('c' || g)::uuid, 'course ' || g, '', md5('o' || g)::uuid,
+        '/courses/' || g || '/res/index.html'
+    FROM generate_series(1, {COURSES}) g
+    """,
+    f"""
+    INSERT INTO users (id, email, password)
+    SELECT md5('u' || g)::uuid, 'user' || g || '@gmail.com', ''
+    FROM generate_series(1, {USERS}) g
+    """,
+    f"""
+    INSERT INTO cmi_statements (id, statements)
+    SELECT md5('s' || u || '-' || c)::uuid, '{{"status": "ok"}}'
+    FROM generate_series(1, {USERS}) u, generate_series(1, {COURSES_PER_USER}) c
+    """,
+    f"""
+    INSERT INTO cmi5_course_users (id, course_id, user_id, statement_id)
+    SELECT md5('e' || u || '-' || c)::uuid,
+        md5('c' || ((u + c) % {COURSES} + 1))::uuid,
+        md5('u' || u)::uuid,
+        md5('s' || u || '-' || c)::uuid
+    FROM generate_series(1, {USERS}) u, generate_series(1, {COURSES_PER_USER}) c
+    """,
+    """
+    INSERT INTO cmi_statement_events (enrollment_id, statement)
+    SELECT id, '{"status": "ok"}' FROM cmi5_course_users
+    """,
+    "ANALYZE",
+)
+
+# user 1 is enrolled to courses 3..6
+COURSE_ID = seeded_id("c", 3)
+USER_ID = seeded_id("u", 1)
+ENROLLMENT_ID = seeded_id("e", "1-2")
+
+QUERIES = {
+    "course.get_by_id": lambda s: CMICourseService(s).get_by_id(COURSE_ID),
+    "course.get_by_user_id": lambda s: CMICourseService(s).get_by_user_id(USER_ID),
+    "course.get_enrollment": lambda s: CMICourseService(s).get_enrollment(
+        COURSE_ID, USER_ID
+    ),
+    "course.get_all": lambda s: CMICourseService(s).get_all(COURSE_ID, limit=10),
+    "course.get_all_records": lambda s: CMICourseService(s).get_all_records(
+        COURSE_ID, limit=10
+    ),
+    "user.get_by_id": lambda s: UserService(s).get_by_id(USER_ID),
+    "user.get_by_email": lambda s: UserService(s).get_by_email("user1@gmail.com"),
+    "user.get_all": lambda s: UserService(s).get_all(USER_ID, limit=10),
+    "user.get_courses_record": lambda s: UserService(s).get_courses_record(USER_ID),
+    "statement.get_statement": lambda s: CMIStatementService(s).get_statement(
+        COURSE_ID, USER_ID
+    ),
+    "statement.get_statement_record": lambda s: CMIStatementService(
+        s
+    ).get_statement_record(COURSE_ID, USER_ID),
+    "statement.get_events": lambda s: CMIStatementService(s).get_events(ENROLLMENT_ID),
+    "statement.get_full_rows__user": lambda s: CMIStatementService(s).get_full_rows(
+        StatementFilter(user_id=USER_ID), limit=10
+    ),
+    "statement.get_full_rows__course": lambda s: CMIStatementService(s).get_full_rows(
+        StatementFilter(course_id=COURSE_ID), limit=10
+    ),
+}
+
+
+def seq_scans(plan: dict) -> list[str]:
+    """Seeded tables read by sequential scan in the plan node or its children"""
+
+    scans = []
+    if plan["Node Type"] == "Seq Scan" and plan["Relation Name"] in SEEDED_TABLES:
+        scans.append(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        scans.extend(seq_scans(child))
+    return scans
+
+
+@pytest.fixture(scope="module")
+async def seeded_db(db_session):
+    async with db_session() as session:
+        for statement in SEED:
+            await session.execute(statement)
+
+    yield
+
+    tables = ",".join(x.name for x in pytest.reversed_tables)
+    async with db_session() as session:
+        await session.execute(f"TRUNCATE {tables} RESTART IDENTITY;")
+
+
+@pytest.fixture(autouse=True)
+def truncate_db():
+    """Seeded data is shared by the tests of the module"""
+
+
+@pytest.mark.parametrize("name", QUERIES)
+async def test_query_plan__no_seq_scans(name, seeded_db, db_session, test_engine):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        async with db_session() as session:
+            await QUERIES[name](session)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", capture)
+
+    assert statements
+    async with test_engine.connect() as conn:
+        for statement, parameters in statements:
+            result = await conn.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            )
+            plan = result.scalar()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+
+            assert seq_scans(plan[0]["Plan"]) == [], statement
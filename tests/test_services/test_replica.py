@@ -0,0 +1,63 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database.db import Base
+from database.session import RoutingSession
+from modules.users.models import User
+from modules.users.services import UserService
+from shared.sqlalchemy import create_database, drop_database
+
+
+@pytest.fixture
+async def replica_engine(POSTGRES_TEST_DSN, create_test_db):
+    url = f"{POSTGRES_TEST_DSN}_replica"
+    await create_database(url)
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield engine
+
+    await engine.dispose()
+    await drop_database(url)
+
+
+@pytest.fixture
+def routing_session(test_engine, replica_engine):
+    return sessionmaker(
+        bind=test_engine,
+        class_=AsyncSession,
+        sync_session_class=RoutingSession,
+        replica=replica_engine.sync_engine,
+        expire_on_commit=False,
+    )
+
+
+async def test_replica__read_only_methods(test_engine, replica_engine, routing_session):
+    user_id = uuid4()
+    for engine, email in (
+        (test_engine, "primary@gmail.com"),
+        (replica_engine, "replica@gmail.com"),
+    ):
+        async with AsyncSession(engine) as session:
+            session.add(User(id=user_id, email=email, password="password"))
+            await session.commit()
+
+    async with routing_session() as session:
+        service = UserService(session)
+
+        assert (await service.get_by_id(user_id)).email == "replica@gmail.com"
+        # queries outside of read-only methods stay on the primary
+        assert (await service.get_by_email("primary@gmail.com")).id == user_id
+
+
+async def test_replica__reads_own_writes(test_engine, replica_engine, routing_session):
+    async with routing_session() as session:
+        service = UserService(session)
+        user = await service.create(dict(email="test@gmail.com", password="password"))
+        session.expunge(user)
+
+        assert (await service.get_by_id(user.id)).email == "test@gmail.com"
@@ -0,0 +1,55 @@
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from database import session as db_session_module
+from database.session import RequestSession
+from modules.users.models import User
+
+
+async def test_session__commits_only_writes(test_engine, create_test_db, mocker):
+    mocker.patch.object(
+        db_session_module,
+        "async_session_factory",
+        sessionmaker(bind=test_engine, class_=AsyncSession, expire_on_commit=False),
+    )
+    commit = mocker.spy(AsyncSession, "commit")
+    SessionManager = asynccontextmanager(db_session_module._get_session)
+
+    async with SessionManager() as session:
+        await session.execute(select(User))
+    assert commit.call_count == 0
+
+    user = User(id=uuid4(), email="test@gmail.com", password="password")
+    async with SessionManager() as session:
+        session.add(user)
+    assert commit.call_count == 1
+
+    async with SessionManager() as session:
+        await session.execute(
+            update(User).where(User.id == user.id).values(email="new@gmail.com")
+        )
+    assert commit.call_count == 2
+
+    async with SessionManager() as session:
+        assert (
+            await session.execute(select(User.email).where(User.id == user.id))
+        ).scalar() == "new@gmail.com"
+    assert commit.call_count == 2
+
+
+async def test_session__opened_on_first_use(api_app, client, mocker):
+    get = mocker.spy(RequestSession, "get")
+
+    response = await client.get(api_app.url_path_for("metrics:get_metrics"))
+
+    assert response.status_code == 200
+    assert get.call_count == 0
+
+    response = await client.get(api_app.url_path_for("users:get_all_users"))
+
+    assert response.status_code == 200
+    assert get.call_count == 1
@@ -0,0 +1,504 @@
+import asyncio
+import io
+import os
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from botocore.exceptions import ClientError
+from fastapi import UploadFile
+from minio.error import S3Error
+
+from shared.utils import iter_zip_members, open_zip
+from storage.s3 import AsyncS3Storage
+from storage.storage import (
+    LocalStorage,
+    SharedStorage,
+    ThreadPoolStorage,
+    http_pool_stats,
+    make_http_client,
+)
+from storage.uploader import AsyncUploader, ParallelUploader, UploadTask
+
+ARCHIVE_PATH = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "./resources/scorm.zip",
+)
+
+
+class FakeMinio:
+    """In-memory stand-in of the minio client"""
+
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self.puts: list[str] = []
+
+    def _not_found(self, object_name: str) -> S3Error:
+        return S3Error("NoSuchKey", "not found", object_name, "", "", None)
+
+    def put_object(self, bucket_name, object_name, data, length, **kwargs):
+        self.objects[object_name] = data.read(length)
+        self.puts.append(object_name)
+
+    def stat_object(self, bucket_name, object_name):
+        if object_name not in self.objects:
+            raise self._not_found(object_name)
+
+    def get_object(self, bucket_name, object_name):
+        if object_name not in self.objects:
+            raise self._not_found(object_name)
+
+        response = io.BytesIO(self.objects[object_name])
+        response.stream = lambda amt: iter(lambda: response.read(amt), b"")
+        response.release_conn = lambda: None
+        return response
+
+
+class FakeS3Body:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def read(self) -> bytes:
+        return self.data
+
+    async def iter_chunks(self, chunk_size: int):
+        for index in range(0, len(self.data), chunk_size):
+            yield self.data[index : index + chunk_size]
+
+
+class FakeS3Client:
+    """In-memory stand-in of the aiobotocore s3 client"""
+
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self.puts: list[str] = []
+        self.uploads: dict[str, list[bytes]] = {}
+        self.aborted: list[str] = []
+        # operation name: errors raised by its next calls
+        self.failures: dict[str, list[Exception]] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _not_found(self, operation: str) -> ClientError:
+        return ClientError({"Error": {"Code": "404"}}, operation)
+
+    async def _request(self, operation: str) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+            if self.failures.get(operation):
+                raise self.failures[operation].pop(0)
+        finally:
+            self.in_flight -= 1
+
+    async def put_object(self, Bucket, Key, Body, **kwargs):
+        await self._request("put_object")
+        self.objects[Key] = Body
+        self.puts.append(Key)
+
+    async def create_multipart_upload(self, Bucket, Key, **kwargs):
+        await self._request("create_multipart_upload")
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = []
+        return {"UploadId": upload_id}
+
+    async def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        await self._request("upload_part")
+        self.uploads[UploadId].append(Body)
+        return {"ETag": f"etag-{PartNumber}"}
+
+    async def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        await self._request("complete_multipart_upload")
+        parts = self.uploads.pop(UploadId)
+        assert [part["PartNumber"] for part in MultipartUpload["Parts"]] == list(
+            range(1, len(parts) + 1)
+        )
+        self.objects[Key] = b"".join(parts)
+        self.puts.append(Key)
+
+    async def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+        self.aborted.append(Key)
+
+    async def head_object(self, Bucket, Key):
+        await self._request("head_object")
+        if Key not in self.objects:
+            raise self._not_found("HeadObject")
+
+    async def get_object(self, Bucket, Key):
+        await self._request("get_object")
+        if Key not in self.objects:
+            raise self._not_found("GetObject")
+        return {"Body": FakeS3Body(self.objects[Key])}
+
+
+def read_archive(archive_path: str = ARCHIVE_PATH) -> UploadFile:
+    with open(archive_path, "rb") as f:
+        return UploadFile(file=io.BytesIO(f.read()), filename="string")
+
+
+def make_tasks(count: int) -> list[UploadTask]:
+    return [
+        UploadTask(
+            object_name=f"courses/test/{index}.js",
+            length=index,
+            content_type="application/javascript",
+            open=lambda index=index: io.BytesIO(b"x" * index),
+        )
+        for index in range(count)
+    ]
+
+
+def make_uploader(mocker, **kwargs) -> ParallelUploader:
+    params = dict(workers=4, part_size=5 * 1024 * 1024, retries=2, retry_delay=0)
+    params.update(kwargs)
+    return ParallelUploader(mocker.Mock(), "bucket", **params)
+
+
+def test_save_course_archive(mocker):
+    put_object = mocker.patch("minio.Minio.put_object")
+
+    with open(ARCHIVE_PATH, "rb") as f:
+        file = UploadFile(file=io.BytesIO(f.read()), filename="string")
+
+    with open_zip(file) as archive:
+        folder = LocalStorage().save_course_archive(archive)
+        sizes = {path: info.file_size for path, info in iter_zip_members(archive)}
+
+    assert folder.startswith("courses/")
+    uploaded = {
+        call.args[1]: call.kwargs["length"] for call in put_object.call_args_list
+    }
+    assert uploaded == {
+        os.path.join(folder, path): size for path, size in sizes.items()
+    }
+
+
+def test_save_course_archive__content_addressed(mocker):
+    mocker.patch("config.settings.s3_settings.content_addressed", True)
+    minio = FakeMinio()
+
+    def save() -> str:
+        # every request has own storage which doesn't know uploaded blobs
+        storage = LocalStorage()
+        storage.minio = storage.uploader.minio = minio
+
+        with open(ARCHIVE_PATH, "rb") as f:
+            file = UploadFile(file=io.BytesIO(f.read()), filename="string")
+        with open_zip(file) as archive:
+            return storage.save_course_archive(archive)
+
+    open_member = mocker.spy(zipfile.ZipFile, "open")
+    folder = save()
+
+    blobs = [name for name in minio.puts if name.startswith("blobs/")]
+    assert len(blobs) == 4
+    # every member is decompressed once for hashing and upload
+    assert open_member.call_count == 4
+    assert minio.puts == [*blobs, os.path.join(folder, "manifest.json")]
+
+    minio.puts = []
+    second_folder = save()
+
+    # re-uploaded course transfers only the manifest
+    assert second_folder != folder
+    assert minio.puts == [os.path.join(second_folder, "manifest.json")]
+
+
+def test_get_course_object__content_addressed(mocker):
+    mocker.patch("config.settings.s3_settings.content_addressed", True)
+    storage = LocalStorage()
+    storage.minio = storage.uploader.minio = FakeMinio()
+
+    with open(ARCHIVE_PATH, "rb") as f:
+        file = UploadFile(file=io.BytesIO(f.read()), filename="string")
+    with open_zip(file) as archive:
+        folder = storage.save_course_archive(archive)
+        expected = archive.read("res/index.html")
+
+    object_name = storage.get_course_object(os.path.join(folder, "res/index.html"))
+
+    assert object_name.startswith("blobs/")
+    assert storage.minio.objects[object_name] == expected
+    assert not storage.get_course_object(os.path.join(folder, "res/missing.js"))
+
+
+def test_get_course_object(mocker):
+    storage = LocalStorage()
+    storage.minio = FakeMinio()
+
+    assert (
+        storage.get_course_object("/courses/folder/res/index.html")
+        == "courses/folder/res/index.html"
+    )
+    assert not storage.get_course_object("/blobs/digest")
+
+
+def test_parallel_uploader(mocker):
+    uploader = make_uploader(mocker)
+
+    report = uploader.upload(make_tasks(100))
+
+    assert uploader.minio.put_object.call_count == 100
+    assert report.objects == 100
+    assert report.bytes == sum(range(100))
+    assert report.retries == 0
+    assert report.throughput > 0
+
+
+def test_parallel_uploader__retry(mocker):
+    uploader = make_uploader(mocker)
+    uploader.minio.put_object.side_effect = [ConnectionError(), None]
+
+    report = uploader.upload(make_tasks(1))
+
+    assert uploader.minio.put_object.call_count == 2
+    assert report.objects == 1
+    assert report.retries == 1
+
+
+def test_parallel_uploader__out_of_retries(mocker):
+    uploader = make_uploader(mocker, workers=1)
+    uploader.minio.put_object.side_effect = ConnectionError()
+
+    with pytest.raises(ConnectionError):
+        uploader.upload(make_tasks(10))
+
+    # the first object runs out of retries, queued objects are cancelled
+    assert uploader.minio.put_object.call_count <= 2 * 3
+
+
+async def test_shared_storage(mocker):
+    mocker.patch("config.settings.s3_settings.max_connections", 3)
+    shared_storage = SharedStorage()
+
+    storage = await shared_storage.get()
+
+    assert await shared_storage.get() is storage
+    assert storage.storage.minio._http is storage.storage.http_client
+    assert shared_storage.stats()["max_connections"] == 3
+
+    await shared_storage.stop()
+
+    assert shared_storage.stats() == {}
+    assert await shared_storage.get() is not storage
+
+
+def test_http_pool_stats():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    http_client = make_http_client()
+    try:
+        for _ in range(3):
+            response = http_client.request(
+                "GET", f"http://127.0.0.1:{server.server_port}/"
+            )
+            assert response.data == b"ok"
+
+        # requests reuse one keep-alive connection
+        assert http_pool_stats(http_client) == dict(
+            max_connections=16,
+            pools=1,
+            connections_created=1,
+            idle_connections=1,
+            requests=3,
+        )
+    finally:
+        http_client.clear()
+        server.shutdown()
+        server.server_close()
+
+
+async def test_async_s3_storage__save_course_archive(mocker):
+    mocker.patch("config.settings.s3_settings.upload_workers", 2)
+    mocker.patch("config.settings.s3_settings.upload_part_size", 1024)
+    client = FakeS3Client()
+    storage = AsyncS3Storage(client)
+    uploaded = []
+
+    with open_zip(read_archive()) as archive:
+        folder = await storage.save_course_archive(archive, on_uploaded=uploaded.append)
+        expected = {
+            os.path.join(folder, path): archive.read(info)
+            for path, info in iter_zip_members(archive)
+        }
+
+    assert folder.startswith("courses/")
+    assert client.objects == expected
+    assert len(uploaded) == len(expected)
+    # members bigger than a part are sent by multipart upload
+    assert any(len(data) > 1024 for data in expected.values())
+    assert client.uploads == {}
+    assert client.max_in_flight == 2
+    assert storage.stats()["uploads"] == dict(workers=2, in_flight=0)
+
+
+async def test_async_s3_storage__content_addressed(mocker):
+    mocker.patch("config.settings.s3_settings.content_addressed", True)
+    client = FakeS3Client()
+
+    async def save() -> str:
+        # every storage has own cache of uploaded blobs
+        with open_zip(read_archive()) as archive:
+            return await AsyncS3Storage(client).save_course_archive(archive)
+
+    folder = await save()
+
+    blobs = [name for name in client.puts if name.startswith("blobs/")]
+    assert len(blobs) == 4
+    assert client.puts == [*blobs, os.path.join(folder, "manifest.json")]
+
+    client.puts = []
+    second_folder = await save()
+
+    # re-uploaded course transfers only the manifest
+    assert second_folder != folder
+    assert client.puts == [os.path.join(second_folder, "manifest.json")]
+
+    storage = AsyncS3Storage(client)
+    object_name = await storage.get_course_object(
+        os.path.join(folder, "res/index.html")
+    )
+    with open_zip(read_archive()) as archive:
+        assert client.objects[object_name] == archive.read("res/index.html")
+    assert not await storage.get_course_object(os.path.join(folder, "res/missing.js"))
+    assert (
+        await storage.get_course_object("/courses/folder/res/index.html")
+        == "courses/folder/res/index.html"
+    )
+    assert not await storage.get_course_object("/blobs/digest")
+    assert [chunk async for chunk in storage.iter_object(object_name)] == [
+        client.objects[object_name]
+    ]
+
+
+async def test_async_uploader__retry():
+    client = FakeS3Client()
+    client.failures = dict(
+        create_multipart_upload=[ConnectionError()], upload_part=[ConnectionError()]
+    )
+    uploader = AsyncUploader(
+        client, "bucket", workers=4, part_size=10, retries=2, retry_delay=0
+    )
+
+    # the upload fails to start, then its first part fails and it is aborted
+    report = await uploader.upload(make_tasks(30)[25:26])
+
+    assert report.retries == 2
+    assert client.objects == {"courses/test/25.js": b"x" * 25}
+    assert len(client.aborted) == 1
+
+
+async def test_async_uploader__reads_off_loop():
+    class SlowStream(io.BytesIO):
+        def read(self, size=-1):
+            # like inflating a big archive member
+            time.sleep(0.05)
+            return super().read(size)
+
+    client = FakeS3Client()
+    uploader = AsyncUploader(
+        client, "bucket", workers=2, part_size=10, retries=0, retry_delay=0
+    )
+    tasks = [
+        UploadTask(
+            object_name=f"courses/test/{index}.js",
+            length=length,
+            content_type="application/javascript",
+            open=lambda length=length: SlowStream(b"x" * length),
+        )
+        for index, length in enumerate((5, 35))
+    ]
+    lags = []
+
+    async def probe():
+        loop = asyncio.get_running_loop()
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(0.005)
+            lags.append(loop.time() - started_at - 0.005)
+
+    probe_task = asyncio.create_task(probe())
+    try:
+        await uploader.upload(tasks)
+    finally:
+        probe_task.cancel()
+
+    assert client.objects == {
+        "courses/test/0.js": b"x" * 5,
+        "courses/test/1.js": b"x" * 35,
+    }
+    assert max(lags) < 0.04
+
+
+async def test_async_uploader__cancelled_multipart():
+    client = FakeS3Client()
+    uploader = AsyncUploader(
+        client, "bucket", workers=1, part_size=1, retries=0, retry_delay=0
+    )
+
+    upload = asyncio.create_task(uploader.upload(make_tasks(1000)[999:]))
+    while not client.uploads or not next(iter(client.uploads.values())):
+        await asyncio.sleep(0.001)
+    upload.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await upload
+
+    assert client.aborted == ["courses/test/999.js"]
+    assert client.uploads == {}
+    assert uploader.in_flight == 0
+
+
+async def test_async_uploader__out_of_retries():
+    client = FakeS3Client()
+    uploader = AsyncUploader(
+        client, "bucket", workers=1, part_size=1024, retries=0, retry_delay=0
+    )
+    client.failures = dict(put_object=[ConnectionError()])
+
+    with pytest.raises(ConnectionError):
+        await uploader.upload(make_tasks(10))
+
+    # the first object fails, following objects are not started
+    assert len(client.objects) == 0
+    assert uploader.in_flight == 0
+
+
+async def test_shared_storage__backends(mocker):
+    shared_storage = SharedStorage()
+    await shared_storage.start()
+    assert isinstance(await shared_storage.get(), ThreadPoolStorage)
+    await shared_storage.stop()
+
+    mocker.patch("config.settings.storage_backend", "aiobotocore")
+    mocker.patch("config.settings.s3_settings.max_connections", 3)
+    storage = await shared_storage.get()
+    assert isinstance(storage, AsyncS3Storage)
+    assert storage.client._endpoint.http_session._connector.limit == 3
+    assert shared_storage.stats()["max_connections"] == 3
+
+    await shared_storage.stop()
+    assert shared_storage.stats() == {}
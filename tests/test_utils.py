@@ -1,11 +1,24 @@
+import asyncio
+import datetime
 import io
+import json
 from shutil import rmtree
+from uuid import UUID, uuid4
+import zipfile
 
 from fastapi import UploadFile
-from shared.utils import extract_zip
+import pydantic
+from shared.cache import MISSING, LocalCache, PgNotifyCache
+from shared.serializers import json_backends
+from shared.utils import extract_zip, iter_zip_members, open_zip
 from storage.utils import get_content_type
 import os
 
+ARCHIVE_PATH = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "./resources/scorm.zip",
+)
+
 
 def test_get_content_type():
     file1, file2 = "index.html", "data.mp4"
@@ -17,11 +30,6 @@ def test_get_content_type():
 
 def test_extract_zip():
     # need real creating folder for test, need some waining:<
-    ARCHIVE_PATH = os.path.join(
-        os.path.dirname(os.path.realpath(__file__)),
-        "./resources/scorm.zip",
-    )
-
     with open(str(ARCHIVE_PATH), "rb") as f:
         scorm_archive = io.BytesIO(f.read())
         file = UploadFile(file=scorm_archive, filename="string")
@@ -29,3 +37,121 @@ def test_extract_zip():
         assert path
         # delete local folder after test
         rmtree(path)
+
+
+def test_iter_zip_members():
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w") as zf:
+        zf.writestr("cmi5.xml", "<xml/>")
+        zf.writestr("res/", "")
+        zf.writestr("res/index.html", "<html/>")
+        zf.writestr("../evil.js", "")
+        zf.writestr("res/../../evil.js", "")
+
+    file = UploadFile(file=content, filename="string")
+    with open_zip(file) as archive:
+        paths = [path for path, _ in iter_zip_members(archive)]
+
+    assert paths == ["cmi5.xml", "res/index.html"]
+
+
+async def test_local_cache():
+    now = [0.0]
+    cache = LocalCache(max_size=2, ttl=10, clock=lambda: now[0])
+
+    await cache.set(("course", 1), "first")
+    await cache.set(("course", 2), "second")
+    assert await cache.get(("course", 1)) == "first"
+
+    # the least recently used entry is evicted
+    await cache.set(("courses", None), "catalogue")
+    assert await cache.get(("course", 2)) is MISSING
+    assert await cache.get(("course", 1)) == "first"
+
+    await cache.invalidate("course")
+    assert await cache.get(("course", 1)) is MISSING
+    assert await cache.get(("courses", None)) == "catalogue"
+
+    now[0] = 10
+    assert await cache.get(("courses", None)) is MISSING
+
+    assert cache.stats() == dict(
+        size=0,
+        max_size=2,
+        hits=3,
+        misses=3,
+        hit_rate=0.5,
+        evictions=1,
+        expirations=1,
+    )
+
+
+async def test_pg_notify_cache():
+    # two caches stand for two worker processes
+    cache, other_cache = PgNotifyCache(10, 60), PgNotifyCache(10, 60)
+
+    await cache.set(("course", 1), "course")
+    assert await cache.get(("course", 1)) is MISSING
+
+    await cache.start()
+    await other_cache.start()
+    try:
+        for key in (("course", 1), ("course", 2), ("courses", 1)):
+            await cache.set(key, "value")
+            await other_cache.set(key, "value")
+
+        await cache.invalidate("course")
+
+        for _ in range(100):
+            if other_cache.notifications:
+                break
+            await asyncio.sleep(0.01)
+
+        for entries in (cache, other_cache):
+            assert await entries.get(("course", 1)) is MISSING
+            assert await entries.get(("course", 2)) is MISSING
+            assert await entries.get(("courses", 1)) == "value"
+        assert (cache.notifications, other_cache.notifications) == (0, 1)
+
+        # entries are bypassed while the listener is disconnected
+        await other_cache._connection.close()
+        assert not other_cache.listening
+        assert await other_cache.get(("courses", 1)) is MISSING
+    finally:
+        await cache.stop()
+        await other_cache.stop()
+
+
+def test_json_backends():
+    class DriverUUID(UUID):
+        """Like asyncpg UUID, not an exact uuid.UUID"""
+
+    id = uuid4()
+    obj = {
+        "id": id,
+        "driver_id": DriverUUID(str(id)),
+        "created_at": datetime.datetime(2023, 5, 5, 13, 41, 31, 774252),
+        "statement": {"status": "completed", "title": "Курс", "progress": [1, 2.5]},
+    }
+
+    for name, dumps in json_backends.items():
+        assert json.loads(dumps(obj)) == {
+            "id": str(id),
+            "driver_id": str(id),
+            "created_at": "2023-05-05T13:41:31.774252",
+            "statement": {"status": "completed", "title": "Курс", "progress": [1, 2.5]},
+        }, name
+
+        class Child(pydantic.BaseModel):
+            id: UUID
+            statement: dict
+
+        class Parent(pydantic.BaseModel):
+            created_at: datetime.datetime
+            children: list[Child]
+
+        schema = Parent(
+            created_at=obj["created_at"],
+            children=[Child(id=id, statement=obj["statement"])],
+        )
+        assert json.loads(dumps(schema)) == json.loads(schema.json()), name